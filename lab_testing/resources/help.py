@@ -171,7 +171,7 @@ def get_help_content() -> Dict[str, Any]:
                 "generate_foundries_vpn_client_config_template": "Generate a Foundries VPN client configuration template with server details. Gets server config from FoundriesFactory and creates a template file that you fill in with your private key and assigned IP address. Requires fioctl CLI tool to be installed and configured. ⚠️ CRITICAL: You must be registered as a peer on the server first. Generate your keys, share public key with ajlennon@dynamicdevices.co.uk, and wait for assigned IP address before filling in the template.",
                 "setup_foundries_vpn": "Automated end-to-end Foundries VPN setup. Checks prerequisites, validates or generates client config, and connects to VPN. This automates the entire setup process. Use auto_generate_config=True to generate template if config not found. Requires fioctl CLI tool and WireGuard tools. ⚠️ CRITICAL: Your client must be registered as a peer on the server before connecting. Contact ajlennon@dynamicdevices.co.uk for peer registration assistance.",
                 "verify_foundries_vpn_connection": "Verify that Foundries VPN connection is working. Tests connectivity to VPN server and checks routing. Use this after connecting to ensure VPN is functioning correctly.",
-                "validate_foundries_device_connectivity": "Comprehensive step-by-step validation of Foundries VPN and device connectivity. Performs validation in sequence: 1) Check connection to Foundries VPN server (ping test), 2) List relevant Foundries devices, 3) Check devices are online and VPN is enabled, 4) Test ping and SSH connectivity to devices. Provides clear, sequential validation results to help diagnose connectivity issues. Optional: device_name (validates specific device) or factory (factory name). Use this to systematically validate your connection setup.",
+                "validate_foundries_device_connectivity": "Comprehensive step-by-step validation of Foundries VPN and device connectivity. Performs validation in sequence: 1) Check connection to Foundries VPN server (ping test), 2) List relevant Foundries devices, 3) Check devices are online and VPN is enabled, 4) Test ping and SSH connectivity to devices. Provides clear, sequential validation results to help diagnose connectivity issues. Optional: device_name (validates specific device), factory (factory name), force_ssh (also try SSH on devices that do not answer ping; skipped by default) or verbose (keep ping/SSH output for successful tests; by default output is only returned for failures). Use this to systematically validate your connection setup.",
                 "connect_foundries_vpn": "Connect to Foundries VPN server. Requires a WireGuard configuration file obtained from FoundriesFactory. Searches for config in standard locations if not provided. Requires fioctl CLI tool. ⚠️ CRITICAL: Your client must be registered as a peer on the server before connecting. Contact ajlennon@dynamicdevices.co.uk for assistance.",
                 "list_foundries_devices": "List all Foundries devices in a factory. Uses fioctl API to list devices in the FoundriesFactory. Returns comprehensive device information including name, target, status, apps, creation date, last seen, owner, tags, device group, OSTree hash, UUID, and more. VPN IP addresses are automatically included from cache if available. This tool lists ALL devices in the factory, not just VPN-enabled ones. Requires fioctl CLI tool to be installed and configured.",
                 "enable_foundries_vpn_device": "Enable WireGuard VPN on a Foundries device. Uses fioctl API to enable WireGuard configuration on a device. The device will connect to the Foundries VPN server after OTA update (up to 5 minutes). Requires fioctl CLI tool.",
@@ -11,6 +11,7 @@ Maintainer: Alex J Lennon <ajlennon@dynamicdevices.co.uk>
 """
 
 import asyncio
+import functools
 import json
 import sys
 import time
@@ -100,10 +101,14 @@ async def handle_call_tool(
     log_tool_call(name, arguments, request_id)
     logger.debug(f"[{request_id}] Executing tool: {name}")
 
-    # Route to tool handlers
+    # Route to tool handlers. They block on subprocesses and SSH for up to tens of
+    # seconds, so run them in a worker thread to keep other requests flowing
     from lab_testing.server.tool_handlers import handle_tool
 
-    return handle_tool(name, arguments, request_id, start_time)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(handle_tool, name, arguments, request_id, start_time)
+    )
 
 
 @server.list_resources()
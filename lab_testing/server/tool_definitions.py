@@ -300,6 +300,54 @@ def get_all_tools() -> List[Tool]:
                 "required": ["device_name"],
             },
         ),
+        Tool(
+            name="enable_foundries_vpn_devices",
+            description=(
+                "Enable WireGuard VPN on several Foundries devices at once. "
+                "Runs enable_foundries_vpn_device for every device concurrently and reports per-device results. "
+                "Devices will connect to the Foundries VPN server after OTA update (up to 5 minutes). "
+                "Requires fioctl CLI tool to be installed and configured."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "device_names": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Names of the devices to enable VPN on",
+                    },
+                    "factory": {
+                        "type": "string",
+                        "description": "Optional factory name. If not provided, uses default factory from fioctl config.",
+                    },
+                },
+                "required": ["device_names"],
+            },
+        ),
+        Tool(
+            name="disable_foundries_vpn_devices",
+            description=(
+                "Disable WireGuard VPN on several Foundries devices at once. "
+                "Runs disable_foundries_vpn_device for every device concurrently and reports per-device results. "
+                "Devices will disconnect from the Foundries VPN server after OTA update (up to 5 minutes). "
+                "Requires fioctl CLI tool to be installed and configured."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "device_names": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Names of the devices to disable VPN on",
+                    },
+                    "factory": {
+                        "type": "string",
+                        "description": "Optional factory name. If not provided, uses default factory from fioctl config.",
+                    },
+                },
+                "required": ["device_names"],
+            },
+        ),
         Tool(
             name="enable_foundries_device_to_device",
             description=(
@@ -439,10 +487,84 @@ def get_all_tools() -> List[Tool]:
                         "description": "If True, use config file method (/etc/wireguard/factory-clients.conf). If False, use legacy method (wg set + wg-quick save).",
                         "default": True,
                     },
+                    "defer_save": {
+                        "type": "boolean",
+                        "description": "If True, skip saving the WireGuard config; call flush_foundries_vpn_config once at the end of a provisioning session.",
+                        "default": False,
+                    },
                 },
                 "required": ["client_public_key", "assigned_ip"],
             },
         ),
+        Tool(
+            name="register_foundries_vpn_clients",
+            description=(
+                "Register several client peers on the Foundries WireGuard server in one operation. "
+                "All peers are added by a single remote script with one configuration save, "
+                "so provisioning many devices costs one server round trip. "
+                "Peers already registered on the server are left untouched."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "peers": {
+                        "type": "array",
+                        "description": "Client peers to register",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "client_public_key": {
+                                    "type": "string",
+                                    "description": "Client's WireGuard public key",
+                                },
+                                "assigned_ip": {
+                                    "type": "string",
+                                    "description": "IP address to assign to client (e.g., '10.42.42.10')",
+                                },
+                            },
+                            "required": ["client_public_key", "assigned_ip"],
+                        },
+                    },
+                    "server_host": {
+                        "type": "string",
+                        "description": "WireGuard server hostname/IP. If not provided, will try Foundries VPN (10.42.42.1).",
+                    },
+                    "server_port": {
+                        "type": "integer",
+                        "description": "SSH port on WireGuard server (default: 5025)",
+                        "default": 5025,
+                    },
+                    "server_user": {
+                        "type": "string",
+                        "description": "SSH user for WireGuard server (default: 'root')",
+                        "default": "root",
+                    },
+                    "server_password": {
+                        "type": "string",
+                        "description": "SSH password for WireGuard server (if not using SSH keys)",
+                    },
+                    "use_config_file": {
+                        "type": "boolean",
+                        "description": "If True, use config file method (/etc/wireguard/factory-clients.conf). If False, use legacy method (wg set + wg-quick save).",
+                        "default": True,
+                    },
+                    "defer_save": {
+                        "type": "boolean",
+                        "description": "If True, skip saving the WireGuard config; call flush_foundries_vpn_config once at the end of a provisioning session.",
+                        "default": False,
+                    },
+                },
+                "required": ["peers"],
+            },
+        ),
+        Tool(
+            name="flush_foundries_vpn_config",
+            description=(
+                "Save the WireGuard config (wg-quick save) on servers where client peers were "
+                "registered with defer_save=True. Call once at the end of a provisioning session."
+            ),
+            inputSchema={"type": "object", "properties": {}, "required": []},
+        ),
         Tool(
             name="manage_foundries_vpn_ip_cache",
             description=(
@@ -491,6 +613,11 @@ def get_all_tools() -> List[Tool]:
                         "type": "string",
                         "description": "SSH password for WireGuard server (if not using SSH keys)",
                     },
+                    "force": {
+                        "type": "boolean",
+                        "description": "If True, re-query devices cached within the last 15 minutes (for fioctl 'refresh')",
+                        "default": False,
+                    },
                 },
                 "required": [],
             },
@@ -596,6 +723,16 @@ def get_all_tools() -> List[Tool]:
                         "type": "string",
                         "description": "Optional factory name. If not provided, uses default factory from fioctl config.",
                     },
+                    "force_ssh": {
+                        "type": "boolean",
+                        "description": "Also try SSH on devices that do not answer ping (default: false, the SSH test is skipped for them).",
+                        "default": False,
+                    },
+                    "verbose": {
+                        "type": "boolean",
+                        "description": "Include ping/SSH output for successful tests too (default: false, output is only kept for failures).",
+                        "default": False,
+                    },
                 },
                 "required": [],
             },
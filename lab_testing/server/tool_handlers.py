@@ -67,13 +67,17 @@ from lab_testing.tools.foundries_vpn import (
     check_foundries_vpn_client_config,
     connect_foundries_vpn,
     disable_foundries_vpn_device,
+    disable_foundries_vpn_devices,
     enable_foundries_device_to_device,
     enable_foundries_vpn_device,
+    enable_foundries_vpn_devices,
+    flush_foundries_vpn_config,
     foundries_vpn_status,
     generate_foundries_vpn_client_config_template,
     get_foundries_vpn_server_config,
     manage_foundries_vpn_ip_cache,
     register_foundries_vpn_client,
+    register_foundries_vpn_clients,
     setup_foundries_vpn,
     validate_foundries_device_connectivity,
     verify_foundries_vpn_connection,
@@ -869,31 +873,37 @@ def handle_tool(
             _record_tool_result(name, result, request_id, start_time)
             return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
+        if name in ("enable_foundries_vpn_devices", "disable_foundries_vpn_devices"):
+            device_names = arguments.get("device_names")
+            if not device_names:
+                error_msg = "device_names is required"
+                duration = time.time() - start_time
+                record_tool_call(name, False, duration)
+                return [TextContent(type="text", text=json.dumps({"error": error_msg}, indent=2))]
+            factory = arguments.get("factory")
+            if name == "enable_foundries_vpn_devices":
+                result = enable_foundries_vpn_devices(device_names, factory)
+            else:
+                result = disable_foundries_vpn_devices(device_names, factory)
+            result = format_tool_response(result, name)
+            _record_tool_result(name, result, request_id, start_time)
+            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+
         if name == "manage_foundries_vpn_ip_cache":
-            try:
-                action = kwargs.get("action", "get")
-                device_name = kwargs.get("device_name")
-                vpn_ip = kwargs.get("vpn_ip")
-                refresh_from_server = kwargs.get("refresh_from_server", False)
-                server_host = kwargs.get("server_host")
-                server_port = kwargs.get("server_port", 5025)
-                server_user = kwargs.get("server_user", "root")
-                server_password = kwargs.get("server_password")
-
-                result = manage_foundries_vpn_ip_cache(
-                    action=action,
-                    device_name=device_name,
-                    vpn_ip=vpn_ip,
-                    refresh_from_server=refresh_from_server,
-                    server_host=server_host,
-                    server_port=server_port,
-                    server_user=server_user,
-                    server_password=server_password,
-                )
-                return result
-            except Exception as e:
-                error_msg = f"Failed to manage VPN IP cache: {e!s}"
-                return {"success": False, "error": error_msg}
+            result = manage_foundries_vpn_ip_cache(
+                action=arguments.get("action", "get"),
+                device_name=arguments.get("device_name"),
+                vpn_ip=arguments.get("vpn_ip"),
+                refresh_from_server=arguments.get("refresh_from_server", False),
+                server_host=arguments.get("server_host"),
+                server_port=arguments.get("server_port", 5025),
+                server_user=arguments.get("server_user", "root"),
+                server_password=arguments.get("server_password"),
+                force=arguments.get("force", False),
+            )
+            result = format_tool_response(result, name)
+            _record_tool_result(name, result, request_id, start_time)
+            return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
         if name == "check_client_peer_registered":
             result = check_client_peer_registered(
@@ -923,6 +933,43 @@ def handle_tool(
                 server_user=arguments.get("server_user", "root"),
                 server_password=arguments.get("server_password"),
                 use_config_file=arguments.get("use_config_file", True),
+                defer_save=arguments.get("defer_save", False),
+            )
+            result = format_tool_response(result, name)
+            _record_tool_result(name, result, request_id, start_time)
+            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+
+        if name == "flush_foundries_vpn_config":
+            result = flush_foundries_vpn_config()
+            result = format_tool_response(result, name)
+            _record_tool_result(name, result, request_id, start_time)
+            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+
+        if name == "register_foundries_vpn_clients":
+            peers = arguments.get("peers")
+            # Key and IP formats are validated per peer by register_foundries_vpn_clients
+            if (
+                not isinstance(peers, list)
+                or not peers
+                or not all(
+                    isinstance(peer, dict)
+                    and peer.get("client_public_key")
+                    and peer.get("assigned_ip")
+                    for peer in peers
+                )
+            ):
+                error_msg = "peers is required; each peer needs client_public_key and assigned_ip"
+                duration = time.time() - start_time
+                record_tool_call(name, False, duration)
+                return [TextContent(type="text", text=json.dumps({"error": error_msg}, indent=2))]
+            result = register_foundries_vpn_clients(
+                peers=peers,
+                server_host=arguments.get("server_host"),
+                server_port=arguments.get("server_port", 5025),
+                server_user=arguments.get("server_user", "root"),
+                server_password=arguments.get("server_password"),
+                use_config_file=arguments.get("use_config_file", True),
+                defer_save=arguments.get("defer_save", False),
             )
             result = format_tool_response(result, name)
             _record_tool_result(name, result, request_id, start_time)
@@ -983,7 +1030,11 @@ def handle_tool(
         if name == "validate_foundries_device_connectivity":
             device_name = arguments.get("device_name")
             factory = arguments.get("factory")
-            result = validate_foundries_device_connectivity(device_name, factory)
+            force_ssh = arguments.get("force_ssh", False)
+            verbose = arguments.get("verbose", False)
+            result = validate_foundries_device_connectivity(
+                device_name, factory, force_ssh, verbose
+            )
             result = format_tool_response(result, name)
             _record_tool_result(name, result, request_id, start_time)
             return [TextContent(type="text", text=json.dumps(result, indent=2))]
@@ -8,6 +8,9 @@ Copyright (C) 2025 Dynamic Devices Ltd
 License: GPL-3.0-or-later
 """
 
+import os
+import posixpath
+import shutil
 import subprocess
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
@@ -22,6 +25,10 @@ from lab_testing.utils.ssh_pool import get_persistent_ssh_connection
 
 logger = get_logger()
 
+# Minimum number of files before copy_files_to_device_parallel tries a single rsync
+# transfer instead of one scp process per file
+RSYNC_FAST_PATH_MIN_FILES = 8
+
 
 def _extract_scp_error(stderr_text: str) -> str:
     """
@@ -1062,6 +1069,127 @@ def _sync_directory_to_device_via_vpn_server(
         }
 
 
+def _get_rsync_relative_paths(
+    file_pairs: List[Tuple[str, str]],
+) -> Optional[Tuple[str, str, List[str]]]:
+    """
+    Check whether file pairs mirror a single local tree onto a single remote tree.
+
+    rsync --files-from can only recreate the local layout under one destination
+    directory, so every remote path must equal remote_root + (local path relative
+    to local_root).
+
+    Args:
+        file_pairs: List of (local_path, remote_path) tuples
+
+    Returns:
+        (local_root, remote_root, relative_paths) or None if the layout doesn't match
+    """
+    local_paths = [os.path.abspath(local_path) for local_path, _ in file_pairs]
+    remote_paths = [posixpath.normpath(remote_path) for _, remote_path in file_pairs]
+
+    if len(set(remote_paths)) != len(remote_paths):
+        return None
+    if not all(posixpath.isabs(remote_path) for remote_path in remote_paths):
+        return None
+
+    try:
+        local_root = os.path.commonpath([os.path.dirname(path) for path in local_paths])
+        remote_root = posixpath.commonpath([posixpath.dirname(path) for path in remote_paths])
+    except ValueError:
+        # Mixed drives/absolute and relative paths
+        return None
+
+    relative_paths = []
+    for local_path, remote_path in zip(local_paths, remote_paths):
+        relative = os.path.relpath(local_path, local_root).replace(os.sep, "/")
+        if relative.startswith("../") or posixpath.relpath(remote_path, remote_root) != relative:
+            return None
+        relative_paths.append(relative)
+
+    return local_root, remote_root, relative_paths
+
+
+def _copy_files_via_rsync(
+    file_pairs: List[Tuple[str, str]],
+    username: str,
+    ip: str,
+    ssh_port: int,
+    control_path: Optional[str],
+    preserve_permissions: bool,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Transfer many files in one rsync process using --files-from.
+
+    One connection and rsync's pipelined protocol replace N scp processes, which is
+    much faster for the common "deploy a build directory" case with many small files.
+
+    Args:
+        file_pairs: List of (local_path, remote_path) tuples
+        username: SSH username
+        ip: Device IP address
+        ssh_port: SSH port
+        control_path: ControlPath of a live multiplexed connection, or None
+        preserve_permissions: Preserve file permissions and timestamps
+
+    Returns:
+        Per-file results on success, or None if the fast path doesn't apply or failed
+        (caller falls back to per-file scp)
+    """
+    if len(file_pairs) < RSYNC_FAST_PATH_MIN_FILES or not shutil.which("rsync"):
+        return None
+
+    layout = _get_rsync_relative_paths(file_pairs)
+    if not layout:
+        return None
+    local_root, remote_root, relative_paths = layout
+
+    if control_path:
+        ssh_command = f"ssh -o ControlPath={control_path} -o BatchMode=yes -p {ssh_port}"
+    else:
+        ssh_command = f"ssh -o StrictHostKeyChecking=no -o BatchMode=yes -p {ssh_port}"
+
+    # Like scp -p: keep modes and times, but not the local owner/group (devices are
+    # accessed as root, so -a would chown files to the developer's uid/gid)
+    rsync_cmd = [
+        "rsync",
+        "-rlptz" if preserve_permissions else "-z",
+        "--files-from=-",
+        "--from0",
+        "-e",
+        ssh_command,
+        f"{local_root.rstrip(os.sep)}/",
+        f"{username}@{ip}:{remote_root.rstrip('/')}/",
+    ]
+
+    try:
+        result = subprocess.run(
+            rsync_cmd,
+            check=False,
+            capture_output=True,
+            input="\0".join(relative_paths).encode(),
+            timeout=300,
+        )
+    except (subprocess.TimeoutExpired, OSError) as e:
+        logger.debug(f"rsync fast path failed, falling back to scp: {e}")
+        return None
+
+    if result.returncode != 0:
+        stderr = result.stderr.decode(errors="replace") if result.stderr else ""
+        logger.debug(f"rsync fast path failed, falling back to scp: {stderr.strip()}")
+        return None
+
+    return [
+        {
+            "local_path": local_path,
+            "remote_path": remote_path,
+            "success": True,
+            "error": None,
+        }
+        for local_path, remote_path in file_pairs
+    ]
+
+
 def copy_files_to_device_parallel(
     device_id: str,
     file_pairs: List[Tuple[str, str]],
@@ -1072,6 +1200,8 @@ def copy_files_to_device_parallel(
     """
     Copy multiple files to remote device in parallel using multiplexed SSH connections.
     Much faster than copying files sequentially - all transfers share the same SSH connection.
+    When many files mirror one local directory tree under one remote directory, a single
+    rsync transfer is used instead (falls back to parallel scp if rsync fails).
 
     Args:
         device_id: Device identifier (device_id or friendly_name)
@@ -1169,6 +1299,38 @@ def copy_files_to_device_parallel(
             f"Could not establish multiplexed connection for {resolved_device_id}, transfers will be slower"
         )
 
+    master_alive = bool(master and master.poll() is None)
+
+    # Many files mirroring one directory tree go through a single rsync process
+    rsync_results = _copy_files_via_rsync(
+        file_pairs,
+        username,
+        ip,
+        ssh_port,
+        control_path if master_alive else None,
+        preserve_permissions,
+    )
+    if rsync_results is not None:
+        logger.info(
+            f"Transferred {len(rsync_results)} files to {resolved_device_id} with a single rsync"
+        )
+        return {
+            "success": True,
+            "device_id": resolved_device_id,
+            "friendly_name": device.get("friendly_name") or device.get("name", resolved_device_id),
+            "ip": ip,
+            "transfer_method": "rsync",
+            "total_files": len(file_pairs),
+            "successful": len(rsync_results),
+            "failed": 0,
+            "results": rsync_results,
+            "message": f"Transferred {len(rsync_results)}/{len(file_pairs)} files successfully",
+            "next_steps": [
+                "Review individual file results in 'results' field",
+                "Verify files on device: ssh_to_device(device_id, 'ls -lh <remote_path>')",
+            ],
+        }
+
     # Copy files in parallel
     results = []
     successful = 0
@@ -1180,7 +1342,7 @@ def copy_files_to_device_parallel(
             # Build scp command with multiplexed connection
             scp_cmd = ["scp"]
 
-            if master and master.poll() is None:
+            if master_alive:
                 scp_cmd.extend(["-o", f"ControlPath={control_path}"])
             else:
                 scp_cmd.extend(["-o", "StrictHostKeyChecking=no"])
@@ -1235,6 +1397,7 @@ def copy_files_to_device_parallel(
         "device_id": resolved_device_id,
         "friendly_name": device.get("friendly_name") or device.get("name", resolved_device_id),
         "ip": ip,
+        "transfer_method": "scp",
         "total_files": len(file_pairs),
         "successful": successful,
         "failed": failed,
@@ -18,7 +18,15 @@ Copyright (C) 2025 Dynamic Devices Ltd
 License: GPL-3.0-or-later
 """
 
-from typing import Any, Dict, Optional
+import asyncio
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from lab_testing.config import get_foundries_vpn_config
 
 # Import all functions from sub-modules for backward compatibility
 from lab_testing.tools.foundries_vpn_client import (
@@ -31,29 +39,576 @@ from lab_testing.tools.foundries_vpn_core import (
     foundries_vpn_status,
     verify_foundries_vpn_connection,
 )
+from lab_testing.tools.foundries_vpn_helpers import (
+    _check_fioctl_configured,
+    _check_fioctl_installed,
+    _get_fioctl_path,
+)
 from lab_testing.tools.foundries_vpn_peer import (
     check_client_peer_registered,
+    flush_foundries_vpn_config,
     register_foundries_vpn_client,
+    register_foundries_vpn_clients,
 )
 from lab_testing.tools.foundries_vpn_server import (
     disable_foundries_vpn_device,
+    disable_foundries_vpn_devices,
     enable_foundries_device_to_device,
     enable_foundries_vpn_device,
+    enable_foundries_vpn_devices,
     get_foundries_vpn_server_config,
+    invalidate_vpn_server_config,
 )
 from lab_testing.tools.foundries_vpn_validation import (
     validate_foundries_device_connectivity,
 )
 from lab_testing.utils.foundries_vpn_cache import (
     cache_vpn_ip,
+    cache_vpn_ips_bulk,
     get_all_cached_ips,
+    get_fioctl_lookups,
     get_vpn_ip,
     remove_vpn_ip,
+    save_fioctl_lookups,
 )
 from lab_testing.utils.logger import get_logger
+from lab_testing.utils.ssh_pool import get_ssh_multiplex_options
 
 logger = get_logger()
 
+# Substrings identifying Foundries device names worth caching VPN IPs for
+FOUNDRIES_DEVICE_NAME_PATTERNS = ("imx8mm", "jaguar")
+
+# All patterns matched in one scan of the name, however many families are listed
+_FOUNDRIES_DEVICE_NAME_RE = re.compile("|".join(map(re.escape, FOUNDRIES_DEVICE_NAME_PATTERNS)))
+
+# VPN address in 'fioctl devices show' output: the first "address=" line (optionally
+# "|"-prefixed) in the wireguard-client section, which ends at the first non-blank line
+# that doesn't start with "|". "(none)" means no address is assigned.
+_WIREGUARD_ADDRESS_RE = re.compile(
+    r"wireguard-client[^\n]*\n"
+    r"(?:[ \t]*(?:\|[^\n]*)?\n)*?"
+    r"[ \t]*\|?[ \t]*address=(?!\(none\))(\S+)",
+    re.IGNORECASE,
+)
+
+# VPN entries in /etc/hosts: "10.42.42.3    imx8mm-jaguar-inst-5120a09dab86563". Anchored
+# at the line start so commented-out entries are ignored.
+_HOSTS_VPN_ENTRY_RE = re.compile(r"^[ \t]*(10\.42\.42\.\d+)[ \t]+(\S+)", re.MULTILINE)
+
+# Remote command for reading the WireGuard server's hosts file
+_SERVER_HOSTS_COMMAND = "cat /etc/hosts"
+
+# Maximum concurrent fioctl device lookups (bounded to avoid FoundriesFactory API rate limits)
+FIOCTL_MAX_CONCURRENT = 16
+
+# Timeout for a single fioctl device lookup (seconds)
+FIOCTL_DEVICE_TIMEOUT = 10
+
+# Overall budget for all fioctl device lookups in one refresh (seconds)
+FIOCTL_REFRESH_DEADLINE = 30
+
+# Timeout for listing all factory devices (seconds)
+FIOCTL_LIST_TIMEOUT = 30
+
+# Cached IPs newer than this are not re-queried by a fioctl refresh unless forced (seconds)
+REFRESH_FRESHNESS_SECONDS = 15 * 60
+
+
+def _run_coroutine(coro):
+    """
+    Run a coroutine to completion from synchronous code.
+
+    Tool handlers are synchronous but are invoked from the MCP server's event loop,
+    where asyncio.run() is not allowed, so in that case the coroutine runs on its
+    own loop in a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+async def _fetch_device_show_async(
+    semaphore: asyncio.Semaphore, fioctl_path: str, device_name: str
+) -> Tuple[str, int, str]:
+    """
+    Run 'fioctl devices show' for one device without blocking other lookups.
+
+    Returns:
+        Tuple of (device_name, returncode, stdout)
+    """
+    async with semaphore:
+        process = await asyncio.create_subprocess_exec(
+            fioctl_path,
+            "devices",
+            "show",
+            device_name,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=FIOCTL_DEVICE_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            process.kill()
+            await process.wait()
+            raise
+        return device_name, process.returncode, stdout.decode(errors="replace")
+
+
+async def _fetch_devices_show_async(
+    fioctl_path: str, devices: List[str]
+) -> Tuple[List[Union[Tuple[str, int, str], BaseException]], bool]:
+    """
+    Run 'fioctl devices show' for all devices concurrently (bounded by FIOCTL_MAX_CONCURRENT).
+
+    Lookups still running after FIOCTL_REFRESH_DEADLINE are cancelled so one slow
+    device can't hold up the whole refresh; their results are asyncio.TimeoutError.
+
+    Returns:
+        Tuple of (per-device results or exceptions in device order, deadline_reached)
+    """
+    semaphore = asyncio.Semaphore(FIOCTL_MAX_CONCURRENT)
+    tasks = [
+        asyncio.ensure_future(_fetch_device_show_async(semaphore, fioctl_path, device))
+        for device in devices
+    ]
+    _, pending = await asyncio.wait(tasks, timeout=FIOCTL_REFRESH_DEADLINE)
+
+    for task in pending:
+        task.cancel()
+    # Let cancelled lookups kill their fioctl processes
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    results = []
+    for task in tasks:
+        if task in pending:
+            results.append(
+                asyncio.TimeoutError(f"refresh deadline of {FIOCTL_REFRESH_DEADLINE}s reached")
+            )
+        elif task.exception() is not None:
+            results.append(task.exception())
+        else:
+            results.append(task.result())
+    return results, bool(pending)
+
+
+def _list_foundries_device_names(fioctl_path: str) -> Tuple[List[str], Optional[str]]:
+    """
+    List Foundries device names from 'fioctl devices list'.
+
+    Output is parsed line by line as fioctl produces it rather than buffered in full,
+    so large factories don't hold the whole listing in memory.
+
+    Returns:
+        Tuple of (device_names, error_message)
+    """
+    devices = []
+    with subprocess.Popen(
+        [fioctl_path, "devices", "list"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    ) as process:
+        # Iterating stdout has no timeout of its own
+        timer = threading.Timer(FIOCTL_LIST_TIMEOUT, process.kill)
+        timer.start()
+        try:
+            for line in process.stdout:
+                # Extract device name (first column)
+                parts = line.split(None, 1)
+                if not parts or parts[0].startswith(("NAME", "----")):
+                    continue
+                # Only process Foundries device names
+                if _FOUNDRIES_DEVICE_NAME_RE.search(parts[0]):
+                    devices.append(parts[0])
+            stderr = process.stderr.read()
+            returncode = process.wait()
+        finally:
+            timer.cancel()
+
+    if returncode != 0:
+        if returncode < 0:
+            return [], f"timed out after {FIOCTL_LIST_TIMEOUT}s"
+        return [], stderr
+    # Drop duplicates (keeping order) so no device is looked up twice
+    return list(dict.fromkeys(devices)), None
+
+
+def _parse_wireguard_address(show_output: str) -> Optional[str]:
+    """
+    Extract the VPN address from 'fioctl devices show' output.
+
+    The address is in the active config under wireguard-client, either as
+    "address=10.42.42.3" or "| address=10.42.42.3".
+
+    Returns:
+        VPN IP address, or None if not present
+    """
+    match = _WIREGUARD_ADDRESS_RE.search(show_output)
+    return match.group(1) if match else None
+
+
+def _parse_hosts_vpn_ips(hosts_content: str) -> Dict[str, str]:
+    """
+    Extract Foundries device VPN IPs from /etc/hosts content.
+
+    Returns:
+        Dictionary mapping device name to VPN IP address
+    """
+    return {
+        device_name: ip_addr
+        for ip_addr, device_name in _HOSTS_VPN_ENTRY_RE.findall(hosts_content)
+        if _FOUNDRIES_DEVICE_NAME_RE.search(device_name)
+    }
+
+
+def _do_get(device_name: Optional[str] = None, **_) -> Dict[str, Any]:
+    """Get cached VPN IP for a device"""
+    if not device_name:
+        return {
+            "success": False,
+            "error": "device_name is required for 'get' action",
+        }
+
+    cached_ip = get_vpn_ip(device_name)
+    if cached_ip:
+        return {
+            "success": True,
+            "device_name": device_name,
+            "vpn_ip": cached_ip,
+            "cached": True,
+        }
+    return {
+        "success": False,
+        "device_name": device_name,
+        "error": "VPN IP not found in cache",
+        "suggestions": [
+            "Refresh cache from server: manage_foundries_vpn_ip_cache(action='refresh')",
+            "Manually set IP: manage_foundries_vpn_ip_cache(action='set', device_name='...', vpn_ip='...')",
+            "List all cached IPs: manage_foundries_vpn_ip_cache(action='list')",
+        ],
+    }
+
+
+def _do_list(**_) -> Dict[str, Any]:
+    """List all cached VPN IPs"""
+    devices = [
+        {
+            "device_name": dev_name,
+            "vpn_ip": entry.get("vpn_ip"),
+            "source": entry.get("source", "unknown"),
+            "cached_at": entry.get("cached_at"),
+        }
+        for dev_name, entry in get_all_cached_ips().items()
+    ]
+
+    return {
+        "success": True,
+        "count": len(devices),
+        "devices": devices,
+    }
+
+
+def _do_set(device_name: Optional[str] = None, vpn_ip: Optional[str] = None, **_) -> Dict[str, Any]:
+    """Manually cache a VPN IP for a device"""
+    if not device_name or not vpn_ip:
+        return {
+            "success": False,
+            "error": "device_name and vpn_ip are required for 'set' action",
+        }
+
+    cache_vpn_ip(device_name, vpn_ip, source="manual")
+    return {
+        "success": True,
+        "device_name": device_name,
+        "vpn_ip": vpn_ip,
+        "message": f"Cached VPN IP for {device_name}: {vpn_ip}",
+    }
+
+
+def _do_remove(device_name: Optional[str] = None, **_) -> Dict[str, Any]:
+    """Remove a device from the cache"""
+    if not device_name:
+        return {
+            "success": False,
+            "error": "device_name is required for 'remove' action",
+        }
+
+    removed = remove_vpn_ip(device_name)
+    if removed:
+        return {
+            "success": True,
+            "device_name": device_name,
+            "message": f"Removed VPN IP cache entry for {device_name}",
+        }
+    return {
+        "success": False,
+        "device_name": device_name,
+        "error": "Device not found in cache",
+    }
+
+
+def _refresh_from_server_hosts(
+    server_host: Optional[str],
+    server_port: int,
+    server_user: str,
+    server_password: Optional[str],
+) -> Dict[str, Any]:
+    """Refresh the cache from the WireGuard server's /etc/hosts"""
+    # Get server connection details
+    if not server_host:
+        config_path = get_foundries_vpn_config()
+        if config_path and config_path.exists():
+            # Try to read config file to get server endpoint
+            try:
+                config_content = config_path.read_text()
+                for line in config_content.split("\n"):
+                    line = line.strip()
+                    if line.startswith("Endpoint =") or line.startswith("Endpoint="):
+                        endpoint = line.split("=", 1)[1].strip()
+                        # Extract host from endpoint (e.g., "144.76.167.54:5555" -> "144.76.167.54")
+                        server_host = endpoint.split(":")[0] if ":" in endpoint else endpoint
+                        break
+            except Exception:
+                pass
+
+    # Default server host
+    if not server_host:
+        server_host = "proxmox.dynamicdevices.co.uk"
+
+    # Read /etc/hosts from WireGuard server
+    try:
+        if server_password:
+            ssh_cmd = [
+                "sshpass",
+                "-p",
+                server_password,
+                "ssh",
+                *get_ssh_multiplex_options(),
+                "-o",
+                "StrictHostKeyChecking=no",
+                "-o",
+                "UserKnownHostsFile=/dev/null",
+                "-p",
+                str(server_port),
+                f"{server_user}@{server_host}",
+                _SERVER_HOSTS_COMMAND,
+            ]
+        else:
+            ssh_cmd = [
+                "ssh",
+                *get_ssh_multiplex_options(),
+                "-o",
+                "StrictHostKeyChecking=no",
+                "-p",
+                str(server_port),
+                f"{server_user}@{server_host}",
+                _SERVER_HOSTS_COMMAND,
+            ]
+
+        hosts_result = subprocess.run(
+            ssh_cmd,
+            check=False,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+
+        if hosts_result.returncode == 0:
+            # Filter and parse locally in one pass rather than piping through grep remotely
+            devices_cached = _parse_hosts_vpn_ips(hosts_result.stdout)
+            cached_count = len(devices_cached)
+            logger.debug("Found %d VPN IPs in server /etc/hosts", cached_count)
+
+            cache_vpn_ips_bulk(devices_cached, source="server_hosts")
+
+            return {
+                "success": True,
+                "cached_count": cached_count,
+                "devices_cached": cached_count,
+                "devices": devices_cached,
+                "source": "server_hosts",
+                "message": f"Refreshed VPN IP cache from WireGuard server /etc/hosts: {cached_count} devices cached",
+            }
+        return {
+            "success": False,
+            "error": f"Failed to read /etc/hosts from server: {hosts_result.stderr}",
+            "suggestions": [
+                "Check SSH access to WireGuard server",
+                "Verify server_host, server_port, and credentials",
+            ],
+        }
+    except Exception as e:
+        logger.error(f"Failed to refresh VPN IP cache from server: {e}", exc_info=True)
+        return {
+            "success": False,
+            "error": f"Failed to refresh from server: {e!s}",
+            "suggestions": [
+                "Check SSH access to WireGuard server",
+                "Try using fioctl instead: refresh_from_server=False",
+            ],
+        }
+
+
+def _refresh_from_fioctl(force: bool = False) -> Dict[str, Any]:
+    """Refresh the cache from device configurations reported by fioctl"""
+    # Use fioctl to get VPN IPs from device configurations
+    # This uses fioctl to list devices, then checks which have VPN enabled
+    # Note: fioctl doesn't directly provide VPN IPs, but we can use it to identify devices
+
+    # Check if fioctl is installed and configured
+    fioctl_installed, fioctl_error = _check_fioctl_installed()
+    if not fioctl_installed:
+        return {
+            "success": False,
+            "error": fioctl_error,
+            "suggestions": [
+                "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
+                "Or use refresh_from_server=true to refresh from WireGuard server /etc/hosts",
+            ],
+        }
+
+    fioctl_configured, config_error = _check_fioctl_configured()
+    if not fioctl_configured:
+        return {
+            "success": False,
+            "error": config_error,
+            "suggestions": [
+                "Run 'fioctl login' to configure FoundriesFactory credentials",
+                "Or use refresh_from_server=true to refresh from WireGuard server /etc/hosts",
+            ],
+        }
+
+    # Get fioctl path
+    fioctl_path = _get_fioctl_path()
+    if not fioctl_path:
+        return {
+            "success": False,
+            "error": "fioctl not found",
+            "suggestions": [
+                "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
+            ],
+        }
+
+    # First, list all devices
+    devices, list_error = _list_foundries_device_names(fioctl_path)
+    if list_error:
+        return {
+            "success": False,
+            "error": f"Failed to list devices: {list_error}",
+            "suggestions": [
+                "Check fioctl is configured correctly: 'fioctl factories list'",
+            ],
+        }
+
+    # Get VPN IP for each device using fioctl devices show
+    # The VPN IP is in the active config under wireguard-client -> address=
+    cached_count = 0
+    errors = []
+    devices_cached = {}
+
+    devices_listed = len(devices)
+
+    # Devices cached recently are skipped - IPs rarely change
+    skipped = []
+    if not force:
+        now = time.time()
+        cached_ips = get_all_cached_ips()
+        fresh = {
+            name
+            for name, entry in cached_ips.items()
+            if now - entry.get("cached_at", 0) < REFRESH_FRESHNESS_SECONDS
+        }
+        skipped = [d for d in devices if d in fresh]
+        devices = [d for d in devices if d not in fresh]
+
+    # Reuse recent lookups so repeated refreshes don't re-query fioctl
+    lookups = {} if force else get_fioctl_lookups(devices)
+    lookup_hits = len(lookups)
+    devices_to_query = [d for d in devices if d not in lookups]
+
+    # Query remaining devices concurrently - each lookup is a remote API round trip
+    show_results, deadline_reached = (
+        _run_coroutine(_fetch_devices_show_async(fioctl_path, devices_to_query))
+        if devices_to_query
+        else ([], False)
+    )
+
+    new_lookups = {}
+    timed_out = []
+    for device_name_parsed, show_result in zip(devices_to_query, show_results):
+        if isinstance(show_result, BaseException):
+            if isinstance(show_result, asyncio.TimeoutError):
+                timed_out.append(device_name_parsed)
+                show_result = str(show_result) or f"timed out after {FIOCTL_DEVICE_TIMEOUT}s"
+            errors.append(f"Failed to get VPN IP for {device_name_parsed}: {show_result!s}")
+            continue
+
+        _, returncode, show_output = show_result
+        if returncode != 0:
+            # Device might not exist or have issues, skip silently
+            logger.debug(
+                "Device %s show failed (may not exist or have VPN enabled)", device_name_parsed
+            )
+            continue
+
+        new_lookups[device_name_parsed] = _parse_wireguard_address(show_output)
+
+    save_fioctl_lookups(new_lookups)
+    lookups.update(new_lookups)
+
+    for device_name_parsed in devices:
+        ip_addr = lookups.get(device_name_parsed)
+        if ip_addr:
+            cached_count += 1
+            devices_cached[device_name_parsed] = ip_addr
+
+    cache_vpn_ips_bulk(devices_cached, source="fioctl")
+
+    return {
+        "success": True,
+        "cached_count": cached_count,
+        "devices_cached": cached_count,
+        "devices": devices_cached,
+        "source": "fioctl",
+        "devices_checked": devices_listed,
+        "devices_queried": len(devices_to_query),
+        # Not queried: cached recently, or served from a recent fioctl lookup
+        "skipped_count": len(skipped) + lookup_hits,
+        "partial": deadline_reached,
+        "timed_out": timed_out if timed_out else None,
+        "message": f"Refreshed VPN IP cache from fioctl: {cached_count} devices cached",
+        "errors": errors if errors else None,
+    }
+
+
+def _do_refresh(
+    refresh_from_server: bool = False,
+    server_host: Optional[str] = None,
+    server_port: int = 5025,
+    server_user: str = "root",
+    server_password: Optional[str] = None,
+    force: bool = False,
+    **_,
+) -> Dict[str, Any]:
+    """Refresh the cache from the WireGuard server /etc/hosts or fioctl"""
+    if refresh_from_server:
+        return _refresh_from_server_hosts(server_host, server_port, server_user, server_password)
+    return _refresh_from_fioctl(force=force)
+
+
+_VPN_IP_CACHE_ACTIONS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "get": _do_get,
+    "list": _do_list,
+    "set": _do_set,
+    "remove": _do_remove,
+    "refresh": _do_refresh,
+}
+
 
 def manage_foundries_vpn_ip_cache(
     action: str = "get",
@@ -64,6 +619,7 @@ def manage_foundries_vpn_ip_cache(
     server_port: int = 5025,
     server_user: str = "root",
     server_password: Optional[str] = None,
+    force: bool = False,
 ) -> Dict[str, Any]:
     """
     Manage Foundries VPN IP address cache.
@@ -81,360 +637,43 @@ def manage_foundries_vpn_ip_cache(
         server_port: SSH port on WireGuard server (default: 5025)
         server_user: SSH user for WireGuard server (default: "root")
         server_password: SSH password for WireGuard server (if not using SSH keys)
+        force: If True, re-query devices cached within the last 15 minutes (for fioctl refresh)
 
     Returns:
-        Dictionary with operation results
+        Dictionary with operation results. Every action sets "success", plus "error" and
+        "suggestions" on failure. Refresh results also include:
+            cached_count/devices_cached: Number of devices cached
+            devices: Mapping of device name to VPN IP
+            source: "fioctl" or "server_hosts"
+        and, for fioctl refreshes:
+            devices_checked: Number of Foundries devices listed, including skipped ones
+            devices_queried: Number of devices looked up with fioctl
+            skipped_count: Number of devices not queried because they were cached within
+                the last 15 minutes or looked up with fioctl recently
+            partial: True if the refresh deadline cut lookups short
+            timed_out: Devices whose lookups were cancelled, or None
+            errors: Per-device lookup errors, or None
     """
-    import subprocess
-
-    from lab_testing.tools.foundries_vpn_helpers import (
-        _check_fioctl_configured,
-        _check_fioctl_installed,
-        _get_fioctl_path,
-    )
-
-    try:
-        if action == "get":
-            if not device_name:
-                return {
-                    "success": False,
-                    "error": "device_name is required for 'get' action",
-                }
-
-            cached_ip = get_vpn_ip(device_name)
-            if cached_ip:
-                return {
-                    "success": True,
-                    "device_name": device_name,
-                    "vpn_ip": cached_ip,
-                    "cached": True,
-                }
-            return {
-                "success": False,
-                "device_name": device_name,
-                "error": "VPN IP not found in cache",
-                "suggestions": [
-                    "Refresh cache from server: manage_foundries_vpn_ip_cache(action='refresh')",
-                    "Manually set IP: manage_foundries_vpn_ip_cache(action='set', device_name='...', vpn_ip='...')",
-                    "List all cached IPs: manage_foundries_vpn_ip_cache(action='list')",
-                ],
-            }
-
-        if action == "list":
-            cached_ips = get_all_cached_ips()
-            devices = []
-            for dev_name, entry in cached_ips.items():
-                devices.append(
-                    {
-                        "device_name": dev_name,
-                        "vpn_ip": entry.get("vpn_ip"),
-                        "source": entry.get("source", "unknown"),
-                        "cached_at": entry.get("cached_at"),
-                    }
-                )
-
-            return {
-                "success": True,
-                "count": len(devices),
-                "devices": devices,
-            }
-
-        if action == "set":
-            if not device_name or not vpn_ip:
-                return {
-                    "success": False,
-                    "error": "device_name and vpn_ip are required for 'set' action",
-                }
-
-            cache_vpn_ip(device_name, vpn_ip, source="manual")
-            return {
-                "success": True,
-                "device_name": device_name,
-                "vpn_ip": vpn_ip,
-                "message": f"Cached VPN IP for {device_name}: {vpn_ip}",
-            }
-
-        if action == "remove":
-            if not device_name:
-                return {
-                    "success": False,
-                    "error": "device_name is required for 'remove' action",
-                }
-
-            removed = remove_vpn_ip(device_name)
-            if removed:
-                return {
-                    "success": True,
-                    "device_name": device_name,
-                    "message": f"Removed VPN IP cache entry for {device_name}",
-                }
-            return {
-                "success": False,
-                "device_name": device_name,
-                "error": "Device not found in cache",
-            }
-
-        if action == "refresh":
-            # If refresh_from_server is True, read from WireGuard server /etc/hosts
-            if refresh_from_server:
-                from lab_testing.config import get_foundries_vpn_config
-
-                # Get server connection details
-                if not server_host:
-                    config_path = get_foundries_vpn_config()
-                    if config_path and config_path.exists():
-                        # Try to read config file to get server endpoint
-                        try:
-                            config_content = config_path.read_text()
-                            for line in config_content.split("\n"):
-                                line = line.strip()
-                                if line.startswith("Endpoint =") or line.startswith("Endpoint="):
-                                    endpoint = line.split("=", 1)[1].strip()
-                                    # Extract host from endpoint (e.g., "144.76.167.54:5555" -> "144.76.167.54")
-                                    server_host = (
-                                        endpoint.split(":")[0] if ":" in endpoint else endpoint
-                                    )
-                                    break
-                        except Exception:
-                            pass
-
-                # Default server host
-                if not server_host:
-                    server_host = "proxmox.dynamicdevices.co.uk"
-
-                # Read /etc/hosts from WireGuard server
-                try:
-                    if server_password:
-                        ssh_cmd = [
-                            "sshpass",
-                            "-p",
-                            server_password,
-                            "ssh",
-                            "-o",
-                            "StrictHostKeyChecking=no",
-                            "-o",
-                            "UserKnownHostsFile=/dev/null",
-                            "-p",
-                            str(server_port),
-                            f"{server_user}@{server_host}",
-                            "cat /etc/hosts | grep -E '10\\.42\\.42\\.[0-9]+' | grep -v '^#' | grep -v '^$'",
-                        ]
-                    else:
-                        ssh_cmd = [
-                            "ssh",
-                            "-o",
-                            "StrictHostKeyChecking=no",
-                            "-p",
-                            str(server_port),
-                            f"{server_user}@{server_host}",
-                            "cat /etc/hosts | grep -E '10\\.42\\.42\\.[0-9]+' | grep -v '^#' | grep -v '^$'",
-                        ]
-
-                    hosts_result = subprocess.run(
-                        ssh_cmd,
-                        check=False,
-                        capture_output=True,
-                        text=True,
-                        timeout=10,
-                    )
-
-                    if hosts_result.returncode == 0:
-                        cached_count = 0
-                        devices_cached = {}
-                        for line in hosts_result.stdout.strip().split("\n"):
-                            line = line.strip()
-                            if not line:
-                                continue
-                            # Parse /etc/hosts format: "10.42.42.3    imx8mm-jaguar-inst-5120a09dab86563"
-                            parts = line.split()
-                            if len(parts) >= 2:
-                                ip_addr = parts[0].strip()
-                                device_name_parsed = parts[1].strip()
-                                # Only cache Foundries device names
-                                if "imx8mm" in device_name_parsed or "jaguar" in device_name_parsed:
-                                    cache_vpn_ip(device_name_parsed, ip_addr, source="server_hosts")
-                                    cached_count += 1
-                                    devices_cached[device_name_parsed] = ip_addr
-                                    logger.debug(
-                                        f"Cached VPN IP from server /etc/hosts: {device_name_parsed} -> {ip_addr}"
-                                    )
-
-                        return {
-                            "success": True,
-                            "cached_count": cached_count,
-                            "devices_cached": cached_count,
-                            "devices": devices_cached,
-                            "source": "server_hosts",
-                            "message": f"Refreshed VPN IP cache from WireGuard server /etc/hosts: {cached_count} devices cached",
-                        }
-                    return {
-                        "success": False,
-                        "error": f"Failed to read /etc/hosts from server: {hosts_result.stderr}",
-                        "suggestions": [
-                            "Check SSH access to WireGuard server",
-                            "Verify server_host, server_port, and credentials",
-                        ],
-                    }
-                except Exception as e:
-                    logger.error(f"Failed to refresh VPN IP cache from server: {e}", exc_info=True)
-                    return {
-                        "success": False,
-                        "error": f"Failed to refresh from server: {e!s}",
-                        "suggestions": [
-                            "Check SSH access to WireGuard server",
-                            "Try using fioctl instead: refresh_from_server=False",
-                        ],
-                    }
-
-            # Use fioctl to get VPN IPs from device configurations
-            # This uses fioctl to list devices, then checks which have VPN enabled
-            # Note: fioctl doesn't directly provide VPN IPs, but we can use it to identify devices
-
-            # Check if fioctl is installed and configured
-            fioctl_installed, fioctl_error = _check_fioctl_installed()
-            if not fioctl_installed:
-                return {
-                    "success": False,
-                    "error": fioctl_error,
-                    "suggestions": [
-                        "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                        "Or use refresh_from_server=true to refresh from WireGuard server /etc/hosts",
-                    ],
-                }
-
-            fioctl_configured, config_error = _check_fioctl_configured()
-            if not fioctl_configured:
-                return {
-                    "success": False,
-                    "error": config_error,
-                    "suggestions": [
-                        "Run 'fioctl login' to configure FoundriesFactory credentials",
-                        "Or use refresh_from_server=true to refresh from WireGuard server /etc/hosts",
-                    ],
-                }
-
-            # Get fioctl path
-            fioctl_path = _get_fioctl_path()
-            if not fioctl_path:
-                return {
-                    "success": False,
-                    "error": "fioctl not found",
-                    "suggestions": [
-                        "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                    ],
-                }
-
-            # First, list all devices
-            list_cmd = [fioctl_path, "devices", "list"]
-            list_result = subprocess.run(
-                list_cmd,
-                check=False,
-                capture_output=True,
-                text=True,
-                timeout=30,
-            )
-
-            if list_result.returncode != 0:
-                return {
-                    "success": False,
-                    "error": f"Failed to list devices: {list_result.stderr}",
-                    "suggestions": [
-                        "Check fioctl is configured correctly: 'fioctl factories list'",
-                    ],
-                }
-
-            # Parse device names from fioctl output
-            devices = []
-            for line in list_result.stdout.strip().split("\n"):
-                line = line.strip()
-                if not line or line.startswith("NAME") or line.startswith("----"):
-                    continue
-                # Extract device name (first column)
-                parts = [p.strip() for p in line.split() if p.strip()]
-                if parts:
-                    device_name_parsed = parts[0]
-                    # Only process Foundries device names
-                    if "imx8mm" in device_name_parsed or "jaguar" in device_name_parsed:
-                        devices.append(device_name_parsed)
-
-            # Get VPN IP for each device using fioctl devices show
-            # The VPN IP is in the active config under wireguard-client -> address=
-            cached_count = 0
-            errors = []
-            devices_cached = {}
-
-            for device_name_parsed in devices:
-                try:
-                    # Get device details using fioctl devices show
-                    show_cmd = [fioctl_path, "devices", "show", device_name_parsed]
-                    show_result = subprocess.run(
-                        show_cmd,
-                        check=False,
-                        capture_output=True,
-                        text=True,
-                        timeout=10,
-                    )
-
-                    if show_result.returncode == 0:
-                        # Parse output for address= line in wireguard-client section
-                        # Format: "address=10.42.42.3" under "wireguard-client" in Active config
-                        in_wireguard_section = False
-                        for line in show_result.stdout.split("\n"):
-                            line = line.strip()
-                            # Look for wireguard-client section
-                            if "wireguard-client" in line.lower():
-                                in_wireguard_section = True
-                                continue
-                            # Once in wireguard section, look for address= line
-                            if in_wireguard_section:
-                                if line.startswith("address=") or line.startswith("| address="):
-                                    # Handle both "address=..." and "| address=..." formats
-                                    ip_addr = (
-                                        line.split("address=", 1)[1].strip()
-                                        if "address=" in line
-                                        else None
-                                    )
-                                    if ip_addr and ip_addr != "(none)":
-                                        cache_vpn_ip(device_name_parsed, ip_addr, source="fioctl")
-                                        cached_count += 1
-                                        devices_cached[device_name_parsed] = ip_addr
-                                        logger.debug(
-                                            f"Cached VPN IP for {device_name_parsed}: {ip_addr}"
-                                        )
-                                        break
-                                # Stop looking if we hit the next section
-                                elif (
-                                    line
-                                    and not line.startswith("|")
-                                    and not line.startswith("address=")
-                                ):
-                                    # Moved to next section
-                                    in_wireguard_section = False
-                    else:
-                        # Device might not exist or have issues, skip silently
-                        logger.debug(
-                            f"Device {device_name_parsed} show failed (may not exist or have VPN enabled)"
-                        )
-                except Exception as e:
-                    errors.append(f"Failed to get VPN IP for {device_name_parsed}: {e!s}")
-
-            return {
-                "success": True,
-                "cached_count": cached_count,
-                "devices_cached": cached_count,
-                "devices": devices_cached,
-                "source": "fioctl",
-                "devices_checked": len(devices),
-                "message": f"Refreshed VPN IP cache from fioctl: {cached_count} devices cached",
-                "errors": errors if errors else None,
-            }
-
+    handler = _VPN_IP_CACHE_ACTIONS.get(action)
+    if not handler:
         return {
             "success": False,
             "error": f"Unknown action: {action}",
-            "valid_actions": ["get", "list", "set", "remove", "refresh"],
+            "valid_actions": list(_VPN_IP_CACHE_ACTIONS),
+            "suggestions": [f"Use one of: {', '.join(_VPN_IP_CACHE_ACTIONS)}"],
         }
 
+    try:
+        return handler(
+            device_name=device_name,
+            vpn_ip=vpn_ip,
+            refresh_from_server=refresh_from_server,
+            server_host=server_host,
+            server_port=server_port,
+            server_user=server_user,
+            server_password=server_password,
+            force=force,
+        )
     except Exception as e:
         logger.error(f"Failed to manage VPN IP cache: {e}", exc_info=True)
         return {
@@ -10,9 +10,11 @@ License: GPL-3.0-or-later
 """
 
 import json
-import subprocess
+import os
+import re
+import string
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from lab_testing.config import get_foundries_vpn_config
 from lab_testing.utils.foundries_vpn_cache import (
@@ -25,158 +27,210 @@ from lab_testing.utils.logger import get_logger
 
 logger = get_logger()
 
+from lab_testing.tools.foundries_vpn_core import connect_foundries_vpn
 from lab_testing.tools.foundries_vpn_helpers import (
     _check_fioctl_configured,
     _check_fioctl_installed,
     _get_fioctl_path,
+    _get_wg_path,
+)
+from lab_testing.tools.foundries_vpn_server import get_foundries_vpn_server_config
+
+# Keys a usable WireGuard client config must define in each section
+_REQUIRED_INTERFACE_KEYS = frozenset({b"PrivateKey"})
+_REQUIRED_PEER_KEYS = frozenset({b"PublicKey", b"Endpoint"})
+
+# Section headers and the required keys in a WireGuard config, found in one scan.
+# Values keep any base64 "=" padding; comments and other keys don't match.
+_WG_CONFIG_TOKEN_RE = re.compile(
+    rb"^[ \t]*(?:"
+    rb"\[(?P<section>[^\]\r\n]*)\]"
+    rb"|(?P<key>PrivateKey|PublicKey|Endpoint)[ \t]*=[ \t]*(?P<value>[^\r\n]*?)"
+    rb")[ \t\r]*$",
+    re.MULTILINE,
 )
 
+# Client config template written by generate_foundries_vpn_client_config_template
+_CLIENT_CONFIG_TEMPLATE = string.Template("""# Foundries VPN WireGuard Client Configuration
+# Generated automatically - Fill in YOUR_PRIVATE_KEY_HERE and YOUR_VPN_IP_HERE
 
-def check_foundries_vpn_client_config(config_path: Optional[str] = None) -> Dict[str, Any]:
-    """
-    Check if Foundries VPN client configuration file exists and is valid.
+[Interface]
+# Your private key (generate with: wg genkey | tee privatekey | wg pubkey > publickey)
+# Share your public key with VPN administrator to get assigned IP address
+PrivateKey = YOUR_PRIVATE_KEY_HERE
 
-    Validates the WireGuard config file format and checks for required fields.
+# Your assigned VPN IP address (get from VPN administrator)
+# VPN network: $server_address_base.X/24
+Address = YOUR_VPN_IP_HERE
+
+# Optional: DNS servers to use when connected
+# DNS = 8.8.8.8, 8.8.4.4
+
+[Peer]
+# Server's public key (from FoundriesFactory)
+PublicKey = $public_key
+
+# Server endpoint
+Endpoint = $endpoint
+
+# Allowed IPs - routes to send through VPN
+# Use specific subnets for lab network access only
+AllowedIPs = $server_address_base.0/24, 192.168.2.0/24
+
+# Keep connection alive
+PersistentKeepalive = 25
+""")
+
+# Last validation result per client config path, keyed on (st_mtime_ns, st_size)
+_client_config_checks: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+
+def _validate_client_config_content(config_content: bytes, config_path: str) -> Dict[str, Any]:
+    """
+    Validate WireGuard client config content.
 
     Args:
-        config_path: Optional path to config file. If not provided, searches standard locations.
+        config_content: Raw config file content (WireGuard configs are ASCII, so it's
+            parsed without decoding)
+        config_path: Config file path (reported in the result)
 
     Returns:
         Dictionary with validation results
     """
-    try:
-        # Find config file
-        if config_path:
-            vpn_config = Path(config_path)
-        else:
-            vpn_config = get_foundries_vpn_config()
+    has_interface = False
+    has_peer = False
+    interface_keys = set()
+    peer_keys = set()
+    private_key_value = None
+
+    current_section = None
+    for match in _WG_CONFIG_TOKEN_RE.finditer(config_content):
+        section = match.group("section")
+        if section is not None:
+            current_section = section
+            if section == b"Interface":
+                has_interface = True
+            elif section == b"Peer":
+                has_peer = True
+        elif current_section == b"Interface":
+            key = match.group("key")
+            interface_keys.add(key)
+            if key == b"PrivateKey" and private_key_value is None:
+                private_key_value = match.group("value")
+        elif current_section == b"Peer":
+            peer_keys.add(match.group("key"))
+
+    # Check for required sections and keys
+    errors = []
+    if not has_interface:
+        errors.append("Missing [Interface] section")
+    if not has_peer:
+        errors.append("Missing [Peer] section")
+    errors.extend(
+        f"Missing {key.decode()} in [Interface] section"
+        for key in sorted(_REQUIRED_INTERFACE_KEYS - interface_keys)
+    )
+    errors.extend(
+        f"Missing {key.decode()} in [Peer] section"
+        for key in sorted(_REQUIRED_PEER_KEYS - peer_keys)
+    )
+
+    if errors:
+        return {
+            "success": False,
+            "error": "Invalid WireGuard config format",
+            "config_path": config_path,
+            "errors": errors,
+            "suggestions": [
+                "Check config file format matches WireGuard specification",
+                "Generate new config template: generate_foundries_vpn_client_config_template()",
+                "See WireGuard documentation: https://www.wireguard.com/",
+            ],
+        }
 
-        if not vpn_config or not vpn_config.exists():
-            return {
-                "success": False,
-                "error": "Foundries VPN client configuration file not found",
-                "config_path": str(vpn_config) if vpn_config else None,
-                "suggestions": [
-                    "Obtain WireGuard config from FoundriesFactory web interface",
-                    "Generate config template: generate_foundries_vpn_client_config_template()",
-                    "Place config file in one of these locations:",
-                    "  - ~/.config/wireguard/foundries.conf",
-                    "  - {LAB_TESTING_ROOT}/secrets/foundries-vpn.conf",
-                    "Or set FOUNDRIES_VPN_CONFIG_PATH environment variable",
-                ],
-            }
+    # Check if PrivateKey looks valid (base64, 32 bytes = 44 chars)
+    if private_key_value and len(private_key_value) < 40:
+        return {
+            "success": False,
+            "error": "PrivateKey appears invalid (too short)",
+            "config_path": config_path,
+            "suggestions": [
+                "Generate new private key: wg genkey",
+                "Regenerate config file",
+            ],
+        }
 
-        # Read and validate config file
-        try:
-            config_content = vpn_config.read_text()
-        except Exception as e:
-            return {
-                "success": False,
-                "error": f"Failed to read config file: {e!s}",
-                "config_path": str(vpn_config),
-                "suggestions": [
-                    "Check file permissions",
-                    "Ensure file is readable",
-                ],
-            }
+    return {
+        "success": True,
+        "config_path": config_path,
+        "valid": True,
+        "has_interface": True,
+        "has_peer": True,
+        "message": "Foundries VPN client configuration is valid",
+        "next_steps": [
+            "Connect to VPN: connect_foundries_vpn()",
+            "Or use automated setup: setup_foundries_vpn()",
+        ],
+    }
 
-        # Validate WireGuard config format
-        required_sections = ["[Interface]", "[Peer]"]
-        required_interface_keys = ["PrivateKey"]
-        required_peer_keys = ["PublicKey", "Endpoint"]
-
-        has_interface = False
-        has_peer = False
-        interface_keys = set()
-        peer_keys = set()
-
-        current_section = None
-        for line in config_content.split("\n"):
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-
-            if line.startswith("[") and line.endswith("]"):
-                current_section = line
-                if current_section == "[Interface]":
-                    has_interface = True
-                elif current_section == "[Peer]":
-                    has_peer = True
-            elif "=" in line and current_section:
-                key = line.split("=")[0].strip()
-                if current_section == "[Interface]":
-                    interface_keys.add(key)
-                elif current_section == "[Peer]":
-                    peer_keys.add(key)
-
-        # Check for required sections and keys
-        errors = []
-        if not has_interface:
-            errors.append("Missing [Interface] section")
-        if not has_peer:
-            errors.append("Missing [Peer] section")
-        if "PrivateKey" not in interface_keys:
-            errors.append("Missing PrivateKey in [Interface] section")
-        if "PublicKey" not in peer_keys:
-            errors.append("Missing PublicKey in [Peer] section")
-        if "Endpoint" not in peer_keys:
-            errors.append("Missing Endpoint in [Peer] section")
-
-        if errors:
-            return {
-                "success": False,
-                "error": "Invalid WireGuard config format",
-                "config_path": str(vpn_config),
-                "errors": errors,
-                "suggestions": [
-                    "Check config file format matches WireGuard specification",
-                    "Generate new config template: generate_foundries_vpn_client_config_template()",
-                    "See WireGuard documentation: https://www.wireguard.com/",
-                ],
-            }
 
-        # Check if PrivateKey looks valid (base64, 32 bytes = 44 chars)
-        private_key_line = None
-        for line in config_content.split("\n"):
-            if line.strip().startswith("PrivateKey"):
-                private_key_line = line.split("=")[1].strip()
-                break
+def check_foundries_vpn_client_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Check if Foundries VPN client configuration file exists and is valid.
 
-        if private_key_line and len(private_key_line) < 40:
-            return {
-                "success": False,
-                "error": "PrivateKey appears invalid (too short)",
-                "config_path": str(vpn_config),
-                "suggestions": [
-                    "Generate new private key: wg genkey",
-                    "Regenerate config file",
-                ],
-            }
+    Validates the WireGuard config file format and checks for required fields.
 
+    Args:
+        config_path: Optional path to config file. If not provided, searches standard locations.
+
+    Returns:
+        Dictionary with validation results
+    """
+    # Find config file
+    if config_path:
+        vpn_config = Path(config_path)
+    else:
+        vpn_config = get_foundries_vpn_config()
+
+    if not vpn_config or not vpn_config.exists():
         return {
-            "success": True,
-            "config_path": str(vpn_config),
-            "valid": True,
-            "has_interface": True,
-            "has_peer": True,
-            "message": "Foundries VPN client configuration is valid",
-            "next_steps": [
-                "Connect to VPN: connect_foundries_vpn()",
-                "Or use automated setup: setup_foundries_vpn()",
+            "success": False,
+            "error": "Foundries VPN client configuration file not found",
+            "config_path": str(vpn_config) if vpn_config else None,
+            "suggestions": [
+                "Obtain WireGuard config from FoundriesFactory web interface",
+                "Generate config template: generate_foundries_vpn_client_config_template()",
+                "Place config file in one of these locations:",
+                "  - ~/.config/wireguard/foundries.conf",
+                "  - {LAB_TESTING_ROOT}/secrets/foundries-vpn.conf",
+                "Or set FOUNDRIES_VPN_CONFIG_PATH environment variable",
             ],
         }
 
-    except Exception as e:
-        logger.error(f"Failed to check Foundries VPN client config: {e}", exc_info=True)
+    # Read and validate config file, reusing the previous result while it's unchanged
+    try:
+        stat_result = vpn_config.stat()
+        cache_key = (stat_result.st_mtime_ns, stat_result.st_size)
+        cached = _client_config_checks.get(str(vpn_config))
+        if cached and cached[0] == cache_key:
+            return dict(cached[1])
+
+        config_content = vpn_config.read_bytes()
+    except OSError as e:
         return {
             "success": False,
-            "error": f"Failed to check config: {e!s}",
+            "error": f"Failed to read config file: {e!s}",
+            "config_path": str(vpn_config),
             "suggestions": [
-                "Check config file path",
-                "Verify file permissions",
+                "Check file permissions",
+                "Ensure file is readable",
             ],
         }
 
+    result = _validate_client_config_content(config_content, str(vpn_config))
+    _client_config_checks[str(vpn_config)] = (cache_key, result)
+    return dict(result)
+
 
 def generate_foundries_vpn_client_config_template(
     output_path: Optional[str] = None, factory: Optional[str] = None
@@ -194,140 +248,105 @@ def generate_foundries_vpn_client_config_template(
     Returns:
         Dictionary with generation results
     """
-    try:
-        # Check prerequisites
-        fioctl_installed, fioctl_error = _check_fioctl_installed()
-        if not fioctl_installed:
-            return {
-                "success": False,
-                "error": fioctl_error,
-                "suggestions": [
-                    "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                ],
-            }
-
-        fioctl_configured, config_error = _check_fioctl_configured()
-        if not fioctl_configured:
-            return {
-                "success": False,
-                "error": config_error,
-                "suggestions": [
-                    "Run 'fioctl login' to configure FoundriesFactory credentials",
-                ],
-            }
-
-        # Get server configuration
-        server_config = get_foundries_vpn_server_config(factory)
-        if not server_config.get("success"):
-            return {
-                "success": False,
-                "error": "Failed to get VPN server configuration",
-                "details": server_config,
-                "suggestions": [
-                    "Check fioctl is configured correctly",
-                    "Verify VPN server is enabled in FoundriesFactory",
-                ],
-            }
-
-        if not server_config.get("enabled"):
-            return {
-                "success": False,
-                "error": "VPN server is not enabled in FoundriesFactory",
-                "suggestions": [
-                    "Enable VPN server in FoundriesFactory",
-                    "Contact Factory administrator",
-                ],
-            }
-
-        # Determine output path
-        if output_path:
-            config_file = Path(output_path)
-        else:
-            # Use standard location
-            config_file = Path.home() / ".config" / "wireguard" / "foundries.conf"
-            config_file.parent.mkdir(parents=True, exist_ok=True)
-
-        # Check if file already exists
-        if config_file.exists():
-            return {
-                "success": False,
-                "error": f"Config file already exists: {config_file}",
-                "config_path": str(config_file),
-                "suggestions": [
-                    "Delete existing file or use different output_path",
-                    "Check existing config: check_foundries_vpn_client_config()",
-                ],
-            }
-
-        # Generate template
-        server_address_base = server_config.get("address", "10.42.42.1").rsplit(".", 1)[0]
-        template = f"""# Foundries VPN WireGuard Client Configuration
-# Generated automatically - Fill in YOUR_PRIVATE_KEY_HERE and YOUR_VPN_IP_HERE
-
-[Interface]
-# Your private key (generate with: wg genkey | tee privatekey | wg pubkey > publickey)
-# Share your public key with VPN administrator to get assigned IP address
-PrivateKey = YOUR_PRIVATE_KEY_HERE
-
-# Your assigned VPN IP address (get from VPN administrator)
-# VPN network: {server_address_base}.X/24
-Address = YOUR_VPN_IP_HERE
-
-# Optional: DNS servers to use when connected
-# DNS = 8.8.8.8, 8.8.4.4
-
-[Peer]
-# Server's public key (from FoundriesFactory)
-PublicKey = {server_config.get('public_key', '')}
-
-# Server endpoint
-Endpoint = {server_config.get('endpoint', '')}
-
-# Allowed IPs - routes to send through VPN
-# Use specific subnets for lab network access only
-AllowedIPs = {server_address_base}.0/24, 192.168.2.0/24
+    # Check prerequisites
+    fioctl_installed, fioctl_error = _check_fioctl_installed()
+    if not fioctl_installed:
+        return {
+            "success": False,
+            "error": fioctl_error,
+            "suggestions": [
+                "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
+            ],
+        }
 
-# Keep connection alive
-PersistentKeepalive = 25
-"""
+    fioctl_configured, config_error = _check_fioctl_configured()
+    if not fioctl_configured:
+        return {
+            "success": False,
+            "error": config_error,
+            "suggestions": [
+                "Run 'fioctl login' to configure FoundriesFactory credentials",
+            ],
+        }
 
-        # Write template
-        try:
-            config_file.write_text(template)
-            config_file.chmod(0o600)  # Secure permissions
-        except Exception as e:
-            return {
-                "success": False,
-                "error": f"Failed to write config file: {e!s}",
-                "config_path": str(config_file),
-            }
+    # Get server configuration
+    server_config = get_foundries_vpn_server_config(factory)
+    if not server_config.get("success"):
+        return {
+            "success": False,
+            "error": "Failed to get VPN server configuration",
+            "details": server_config,
+            "suggestions": [
+                "Check fioctl is configured correctly",
+                "Verify VPN server is enabled in FoundriesFactory",
+            ],
+        }
 
+    if not server_config.get("enabled"):
         return {
-            "success": True,
-            "config_path": str(config_file),
-            "server_endpoint": server_config.get("endpoint"),
-            "server_address": server_config.get("address"),
-            "server_public_key": server_config.get("public_key"),
-            "message": f"Config template generated at {config_file}",
-            "next_steps": [
-                "1. Generate your private key: wg genkey | tee privatekey | wg pubkey > publickey",
-                "2. Share your public key with VPN administrator to get assigned IP address",
-                "3. Edit config file and replace YOUR_PRIVATE_KEY_HERE and YOUR_VPN_IP_HERE",
-                "4. Check config: check_foundries_vpn_client_config()",
-                "5. Connect: connect_foundries_vpn() or setup_foundries_vpn()",
+            "success": False,
+            "error": "VPN server is not enabled in FoundriesFactory",
+            "suggestions": [
+                "Enable VPN server in FoundriesFactory",
+                "Contact Factory administrator",
             ],
         }
 
-    except Exception as e:
-        logger.error(f"Failed to generate VPN client config template: {e}", exc_info=True)
+    # Determine output path (default: standard location)
+    if output_path:
+        config_file = Path(output_path)
+    else:
+        config_file = Path.home() / ".config" / "wireguard" / "foundries.conf"
+
+    # Generate template
+    server_address_base = server_config.get("address", "10.42.42.1").rsplit(".", 1)[0]
+    template = _CLIENT_CONFIG_TEMPLATE.substitute(
+        server_address_base=server_address_base,
+        public_key=server_config.get("public_key", ""),
+        endpoint=server_config.get("endpoint", ""),
+    )
+
+    # Write template, created with secure permissions. O_EXCL refuses to overwrite an
+    # existing config without a separate exists() check.
+    try:
+        if not output_path:
+            config_file.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(config_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(template)
+    except FileExistsError:
         return {
             "success": False,
-            "error": f"Failed to generate template: {e!s}",
+            "error": f"Config file already exists: {config_file}",
+            "config_path": str(config_file),
             "suggestions": [
-                "Check fioctl is installed and configured",
-                "Verify VPN server is enabled",
+                "Delete existing file or use different output_path",
+                "Check existing config: check_foundries_vpn_client_config()",
             ],
         }
+    except OSError as e:
+        logger.error(f"Failed to write VPN client config template: {e}")
+        return {
+            "success": False,
+            "error": f"Failed to write config file: {e!s}",
+            "config_path": str(config_file),
+        }
+
+    return {
+        "success": True,
+        "config_path": str(config_file),
+        "server_endpoint": server_config.get("endpoint"),
+        "server_address": server_config.get("address"),
+        "server_public_key": server_config.get("public_key"),
+        "message": f"Config template generated at {config_file}",
+        "next_steps": [
+            "1. Generate your private key: wg genkey | tee privatekey | wg pubkey > publickey",
+            "2. Share your public key with VPN administrator to get assigned IP address",
+            "3. Edit config file and replace YOUR_PRIVATE_KEY_HERE and YOUR_VPN_IP_HERE",
+            "4. Check config: check_foundries_vpn_client_config()",
+            "5. Connect: connect_foundries_vpn() or setup_foundries_vpn()",
+        ],
+    }
 
 
 def setup_foundries_vpn(
@@ -349,153 +368,135 @@ def setup_foundries_vpn(
     Returns:
         Dictionary with setup results
     """
-    try:
-        steps_completed = []
-        steps_failed = []
+    steps_completed = []
+    steps_failed = []
 
-        # Step 1: Check fioctl installation
-        fioctl_installed, fioctl_error = _check_fioctl_installed()
-        if not fioctl_installed:
-            return {
-                "success": False,
-                "error": fioctl_error,
-                "steps_completed": steps_completed,
-                "steps_failed": ["Check fioctl installation"],
-                "suggestions": [
-                    "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                ],
-            }
-        steps_completed.append("fioctl installed")
+    # Step 1: Check fioctl installation
+    fioctl_installed, fioctl_error = _check_fioctl_installed()
+    if not fioctl_installed:
+        return {
+            "success": False,
+            "error": fioctl_error,
+            "steps_completed": steps_completed,
+            "steps_failed": ["Check fioctl installation"],
+            "suggestions": [
+                "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
+            ],
+        }
+    steps_completed.append("fioctl installed")
 
-        # Step 2: Check fioctl configuration
-        fioctl_configured, config_error = _check_fioctl_configured()
-        if not fioctl_configured:
-            return {
-                "success": False,
-                "error": config_error,
-                "steps_completed": steps_completed,
-                "steps_failed": ["Check fioctl configuration"],
-                "suggestions": [
-                    "Run 'fioctl login' to configure FoundriesFactory credentials",
-                ],
-            }
-        steps_completed.append("fioctl configured")
+    # Step 2: Check fioctl configuration. The probe result is cached, so fetching the
+    # server config below reuses it instead of running fioctl again
+    fioctl_configured, config_error = _check_fioctl_configured()
+    if not fioctl_configured:
+        return {
+            "success": False,
+            "error": config_error,
+            "steps_completed": steps_completed,
+            "steps_failed": ["Check fioctl configuration"],
+            "suggestions": [
+                "Run 'fioctl login' to configure FoundriesFactory credentials",
+            ],
+        }
+    steps_completed.append("fioctl configured")
 
-        # Step 3: Check WireGuard tools
-        wg_check = subprocess.run(
-            ["which", "wg"], check=False, capture_output=True, text=True, timeout=5
-        )
-        if wg_check.returncode != 0:
-            return {
-                "success": False,
-                "error": "WireGuard tools not installed",
-                "steps_completed": steps_completed,
-                "steps_failed": ["Check WireGuard tools"],
-                "suggestions": [
-                    "Install WireGuard tools: sudo apt install wireguard-tools",
-                    "Or: sudo yum install wireguard-tools",
-                ],
-            }
-        steps_completed.append("WireGuard tools installed")
+    # Step 3: Check WireGuard tools
+    if not _get_wg_path():
+        return {
+            "success": False,
+            "error": "WireGuard tools not installed",
+            "steps_completed": steps_completed,
+            "steps_failed": ["Check WireGuard tools"],
+            "suggestions": [
+                "Install WireGuard tools: sudo apt install wireguard-tools",
+                "Or: sudo yum install wireguard-tools",
+            ],
+        }
+    steps_completed.append("WireGuard tools installed")
 
-        # Step 4: Get server configuration
-        server_config = get_foundries_vpn_server_config(factory)
-        if not server_config.get("success"):
-            return {
-                "success": False,
-                "error": "Failed to get VPN server configuration",
-                "steps_completed": steps_completed,
-                "steps_failed": ["Get server configuration"],
-                "details": server_config,
-            }
-        steps_completed.append("Server configuration retrieved")
+    # Step 4: Get server configuration
+    server_config = get_foundries_vpn_server_config(factory)
+    if not server_config.get("success"):
+        return {
+            "success": False,
+            "error": "Failed to get VPN server configuration",
+            "steps_completed": steps_completed,
+            "steps_failed": ["Get server configuration"],
+            "details": server_config,
+        }
+    steps_completed.append("Server configuration retrieved")
 
-        if not server_config.get("enabled"):
-            return {
-                "success": False,
-                "error": "VPN server is not enabled in FoundriesFactory",
-                "steps_completed": steps_completed,
-                "steps_failed": ["VPN server enabled"],
-                "suggestions": [
-                    "Enable VPN server in FoundriesFactory",
-                    "Contact Factory administrator",
-                ],
-            }
-        steps_completed.append("VPN server enabled")
-
-        # Step 5: Check or generate client config
-        client_config_check = check_foundries_vpn_client_config(config_path)
-        if not client_config_check.get("success"):
-            if auto_generate_config:
-                # Generate template config
-                template_result = generate_foundries_vpn_client_config_template(
-                    config_path, factory
-                )
-                if template_result.get("success"):
-                    steps_completed.append("Config template generated")
-                    return {
-                        "success": False,
-                        "error": "Client config template generated but requires manual editing",
-                        "steps_completed": steps_completed,
-                        "config_path": template_result.get("config_path"),
-                        "next_steps": template_result.get("next_steps", []),
-                        "message": "Template generated. Edit config file with your private key and assigned IP, then run setup_foundries_vpn() again.",
-                    }
-                steps_failed.append("Generate config template")
+    if not server_config.get("enabled"):
+        return {
+            "success": False,
+            "error": "VPN server is not enabled in FoundriesFactory",
+            "steps_completed": steps_completed,
+            "steps_failed": ["VPN server enabled"],
+            "suggestions": [
+                "Enable VPN server in FoundriesFactory",
+                "Contact Factory administrator",
+            ],
+        }
+    steps_completed.append("VPN server enabled")
+
+    # Step 5: Check or generate client config (cached while the file is unchanged)
+    client_config_check = check_foundries_vpn_client_config(config_path)
+    if not client_config_check.get("success"):
+        if auto_generate_config:
+            # Generate template config
+            template_result = generate_foundries_vpn_client_config_template(config_path, factory)
+            if template_result.get("success"):
+                steps_completed.append("Config template generated")
                 return {
                     "success": False,
-                    "error": "Failed to generate config template",
+                    "error": "Client config template generated but requires manual editing",
                     "steps_completed": steps_completed,
-                    "steps_failed": steps_failed,
-                    "details": template_result,
+                    "config_path": template_result.get("config_path"),
+                    "next_steps": template_result.get("next_steps", []),
+                    "message": "Template generated. Edit config file with your private key and assigned IP, then run setup_foundries_vpn() again.",
                 }
-            steps_failed.append("Client config found")
+            steps_failed.append("Generate config template")
             return {
                 "success": False,
-                "error": "Client configuration not found",
+                "error": "Failed to generate config template",
                 "steps_completed": steps_completed,
                 "steps_failed": steps_failed,
-                "details": client_config_check,
-                "suggestions": [
-                    "Obtain config from FoundriesFactory web interface",
-                    "Or run: generate_foundries_vpn_client_config_template()",
-                    "Or use auto_generate_config=True to generate template",
-                ],
+                "details": template_result,
             }
-        steps_completed.append("Client config found and valid")
-
-        # Step 6: Connect to VPN
-        connect_result = connect_foundries_vpn(config_path)
-        if connect_result.get("success"):
-            steps_completed.append("VPN connected")
-            return {
-                "success": True,
-                "steps_completed": steps_completed,
-                "connection_method": connect_result.get("method"),
-                "message": "Foundries VPN setup completed successfully",
-                "next_steps": [
-                    "List devices: list_foundries_devices()",
-                    "Test device connectivity: test_device(device_id)",
-                ],
-            }
-        steps_failed.append("Connect to VPN")
+        steps_failed.append("Client config found")
         return {
             "success": False,
-            "error": "Failed to connect to VPN",
+            "error": "Client configuration not found",
             "steps_completed": steps_completed,
             "steps_failed": steps_failed,
-            "details": connect_result,
+            "details": client_config_check,
+            "suggestions": [
+                "Obtain config from FoundriesFactory web interface",
+                "Or run: generate_foundries_vpn_client_config_template()",
+                "Or use auto_generate_config=True to generate template",
+            ],
         }
+    steps_completed.append("Client config found and valid")
 
-    except Exception as e:
-        logger.error(f"Failed to setup Foundries VPN: {e}", exc_info=True)
+    # Step 6: Connect to VPN, using the config path resolved and validated in step 5
+    connect_result = connect_foundries_vpn(client_config_check["config_path"])
+    if connect_result.get("success"):
+        steps_completed.append("VPN connected")
         return {
-            "success": False,
-            "error": f"Setup failed: {e!s}",
-            "steps_completed": steps_completed if "steps_completed" in locals() else [],
-            "steps_failed": steps_failed if "steps_failed" in locals() else [],
-            "suggestions": [
-                "Check prerequisites manually",
-                "Review error details",
+            "success": True,
+            "steps_completed": steps_completed,
+            "connection_method": connect_result.get("method"),
+            "message": "Foundries VPN setup completed successfully",
+            "next_steps": [
+                "List devices: list_foundries_devices()",
+                "Test device connectivity: test_device(device_id)",
             ],
         }
+    steps_failed.append("Connect to VPN")
+    return {
+        "success": False,
+        "error": "Failed to connect to VPN",
+        "steps_completed": steps_completed,
+        "steps_failed": steps_failed,
+        "details": connect_result,
+    }
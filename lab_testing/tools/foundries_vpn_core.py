@@ -8,6 +8,8 @@ License: GPL-3.0-or-later
 """
 
 import subprocess
+import threading
+import time
 from pathlib import Path
 from typing import Any, Dict, Optional
 
@@ -16,11 +18,22 @@ from lab_testing.tools.foundries_vpn_helpers import (
     _check_fioctl_configured,
     _check_fioctl_installed,
 )
+from lab_testing.tools.foundries_vpn_peer import (
+    _derive_public_key,
+    check_client_peer_registered,
+)
 from lab_testing.tools.foundries_vpn_server import get_foundries_vpn_server_config
 from lab_testing.utils.logger import get_logger
 
 logger = get_logger()
 
+# foundries_vpn_status() results are reused for this long within a tool call (seconds)
+_VPN_STATUS_TTL_SECONDS = 5.0
+
+# Last foundries_vpn_status() result and when it was taken (see _cached_vpn_status)
+_vpn_status_cache: Dict[str, Any] = {"result": None, "fetched_at": 0.0}
+_vpn_status_lock = threading.Lock()
+
 
 def foundries_vpn_status() -> Dict[str, Any]:
     """
@@ -122,6 +135,35 @@ def foundries_vpn_status() -> Dict[str, Any]:
         }
 
 
+def _cached_vpn_status() -> Dict[str, Any]:
+    """
+    Get foundries_vpn_status(), reusing a result taken in the last few seconds.
+
+    Callers that chain several VPN tools (e.g. registration followed by its
+    check) would otherwise re-run the wg/nmcli probes for each step.
+
+    Returns:
+        Dictionary with Foundries VPN status information
+    """
+    with _vpn_status_lock:
+        cached = _vpn_status_cache["result"]
+        if cached and time.monotonic() - _vpn_status_cache["fetched_at"] < _VPN_STATUS_TTL_SECONDS:
+            return cached
+
+    status = foundries_vpn_status()
+    with _vpn_status_lock:
+        _vpn_status_cache["result"] = status
+        _vpn_status_cache["fetched_at"] = time.monotonic()
+    return status
+
+
+def _invalidate_vpn_status():
+    """Drop the cached VPN status; called whenever a VPN is brought up or down"""
+    with _vpn_status_lock:
+        _vpn_status_cache["result"] = None
+        _vpn_status_cache["fetched_at"] = 0.0
+
+
 def connect_foundries_vpn(config_path: Optional[str] = None) -> Dict[str, Any]:
     """
     Connect to Foundries VPN server.
@@ -136,6 +178,9 @@ def connect_foundries_vpn(config_path: Optional[str] = None) -> Dict[str, Any]:
     Returns:
         Dictionary with connection results
     """
+    # Status taken before this connection attempt no longer applies
+    _invalidate_vpn_status()
+
     try:
         # Check if fioctl is installed and configured
         fioctl_installed, fioctl_error = _check_fioctl_installed()
@@ -279,36 +324,18 @@ def connect_foundries_vpn(config_path: Optional[str] = None) -> Dict[str, Any]:
 
         # Try to check client peer registration if we can derive public key
         try:
-            config_content = vpn_config.read_text()
-            for line in config_content.split("\n"):
-                if "PrivateKey" in line and "=" in line:
-                    privkey = line.split("=", 1)[1].strip()
-                    result = subprocess.run(
-                        ["wg", "pubkey"],
-                        check=False,
-                        input=privkey.encode(),
-                        capture_output=True,
-                        text=True,
-                        timeout=5,
+            pubkey = _derive_public_key(vpn_config.read_bytes())
+            if pubkey:
+                client_check = check_client_peer_registered(client_public_key=pubkey)
+                if client_check.get("registered") is False:
+                    suggestions.insert(
+                        0, "⚠️  CRITICAL: Client peer may not be registered on server"
                     )
-                    if result.returncode == 0:
-                        pubkey = result.stdout.strip()
-                        client_check = check_client_peer_registered(client_public_key=pubkey)
-                        if client_check and not client_check.get("registered"):
-                            suggestions.insert(
-                                0, "⚠️  CRITICAL: Client peer may not be registered on server"
-                            )
-                            suggestions.insert(
-                                1, "Check registration: check_client_peer_registered()"
-                            )
-                            suggestions.insert(
-                                2,
-                                "Register if needed: register_foundries_vpn_client() (requires admin)",
-                            )
-                            suggestions.insert(
-                                3, "Or contact VPN admin: ajlennon@dynamicdevices.co.uk"
-                            )
-                        break
+                    suggestions.insert(1, "Check registration: check_client_peer_registered()")
+                    suggestions.insert(
+                        2, "Register if needed: register_foundries_vpn_client() (requires admin)"
+                    )
+                    suggestions.insert(3, "Or contact VPN admin: ajlennon@dynamicdevices.co.uk")
         except Exception:
             pass  # Ignore errors in client check
 
@@ -358,24 +385,9 @@ def verify_foundries_vpn_connection() -> Dict[str, Any]:
             try:
                 config_path = get_foundries_vpn_config()
                 if config_path and config_path.exists():
-                    config_content = config_path.read_text()
-                    for line in config_content.split("\n"):
-                        if "PrivateKey" in line and "=" in line:
-                            privkey = line.split("=", 1)[1].strip()
-                            result = subprocess.run(
-                                ["wg", "pubkey"],
-                                check=False,
-                                input=privkey.encode(),
-                                capture_output=True,
-                                text=True,
-                                timeout=5,
-                            )
-                            if result.returncode == 0:
-                                pubkey = result.stdout.strip()
-                                client_check = check_client_peer_registered(
-                                    client_public_key=pubkey
-                                )
-                                break
+                    pubkey = _derive_public_key(config_path.read_bytes())
+                    if pubkey:
+                        client_check = check_client_peer_registered(client_public_key=pubkey)
             except Exception:
                 pass  # Ignore errors in client check
 
@@ -384,7 +396,7 @@ def verify_foundries_vpn_connection() -> Dict[str, Any]:
                 "Or run automated setup: setup_foundries_vpn()",
             ]
 
-            if client_check and not client_check.get("registered"):
+            if client_check and client_check.get("registered") is False:
                 suggestions.insert(0, "⚠️  CRITICAL: Client peer may not be registered on server")
                 suggestions.insert(1, "Check registration: check_client_peer_registered()")
                 suggestions.insert(
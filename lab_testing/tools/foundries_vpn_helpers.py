@@ -7,45 +7,121 @@ Copyright (C) 2025 Dynamic Devices Ltd
 License: GPL-3.0-or-later
 """
 
+import functools
 import shutil
 import subprocess
+import time
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 
+# How long a successful fioctl probe is reused before probing again (seconds)
+FIOCTL_PROBE_TTL_SECONDS = 60
 
-def _check_fioctl_installed() -> tuple:
+# Suggestions returned by tools when fioctl is missing or not logged in
+_FIOCTL_UNAVAILABLE_SUGGESTIONS = (
+    "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
+    "Run 'fioctl login' to configure FoundriesFactory credentials",
+)
+
+
+def _cache_successful_probe(func: Callable) -> Callable:
+    """
+    Reuse a successful probe result for FIOCTL_PROBE_TTL_SECONDS.
+
+    The fioctl probes spawn subprocesses but their result rarely changes within a
+    process. Failures are not cached, so installing fioctl or running 'fioctl login'
+    takes effect on the next call. Pass refresh=True (or call func.cache_clear()) to
+    force a re-probe.
+    """
+    cache = {}
+
+    @functools.wraps(func)
+    def wrapper(refresh: bool = False):
+        cached = cache.get("entry")
+        if not refresh and cached and time.monotonic() - cached[0] < FIOCTL_PROBE_TTL_SECONDS:
+            return cached[1]
+
+        result = func()
+        succeeded = result[0] if isinstance(result, tuple) else bool(result)
+        if succeeded:
+            cache["entry"] = (time.monotonic(), result)
+        return result
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+
+def _invalidate_fioctl_cache():
+    """
+    Forget cached fioctl probe results so the next check probes again.
+
+    Called when an fioctl command fails, since the failure may mean the cached
+    path or login no longer holds (e.g. fioctl removed or credentials expired).
+    """
+    _get_fioctl_path.cache_clear()
+    _check_fioctl_configured.cache_clear()
+
+
+def _check_fioctl_installed(refresh: bool = False) -> tuple:
     """
     Check if fioctl CLI tool is installed.
 
-    Checks both PATH and common installation locations.
+    Checks both PATH and common installation locations. This doesn't run fioctl;
+    _check_fioctl_configured reports an fioctl that is found but won't execute.
+
+    Args:
+        refresh: If True, search again even if a path is cached
 
     Returns:
         Tuple of (is_installed, error_message)
     """
-    fioctl_path = _get_fioctl_path()
-    if not fioctl_path:
-        return (
-            False,
-            "fioctl not found in PATH or common locations. Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-        )
+    if _get_fioctl_path(refresh=refresh):
+        return True, None
+    return (
+        False,
+        "fioctl not found in PATH or common locations. Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
+    )
 
-    # Verify fioctl works by checking version (fioctl uses 'version' subcommand, not '--version')
-    try:
-        result = subprocess.run(
-            [fioctl_path, "version"],
-            check=False,
-            capture_output=True,
-            text=True,
-            timeout=5,
-        )
-        if result.returncode == 0:
-            return True, None
-    except Exception as e:
-        return False, f"fioctl found but failed to execute: {e!s}"
 
-    return False, "fioctl found but version check failed"
+def _resolve_fioctl() -> Tuple[Optional[str], Optional[str]]:
+    """
+    Find fioctl and check it is configured, in one call.
 
+    Combines _get_fioctl_path and _check_fioctl_configured (both cached), so tools
+    need a single probe before running fioctl.
 
+    Returns:
+        Tuple of (fioctl_path, error_message); fioctl_path is None on error
+    """
+    fioctl_installed, fioctl_error = _check_fioctl_installed()
+    if not fioctl_installed:
+        return None, fioctl_error
+
+    fioctl_configured, config_error = _check_fioctl_configured()
+    if not fioctl_configured:
+        return None, config_error
+
+    return _get_fioctl_path(), None
+
+
+def _fioctl_unavailable(error: Optional[str]) -> Dict[str, Any]:
+    """
+    Build the tool response for a failed _resolve_fioctl().
+
+    Args:
+        error: Error message from _resolve_fioctl
+
+    Returns:
+        Error dictionary with fioctl setup suggestions
+    """
+    return {
+        "success": False,
+        "error": error,
+        "suggestions": list(_FIOCTL_UNAVAILABLE_SUGGESTIONS),
+    }
+
+
+@_cache_successful_probe
 def _get_fioctl_path() -> Optional[str]:
     """
     Get the path to fioctl executable.
@@ -53,8 +129,6 @@ def _get_fioctl_path() -> Optional[str]:
     Returns:
         Path to fioctl, or None if not found
     """
-    import shutil
-
     # Check PATH first
     fioctl_path = shutil.which("fioctl")
     if fioctl_path:
@@ -62,23 +136,48 @@ def _get_fioctl_path() -> Optional[str]:
 
     # Check common installation locations
     common_paths = [
-        "/usr/local/bin/fioctl",
-        "/usr/bin/fioctl",
+        Path("/usr/local/bin/fioctl"),
+        Path("/usr/bin/fioctl"),
         Path.home() / ".local/bin/fioctl",
     ]
 
     for path in common_paths:
-        path_str = str(path) if isinstance(path, Path) else path
-        if Path(path_str).exists():
-            return path_str
+        if path.exists():
+            return str(path)
 
     return None
 
 
+@_cache_successful_probe
+def _get_wg_path() -> Optional[str]:
+    """
+    Get the path to the WireGuard 'wg' tool.
+
+    Returns:
+        Path to wg, or None if not found
+    """
+    return shutil.which("wg")
+
+
+@_cache_successful_probe
+def _get_fping_path() -> Optional[str]:
+    """
+    Get the path to fping, which pings many hosts from one process.
+
+    Returns:
+        Path to fping, or None if not installed
+    """
+    return shutil.which("fping")
+
+
+@_cache_successful_probe
 def _check_fioctl_configured() -> tuple:
     """
     Check if fioctl is configured with Factory credentials.
 
+    Runs 'fioctl factories list', which also proves fioctl executes, so no separate
+    'fioctl version' run is needed.
+
     Returns:
         Tuple of (is_configured, error_message)
     """
@@ -94,8 +193,11 @@ def _check_fioctl_configured() -> tuple:
             text=True,
             timeout=10,
         )
-        if result.returncode == 0:
-            return True, None
-        return False, "fioctl not configured. Run 'fioctl login' to configure credentials"
+    except OSError as e:
+        return False, f"fioctl found but failed to execute: {e!s}"
     except Exception as e:
         return False, f"Failed to check fioctl configuration: {e!s}"
+
+    if result.returncode == 0:
+        return True, None
+    return False, "fioctl not configured. Run 'fioctl login' to configure credentials"
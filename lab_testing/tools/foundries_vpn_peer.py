@@ -9,22 +9,47 @@ Copyright (C) 2025 Dynamic Devices Ltd
 License: GPL-3.0-or-later
 """
 
+import atexit
+import base64
+import ipaddress
 import json
+import os
+import re
+import shlex
 import subprocess
+import tempfile
+import threading
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from lab_testing.config import get_foundries_vpn_config
 from lab_testing.utils.foundries_vpn_cache import (
+    cache_peer_registration,
+    cache_pubkey,
     cache_vpn_ip,
     get_all_cached_ips,
+    get_cached_peer_registration,
+    get_cached_pubkey,
     get_vpn_ip,
+    remove_peer_registration,
     remove_vpn_ip,
 )
 from lab_testing.utils.logger import get_logger
+from lab_testing.utils.ssh_pool import get_ssh_multiplex_options
 
 logger = get_logger()
 
+# Derive client public keys in-process when cryptography is available; otherwise
+# fall back to `wg pubkey`
+try:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
 from lab_testing.config import get_foundries_vpn_config
 from lab_testing.tools.foundries_vpn_helpers import (
     _check_fioctl_configured,
@@ -32,6 +57,242 @@ from lab_testing.tools.foundries_vpn_helpers import (
     _get_fioctl_path,
 )
 
+# PrivateKey value in a client WireGuard config (matched on the raw file bytes)
+_PRIVKEY_RE = re.compile(rb"^[ \t]*PrivateKey[ \t]*=[ \t]*(\S+)", re.MULTILINE)
+
+# A WireGuard public key is 32 bytes, base64-encoded to 44 characters
+_WG_KEY_LENGTH = 44
+_WG_KEY_BYTES = 32
+
+# Separates the sections of batched remote command output
+_OUTPUT_SEPARATOR = "---SEP---"
+
+# Fail fast on an unreachable server (connect) or a dead connection (keepalives),
+# well before the subprocess timeout
+_SSH_LIVENESS_OPTIONS = (
+    "-o",
+    "ConnectTimeout=5",
+    "-o",
+    "ServerAliveInterval=5",
+    "-o",
+    "ServerAliveCountMax=2",
+)
+
+# ssh argv up to the port/destination, built once (see _build_ssh_argv); password
+# logins also skip the known_hosts file
+_SSH_ARGV_PREFIX = (
+    "ssh",
+    *get_ssh_multiplex_options(),
+    *_SSH_LIVENESS_OPTIONS,
+    "-o",
+    "StrictHostKeyChecking=no",
+)
+_SSH_PASSWORD_ARGV_PREFIX = (*_SSH_ARGV_PREFIX, "-o", "UserKnownHostsFile=/dev/null")
+
+# Environment variable the SSH_ASKPASS helper reads the server password from
+_ASKPASS_PASSWORD_VAR = "FOUNDRIES_VPN_PW"
+
+# SSH_ASKPASS helper script (see _build_ssh_env)
+_ASKPASS_SCRIPT = "#!/bin/sh\nprintf '%s\\n' \"$FOUNDRIES_VPN_PW\"\n"
+
+# Step markers printed by the batched registration script: "STEP:<name>" for steps
+# shared by all peers, "STEP:<peer index>:<name>" for per-peer steps
+_STEP_RE = re.compile(r"^STEP:(?:(\d+):)?(\w+)$", re.MULTILINE)
+
+# Client peers managed by the WireGuard server's config daemon
+_CLIENT_PEERS_FILE = "/etc/wireguard/factory-clients.conf"
+
+# Servers with peers registered using defer_save=True whose interface config has not
+# been saved yet: (host, port, user) -> password (see flush_foundries_vpn_config)
+_pending_saves: Dict[Tuple[str, int, str], Optional[str]] = {}
+_pending_saves_lock = threading.Lock()
+
+# foundries_vpn_core imports this module, so its status function is bound on first use
+_foundries_vpn_status: Optional[Callable[[], Dict[str, Any]]] = None
+
+
+def _get_status_fn() -> Callable[[], Dict[str, Any]]:
+    """Get foundries_vpn_core's cached VPN status function, importing it on first use"""
+    global _foundries_vpn_status
+    if _foundries_vpn_status is None:
+        from lab_testing.tools.foundries_vpn_core import _cached_vpn_status
+
+        _foundries_vpn_status = _cached_vpn_status
+    return _foundries_vpn_status
+
+
+def _build_ssh_argv(
+    server_host: str, server_port: int, server_user: str, server_password: Optional[str]
+) -> List[str]:
+    """
+    Build the SSH argv prefix for running commands on the WireGuard server.
+
+    Every command reuses one ControlMaster connection per user/host/port, so only
+    the first pays for the TCP and authentication handshakes. An unreachable or
+    stalled server fails within seconds rather than at the caller's timeout. The
+    argv is run without a local shell; the remote command is appended as the last
+    element. Password authentication is handled through the environment (see _build_ssh_env).
+
+    Returns:
+        SSH argv prefix; append the remote command string
+    """
+    prefix = _SSH_PASSWORD_ARGV_PREFIX if server_password else _SSH_ARGV_PREFIX
+    return [*prefix, "-p", str(server_port), f"{server_user}@{server_host}"]
+
+
+@lru_cache(maxsize=1)
+def _get_askpass_path() -> str:
+    """
+    Create the SSH_ASKPASS helper, which prints the password from the environment.
+
+    The helper holds no secret, so one file is shared for the process lifetime.
+
+    Returns:
+        Path to the executable helper script
+    """
+    fd, path = tempfile.mkstemp(prefix="foundries_vpn_askpass_", suffix=".sh")
+    with os.fdopen(fd, "w") as f:
+        f.write(_ASKPASS_SCRIPT)
+    os.chmod(path, 0o700)
+    atexit.register(os.unlink, path)
+    return path
+
+
+def _build_ssh_env(server_password: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Build the environment for SSH commands to the WireGuard server.
+
+    With a password, ssh reads it through SSH_ASKPASS instead of a sshpass wrapper,
+    keeping it off the command line and saving a process per command.
+
+    Returns:
+        Environment for subprocess.run, or None to inherit the current one
+    """
+    if not server_password:
+        return None
+    return {
+        **os.environ,
+        "SSH_ASKPASS": _get_askpass_path(),
+        "SSH_ASKPASS_REQUIRE": "force",
+        # OpenSSH before 8.4 ignores SSH_ASKPASS_REQUIRE and only asks with a DISPLAY set
+        "DISPLAY": os.environ.get("DISPLAY", ":0"),
+        _ASKPASS_PASSWORD_VAR: server_password,
+    }
+
+
+def _parse_runtime_peers(dump_output: str) -> Dict[str, str]:
+    """Parse `wg show <interface> dump` output into {public key: allowed ips}"""
+    # The first line describes the interface; peer lines are tab-separated:
+    # public-key, preshared-key, endpoint, allowed-ips, latest-handshake, rx, tx, keepalive
+    peers = {}
+    for line in dump_output.splitlines()[1:]:
+        fields = line.split("\t")
+        if len(fields) >= 4:
+            peers[fields[0]] = fields[3]
+    return peers
+
+
+def _fetch_runtime_peers(
+    ssh_argv: List[str], ssh_env: Optional[Dict[str, str]]
+) -> Optional[Dict[str, str]]:
+    """
+    Fetch the WireGuard server's runtime peers with one `wg show factory dump`.
+
+    Args:
+        ssh_argv: SSH argv prefix from _build_ssh_argv
+        ssh_env: SSH environment from _build_ssh_env
+
+    Returns:
+        Dictionary mapping peer public key -> allowed ips, or None if the server
+        could not be queried
+    """
+    result = subprocess.run(
+        [*ssh_argv, "wg show factory dump"],
+        env=ssh_env,
+        check=False,
+        capture_output=True,
+        text=True,
+        timeout=10,
+    )
+    if result.returncode != 0:
+        logger.debug("Failed to fetch WireGuard runtime peers: %s", result.stderr.strip())
+        return None
+
+    return _parse_runtime_peers(result.stdout)
+
+
+def _validate_public_key(public_key: Any) -> Optional[str]:
+    """
+    Check a WireGuard public key before it is used in a command on the server.
+
+    Args:
+        public_key: Key to check
+
+    Returns:
+        Error message, or None if the key is valid
+    """
+    if not isinstance(public_key, str) or len(public_key) != _WG_KEY_LENGTH:
+        return f"Invalid WireGuard public key (expected {_WG_KEY_LENGTH} base64 characters)"
+    try:
+        key_bytes = base64.b64decode(public_key, validate=True)
+    except ValueError:
+        return "Invalid WireGuard public key (not valid base64)"
+    if len(key_bytes) != _WG_KEY_BYTES:
+        return f"Invalid WireGuard public key (expected {_WG_KEY_BYTES} bytes)"
+    return None
+
+
+def _validate_peer(peer: Any) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Check a peer to register before its values are used in a command on the server.
+
+    Args:
+        peer: Peer entry, {"client_public_key": ..., "assigned_ip": ...}
+
+    Returns:
+        Tuple of (public key, normalized IPv4 address, error message); the key and
+        address are None when the peer is invalid
+    """
+    if not isinstance(peer, dict):
+        return None, None, "Peer must be an object with client_public_key and assigned_ip"
+    key_error = _validate_public_key(peer.get("client_public_key"))
+    if key_error:
+        return None, None, key_error
+    try:
+        assigned_ip = str(ipaddress.IPv4Address(str(peer.get("assigned_ip"))))
+    except ValueError:
+        return None, None, f"Invalid assigned_ip: {peer.get('assigned_ip')!r}"
+    return peer["client_public_key"], assigned_ip, None
+
+
+def _derive_public_key(config_content: bytes) -> Optional[str]:
+    """Derive the WireGuard public key from the PrivateKey in a client config"""
+    match = _PRIVKEY_RE.search(config_content)
+    if not match:
+        return None
+    privkey = match.group(1)
+
+    if HAS_CRYPTOGRAPHY:
+        # A WireGuard public key is the X25519 base-point multiple of the private key
+        try:
+            private_key = X25519PrivateKey.from_private_bytes(base64.b64decode(privkey))
+        except ValueError as e:
+            logger.warning("Invalid PrivateKey in client config: %s", e)
+            return None
+        public_key = private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        return base64.b64encode(public_key).decode()
+
+    result = subprocess.run(
+        ["wg", "pubkey"],
+        check=False,
+        input=privkey,
+        capture_output=True,
+        timeout=5,
+    )
+    if result.returncode == 0:
+        return result.stdout.decode().strip()
+    return None
+
 
 def check_client_peer_registered(
     client_public_key: Optional[str] = None,
@@ -64,22 +325,13 @@ def check_client_peer_registered(
             config_path = get_foundries_vpn_config()
             if config_path and config_path.exists():
                 try:
-                    config_content = config_path.read_text()
-                    for line in config_content.split("\n"):
-                        if "PrivateKey" in line and "=" in line:
-                            privkey = line.split("=", 1)[1].strip()
-                            # Derive public key
-                            result = subprocess.run(
-                                ["wg", "pubkey"],
-                                check=False,
-                                input=privkey.encode(),
-                                capture_output=True,
-                                text=True,
-                                timeout=5,
-                            )
-                            if result.returncode == 0:
-                                client_public_key = result.stdout.strip()
-                                break
+                    # The derived key only changes when the config file does
+                    mtime_ns = config_path.stat().st_mtime_ns
+                    client_public_key = get_cached_pubkey(config_path, mtime_ns)
+                    if not client_public_key:
+                        client_public_key = _derive_public_key(config_path.read_bytes())
+                        if client_public_key:
+                            cache_pubkey(config_path, mtime_ns, client_public_key)
                 except Exception as e:
                     logger.warning(f"Failed to derive public key from config: {e}")
 
@@ -94,13 +346,22 @@ def check_client_peer_registered(
                 ],
             }
 
+        # The key is sent to a shell on the server, so reject anything but a real key
+        key_error = _validate_public_key(client_public_key)
+        if key_error:
+            return {
+                "success": False,
+                "error": key_error,
+                "suggestions": [
+                    "Provide the client's WireGuard public key (wg pubkey < privatekey)",
+                ],
+            }
+
         # Determine server host
         foundries_vpn_connected = False
         if not server_host:
-            # Check if Foundries VPN is connected (local import to avoid circular dependency)
-            from lab_testing.tools.foundries_vpn_core import foundries_vpn_status
-
-            status = foundries_vpn_status()
+            # Check if Foundries VPN is connected
+            status = _get_status_fn()()
             if status.get("connected"):
                 foundries_vpn_connected = True
                 server_host = "10.42.42.1"  # Foundries VPN server IP
@@ -115,54 +376,65 @@ def check_client_peer_registered(
                     ],
                 }
 
-        # Build SSH command
-        if server_password:
-            ssh_cmd = f"sshpass -p '{server_password}' ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -p {server_port} {server_user}@{server_host}"
-        else:
-            ssh_cmd = (
-                f"ssh -o StrictHostKeyChecking=no -p {server_port} {server_user}@{server_host}"
-            )
-
-        # Check if peer exists in runtime
-        check_runtime_cmd = f"{ssh_cmd} 'wg show factory | grep -A 3 \"{client_public_key}\"'"
-        result = subprocess.run(
-            check_runtime_cmd,
-            shell=True,
-            check=False,
-            capture_output=True,
-            text=True,
-            timeout=10,
+        # Peers confirmed on this server in the last minute are not re-checked
+        cached_registration = get_cached_peer_registration(
+            server_host, server_port, client_public_key
         )
-
-        runtime_registered = result.returncode == 0 and client_public_key in result.stdout
-
-        # Check if peer exists in config file
-        check_config_cmd = f'{ssh_cmd} \'grep -A 3 "{client_public_key}" /etc/wireguard/factory.conf || grep "{client_public_key}" /etc/wireguard/factory-clients.conf\''
-        result_config = subprocess.run(
-            check_config_cmd,
-            shell=True,
+        if cached_registration:
+            return {**cached_registration, "cached": True}
+
+        # Build SSH argv (all commands share one multiplexed connection)
+        ssh_argv = _build_ssh_argv(server_host, server_port, server_user, server_password)
+        ssh_env = _build_ssh_env(server_password)
+
+        # Check runtime and config file registration in one round trip; the script
+        # prints the runtime peer's allowed-ips as "IP=<allowed-ips>" (awk picks
+        # column 4 of the matching `wg show dump` peer line), a separator, then the
+        # config file match
+        quoted_key = shlex.quote(client_public_key)
+        check_script = (
+            f"wg show factory dump | awk -v k={quoted_key} "
+            "'$1==k {print \"IP=\"$4; exit}'; "
+            f"echo {_OUTPUT_SEPARATOR}; "
+            f"grep -A 3 -F -- {quoted_key} /etc/wireguard/factory.conf || "
+            f"grep -F -- {quoted_key} /etc/wireguard/factory-clients.conf"
+        )
+        result = subprocess.run(
+            [*ssh_argv, check_script],
+            env=ssh_env,
             check=False,
             capture_output=True,
-            text=True,
             timeout=10,
         )
+        separator = _OUTPUT_SEPARATOR.encode()
+        if separator not in result.stdout:
+            stderr = result.stderr.decode(errors="replace").strip()
+            return {
+                "success": False,
+                "error": f"Failed to query WireGuard server: {stderr}",
+                "suggestions": [
+                    "Check VPN connection (Foundries or standard)",
+                    "Verify server host and port are correct",
+                    "Check SSH access to server",
+                ],
+            }
 
-        config_registered = result.returncode == 0 and client_public_key in result_config.stdout
+        # Work on the raw bytes; only the allowed-ips value is decoded
+        key_bytes = client_public_key.encode()
+        runtime_output, _, config_output = result.stdout.partition(separator)
+        runtime_registered = runtime_output.startswith(b"IP=")
+        config_registered = key_bytes in config_output
 
         # Parse assigned IP if registered
         assigned_ip = None
         allowed_ips = None
         if runtime_registered:
-            # Extract IP from wg show output
-            for line in result.stdout.split("\n"):
-                if "allowed ips:" in line.lower():
-                    allowed_ips = line.split(":")[1].strip() if ":" in line else None
-                    # Extract IP from allowed_ips (e.g., "10.42.42.10/32" -> "10.42.42.10")
-                    if allowed_ips and "/" in allowed_ips:
-                        assigned_ip = allowed_ips.split("/")[0]
-                    break
+            allowed_ips = runtime_output[3:].strip().decode()
+            # Extract IP from allowed_ips (e.g., "10.42.42.10/32" -> "10.42.42.10")
+            if "/" in allowed_ips:
+                assigned_ip = allowed_ips.split("/", 1)[0]
 
-        return {
+        registration = {
             "success": True,
             "client_public_key": client_public_key,
             "registered": runtime_registered or config_registered,
@@ -185,6 +457,10 @@ def check_client_peer_registered(
                 ]
             ),
         }
+        # Only confirmed registrations are cached; an unregistered peer may be added at any time
+        if registration["registered"]:
+            cache_peer_registration(server_host, server_port, client_public_key, registration)
+        return registration
     except Exception as e:
         logger.error(f"Failed to check client peer registration: {e}")
         return {
@@ -198,29 +474,25 @@ def check_client_peer_registered(
         }
 
 
-def register_foundries_vpn_client(
-    client_public_key: str,
-    assigned_ip: str,
+def register_foundries_vpn_clients(
+    peers: List[Dict[str, str]],
     server_host: Optional[str] = None,
     server_port: int = 5025,
     server_user: str = "root",
     server_password: Optional[str] = None,
     use_config_file: bool = True,
+    defer_save: bool = False,
 ) -> Dict[str, Any]:
     """
-    Register a client peer on the Foundries WireGuard server.
-
-    This tool automates client peer registration. It connects to the server via
-    Foundries VPN (10.42.42.1). Requires Foundries VPN to be connected first.
+    Register several client peers on the Foundries WireGuard server at once.
 
-    **Bootstrap Scenario:** For clean installation, the first admin needs initial
-    server access (public IP or direct access) to register themselves. After the
-    first admin connects, all subsequent client registrations can be done via
-    Foundries VPN by the admin.
+    All peers are registered by one remote script, with a single `wg-quick save`
+    at the end, so provisioning N devices costs one SSH round trip instead of N.
+    Peers already registered with the requested IP are left untouched. Peers with
+    an invalid public key or IP get an error result and are not sent to the server.
 
     Args:
-        client_public_key: Client's WireGuard public key to register
-        assigned_ip: IP address to assign to client (e.g., "10.42.42.10")
+        peers: Peers to register, each {"client_public_key": ..., "assigned_ip": ...}
         server_host: WireGuard server hostname/IP. If not provided, will try to get
                     from Foundries VPN config or use standard VPN IP.
         server_port: SSH port on WireGuard server (default: 5025)
@@ -228,21 +500,20 @@ def register_foundries_vpn_client(
         server_password: SSH password for WireGuard server (if not using SSH keys)
         use_config_file: If True, use config file method (/etc/wireguard/factory-clients.conf).
                         If False, use legacy method (wg set + wg-quick save).
+        defer_save: If True, skip `wg-quick save` and leave it to a later
+                    flush_foundries_vpn_config() call (for provisioning sessions)
 
     Returns:
-        Dictionary with registration results
+        Dictionary with shared steps and a per-peer "results" list
     """
     try:
         steps_completed = []
-        steps_failed = []
 
         # Determine server host
         foundries_vpn_connected = False
         if not server_host:
-            # Check if Foundries VPN is connected (local import to avoid circular dependency)
-            from lab_testing.tools.foundries_vpn_core import foundries_vpn_status
-
-            status = foundries_vpn_status()
+            # Check if Foundries VPN is connected
+            status = _get_status_fn()()
             if status.get("connected"):
                 foundries_vpn_connected = True
                 server_host = "10.42.42.1"  # Foundries VPN server IP
@@ -263,181 +534,191 @@ def register_foundries_vpn_client(
                     ),
                 }
 
-        # Build SSH command
-        if server_password:
-            ssh_cmd = f"sshpass -p '{server_password}' ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -p {server_port} {server_user}@{server_host}"
-        else:
-            ssh_cmd = (
-                f"ssh -o StrictHostKeyChecking=no -p {server_port} {server_user}@{server_host}"
-            )
-
-        # Check if peer already exists
-        check_cmd = f"{ssh_cmd} 'wg show factory | grep \"{client_public_key}\"'"
-        result = subprocess.run(
-            check_cmd,
-            shell=True,
-            check=False,
-            capture_output=True,
-            text=True,
-            timeout=10,
-        )
-
-        if result.returncode == 0 and client_public_key in result.stdout:
-            return {
-                "success": True,
-                "message": "Client peer already registered",
-                "client_public_key": client_public_key,
-                "assigned_ip": assigned_ip,
-                "steps_completed": ["Client peer already exists on server"],
-            }
-
-        if use_config_file:
-            # Method 1: Use config file (Priority 2 - preferred)
-            # Add to factory-clients.conf
-            comment = f"# Client peer - {assigned_ip}"
-            peer_line = f"{client_public_key} {assigned_ip} client"
-
-            # Check if config file exists, create if not
-            check_file_cmd = f"{ssh_cmd} 'test -f /etc/wireguard/factory-clients.conf && echo exists || echo notfound'"
-            result = subprocess.run(
-                check_file_cmd,
-                shell=True,
-                check=False,
-                capture_output=True,
-                text=True,
-                timeout=5,
-            )
-
-            if "notfound" in result.stdout:
-                # Create config file
-                create_cmd = f"{ssh_cmd} 'echo \"# Foundries VPN Client Peers\" > /etc/wireguard/factory-clients.conf && chmod 600 /etc/wireguard/factory-clients.conf'"
-                result = subprocess.run(
-                    create_cmd,
-                    shell=True,
-                    check=False,
-                    capture_output=True,
-                    text=True,
-                    timeout=5,
+        # Build SSH argv (all commands share one multiplexed connection)
+        ssh_argv = _build_ssh_argv(server_host, server_port, server_user, server_password)
+        ssh_env = _build_ssh_env(server_password)
+
+        # Values end up in a root shell on the server: only well-formed keys and
+        # IPv4 addresses are used, and they are still quoted in the script
+        results: List[Dict[str, Any]] = []
+        validated: Dict[int, Tuple[str, str]] = {}
+        for index, peer in enumerate(peers):
+            client_public_key, assigned_ip, peer_error = _validate_peer(peer)
+            if peer_error:
+                fields = peer if isinstance(peer, dict) else {}
+                results.append(
+                    {
+                        "success": False,
+                        "error": peer_error,
+                        "client_public_key": fields.get("client_public_key"),
+                        "assigned_ip": fields.get("assigned_ip"),
+                        "steps_completed": [],
+                    }
                 )
-                if result.returncode == 0:
-                    steps_completed.append("Created /etc/wireguard/factory-clients.conf")
-
-            # Check if peer already in config file
-            check_peer_cmd = (
-                f"{ssh_cmd} 'grep \"{client_public_key}\" /etc/wireguard/factory-clients.conf'"
-            )
-            result = subprocess.run(
-                check_peer_cmd,
-                shell=True,
-                check=False,
-                capture_output=True,
-                text=True,
-                timeout=5,
-            )
-
-            if result.returncode == 0 and client_public_key in result.stdout:
-                steps_completed.append("Client peer already in config file")
             else:
-                # Add peer to config file
-                add_peer_cmd = (
-                    f"{ssh_cmd} 'echo \"{peer_line}\" >> /etc/wireguard/factory-clients.conf'"
-                )
-                result = subprocess.run(
-                    add_peer_cmd,
-                    shell=True,
-                    check=False,
-                    capture_output=True,
-                    text=True,
-                    timeout=5,
+                results.append({})
+                validated[index] = (client_public_key, assigned_ip)
+
+        # Peers already on the server with the requested IP are reported as registered
+        # and not touched; peers with a different IP are re-registered
+        runtime_peers = (_fetch_runtime_peers(ssh_argv, ssh_env) or {}) if validated else {}
+        pending = []
+        for index, (client_public_key, assigned_ip) in validated.items():
+            if runtime_peers.get(client_public_key) == f"{assigned_ip}/32":
+                results[index] = {
+                    "success": True,
+                    "message": "Client peer already registered",
+                    "client_public_key": client_public_key,
+                    "assigned_ip": assigned_ip,
+                    "steps_completed": ["Client peer already registered with correct IP"],
+                }
+            else:
+                pending.append(index)
+                # The peer is about to change; stop serving its previous check result
+                remove_peer_registration(server_host, server_port, client_public_key)
+
+        if pending:
+            # Each peer's steps are tagged with its index in `peers`. After the one
+            # `wg-quick save`, the runtime peer list is dumped after a separator so
+            # every peer is verified without another round trip.
+            script = []
+            if use_config_file:
+                script += [
+                    f"F={_CLIENT_PEERS_FILE}",
+                    'if [ ! -f "$F" ]; then',
+                    '  echo "# Foundries VPN Client Peers" > "$F" && chmod 600 "$F" && echo STEP:created',
+                    "fi",
+                ]
+            for index in pending:
+                client_public_key, assigned_ip = validated[index]
+                quoted_key = shlex.quote(client_public_key)
+                if use_config_file:
+                    peer_line = f"{client_public_key} {assigned_ip} client"
+                    quoted_line = shlex.quote(peer_line)
+                    sed_expr = shlex.quote(f"s|^{client_public_key} .*|{peer_line}|")
+                    script += [
+                        f'if grep -qxF -- {quoted_line} "$F"; then',
+                        f"  echo STEP:{index}:present",
+                        f'elif grep -qF -- {quoted_key} "$F"; then',
+                        f'  sed -i {sed_expr} "$F" && echo STEP:{index}:updated',
+                        f'elif echo {quoted_line} >> "$F"; then',
+                        f"  echo STEP:{index}:added",
+                        "fi",
+                    ]
+                script.append(
+                    f"wg set factory peer {quoted_key} "
+                    f"allowed-ips {shlex.quote(assigned_ip + '/32')} && "
+                    f"echo STEP:{index}:applied"
                 )
-                if result.returncode == 0:
-                    steps_completed.append(f"Added client peer to config file: {assigned_ip}")
-                else:
-                    steps_failed.append(f"Failed to add to config file: {result.stderr}")
-
-            # Apply client peer (daemon will pick it up, or apply manually)
-            apply_cmd = f"{ssh_cmd} 'wg set factory peer {client_public_key} allowed-ips {assigned_ip}/32 && wg-quick save factory'"
+            if not defer_save:
+                script.append("wg-quick save factory && echo STEP:saved")
+            script += [f"echo {_OUTPUT_SEPARATOR}", "wg show factory dump"]
             result = subprocess.run(
-                apply_cmd,
-                shell=True,
+                [*ssh_argv, "\n".join(script)],
+                env=ssh_env,
                 check=False,
                 capture_output=True,
                 text=True,
-                timeout=10,
+                timeout=15 + len(pending),
             )
-            if result.returncode == 0:
-                steps_completed.append("Applied client peer to WireGuard interface")
-            else:
-                steps_failed.append(f"Failed to apply peer: {result.stderr}")
+            step_output, separator, dump_output = result.stdout.partition(_OUTPUT_SEPARATOR)
+            shared_steps = set()
+            peer_steps: Dict[int, set] = {index: set() for index in pending}
+            for peer_index, step in _STEP_RE.findall(step_output):
+                if peer_index:
+                    peer_steps.setdefault(int(peer_index), set()).add(step)
+                else:
+                    shared_steps.add(step)
+            # Verify registration (reported by the script that performed it)
+            verified_peers = _parse_runtime_peers(dump_output) if separator else {}
+
+            if "created" in shared_steps:
+                steps_completed.append(f"Created {_CLIENT_PEERS_FILE}")
+            saved = "saved" in shared_steps
+            save_key = (server_host, server_port, server_user)
+            with _pending_saves_lock:
+                if defer_save:
+                    _pending_saves[save_key] = server_password
+                elif saved:
+                    # This save also persisted any earlier deferred registrations
+                    _pending_saves.pop(save_key, None)
+            if defer_save:
+                steps_completed.append(
+                    "Deferred WireGuard config save: run flush_foundries_vpn_config()"
+                )
 
-        else:
-            # Method 2: Legacy method (direct wg set)
-            allowed_ips = f"{assigned_ip}/32"
-            register_cmd = f"{ssh_cmd} 'wg set factory peer {client_public_key} allowed-ips {allowed_ips} && wg-quick save factory'"
-            result = subprocess.run(
-                register_cmd,
-                shell=True,
-                check=False,
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-            if result.returncode == 0:
-                steps_completed.append(f"Registered client peer: {assigned_ip}")
-            else:
-                steps_failed.append(f"Failed to register peer: {result.stderr}")
-
-        # Verify registration
-        verify_result = check_client_peer_registered(
-            client_public_key=client_public_key,
-            server_host=server_host,
-            server_port=server_port,
-            server_user=server_user,
-            server_password=server_password,
-        )
+            for index in pending:
+                client_public_key, assigned_ip = validated[index]
+                steps = peer_steps[index]
+                applied = "applied" in steps and (defer_save or saved)
+                peer_completed = []
+                peer_failed = []
+                if client_public_key in runtime_peers:
+                    peer_completed.append(
+                        f"Client peer registered with allowed ips "
+                        f"{runtime_peers[client_public_key]}, reassigning to {assigned_ip}"
+                    )
+
+                if use_config_file:
+                    if "present" in steps:
+                        peer_completed.append("Client peer already in config file")
+                    elif "updated" in steps:
+                        peer_completed.append(f"Updated client peer in config file: {assigned_ip}")
+                    elif "added" in steps:
+                        peer_completed.append(f"Added client peer to config file: {assigned_ip}")
+                    else:
+                        peer_failed.append(f"Failed to add to config file: {result.stderr}")
+                    if applied:
+                        peer_completed.append("Applied client peer to WireGuard interface")
+                    else:
+                        peer_failed.append(f"Failed to apply peer: {result.stderr}")
+                elif applied:
+                    peer_completed.append(f"Registered client peer: {assigned_ip}")
+                else:
+                    peer_failed.append(f"Failed to register peer: {result.stderr}")
 
-        if verify_result.get("registered"):
-            steps_completed.append("Verified client peer registration")
-        else:
-            steps_failed.append("Client peer registration verification failed")
+                if client_public_key in verified_peers:
+                    peer_completed.append("Verified client peer registration")
+                else:
+                    peer_failed.append("Client peer registration verification failed")
 
-        if steps_failed:
-            return {
-                "success": False,
-                "error": "Some steps failed during client peer registration",
-                "client_public_key": client_public_key,
-                "assigned_ip": assigned_ip,
-                "steps_completed": steps_completed,
-                "steps_failed": steps_failed,
-                "suggestions": [
-                    "Check SSH access to server",
-                    "Verify server host and port are correct",
-                    "Check VPN connection (Foundries or standard)",
-                    "Try manual registration: ssh to server and run wg set commands",
-                ],
-            }
+                peer_result = {
+                    "success": not peer_failed,
+                    "client_public_key": client_public_key,
+                    "assigned_ip": assigned_ip,
+                    "steps_completed": peer_completed,
+                }
+                if peer_failed:
+                    peer_result["error"] = "Some steps failed during client peer registration"
+                    peer_result["steps_failed"] = peer_failed
+                else:
+                    peer_result["message"] = "Client peer registered successfully"
+                results[index] = peer_result
 
-        return {
-            "success": True,
-            "message": "Client peer registered successfully",
-            "client_public_key": client_public_key,
-            "assigned_ip": assigned_ip,
+        failed = [peer_result for peer_result in results if not peer_result["success"]]
+        response = {
+            "success": not failed,
             "server_host": server_host,
             "connection_method": "Foundries VPN" if foundries_vpn_connected else "Not connected",
+            "registered": len(results) - len(failed),
             "steps_completed": steps_completed,
-            "next_steps": [
-                "Client peer is now registered on server",
-                "If using standard VPN, disconnect: disconnect_vpn()",
-                "Connect to Foundries VPN: connect_foundries_vpn()",
-                "Verify connection: ping 10.42.42.1",
-            ],
+            "results": results,
         }
+        if failed:
+            response["error"] = f"Failed to register {len(failed)} of {len(results)} client peers"
+            response["suggestions"] = [
+                "Check SSH access to server",
+                "Verify server host and port are correct",
+                "Check VPN connection (Foundries or standard)",
+                "Try manual registration: ssh to server and run wg set commands",
+            ]
+        return response
 
     except Exception as e:
-        logger.error(f"Failed to register client peer: {e}")
+        logger.error(f"Failed to register client peers: {e}")
         return {
             "success": False,
-            "error": f"Failed to register client peer: {e!s}",
+            "error": f"Failed to register client peers: {e!s}",
             "suggestions": [
                 "Check VPN connection (Foundries or standard)",
                 "Verify server host and port are correct",
@@ -445,3 +726,135 @@ def register_foundries_vpn_client(
                 "Contact VPN admin: ajlennon@dynamicdevices.co.uk",
             ],
         }
+
+
+def register_foundries_vpn_client(
+    client_public_key: str,
+    assigned_ip: str,
+    server_host: Optional[str] = None,
+    server_port: int = 5025,
+    server_user: str = "root",
+    server_password: Optional[str] = None,
+    use_config_file: bool = True,
+    defer_save: bool = False,
+) -> Dict[str, Any]:
+    """
+    Register a client peer on the Foundries WireGuard server.
+
+    This tool automates client peer registration. It connects to the server via
+    Foundries VPN (10.42.42.1). Requires Foundries VPN to be connected first.
+
+    **Bootstrap Scenario:** For clean installation, the first admin needs initial
+    server access (public IP or direct access) to register themselves. After the
+    first admin connects, all subsequent client registrations can be done via
+    Foundries VPN by the admin.
+
+    Args:
+        client_public_key: Client's WireGuard public key to register
+        assigned_ip: IP address to assign to client (e.g., "10.42.42.10")
+        server_host: WireGuard server hostname/IP. If not provided, will try to get
+                    from Foundries VPN config or use standard VPN IP.
+        server_port: SSH port on WireGuard server (default: 5025)
+        server_user: SSH user for WireGuard server (default: "root")
+        server_password: SSH password for WireGuard server (if not using SSH keys)
+        use_config_file: If True, use config file method (/etc/wireguard/factory-clients.conf).
+                        If False, use legacy method (wg set + wg-quick save).
+        defer_save: If True, skip `wg-quick save` and leave it to a later
+                    flush_foundries_vpn_config() call (for provisioning sessions)
+
+    Returns:
+        Dictionary with registration results
+    """
+    bulk_result = register_foundries_vpn_clients(
+        [{"client_public_key": client_public_key, "assigned_ip": assigned_ip}],
+        server_host=server_host,
+        server_port=server_port,
+        server_user=server_user,
+        server_password=server_password,
+        use_config_file=use_config_file,
+        defer_save=defer_save,
+    )
+    if "results" not in bulk_result:
+        return bulk_result
+
+    peer_result = bulk_result["results"][0]
+    peer_result["steps_completed"] = bulk_result["steps_completed"] + peer_result["steps_completed"]
+    if not peer_result["success"]:
+        return {**peer_result, "suggestions": bulk_result["suggestions"]}
+
+    return {
+        **peer_result,
+        "server_host": bulk_result["server_host"],
+        "connection_method": bulk_result["connection_method"],
+        "next_steps": [
+            "Client peer is now registered on server",
+            "If using standard VPN, disconnect: disconnect_vpn()",
+            "Connect to Foundries VPN: connect_foundries_vpn()",
+            "Verify connection: ping 10.42.42.1",
+        ],
+    }
+
+
+def flush_foundries_vpn_config() -> Dict[str, Any]:
+    """
+    Save the WireGuard config on servers with deferred peer registrations.
+
+    Runs `wg-quick save factory` once per server that had peers registered with
+    defer_save=True, so a provisioning session pays for one save instead of one
+    per peer.
+
+    Returns:
+        Dictionary with the servers saved and any that failed
+    """
+    with _pending_saves_lock:
+        pending = dict(_pending_saves)
+
+    if not pending:
+        return {
+            "success": True,
+            "message": "No deferred WireGuard config saves pending",
+            "saved": [],
+        }
+
+    saved = []
+    failed = []
+    for (server_host, server_port, server_user), server_password in pending.items():
+        ssh_argv = _build_ssh_argv(server_host, server_port, server_user, server_password)
+        try:
+            result = subprocess.run(
+                [*ssh_argv, "wg-quick save factory"],
+                env=_build_ssh_env(server_password),
+                check=False,
+                capture_output=True,
+                text=True,
+                timeout=15,
+            )
+            error = result.stderr.strip() if result.returncode != 0 else None
+        except (OSError, subprocess.TimeoutExpired) as e:
+            error = str(e)
+
+        if error is None:
+            saved.append(server_host)
+            with _pending_saves_lock:
+                _pending_saves.pop((server_host, server_port, server_user), None)
+        else:
+            logger.warning("Failed to save WireGuard config on %s: %s", server_host, error)
+            failed.append({"server_host": server_host, "error": error})
+
+    if failed:
+        return {
+            "success": False,
+            "error": f"Failed to save WireGuard config on {len(failed)} server(s)",
+            "saved": saved,
+            "failed": failed,
+            "suggestions": [
+                "Check SSH access to server",
+                "Retry: flush_foundries_vpn_config()",
+            ],
+        }
+
+    return {
+        "success": True,
+        "message": f"Saved WireGuard config on {len(saved)} server(s)",
+        "saved": saved,
+    }
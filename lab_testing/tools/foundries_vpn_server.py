@@ -9,15 +9,24 @@ Copyright (C) 2025 Dynamic Devices Ltd
 License: GPL-3.0-or-later
 """
 
+import ipaddress
 import json
+import re
+import shlex
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from string import Template
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from lab_testing.config import get_foundries_vpn_config
 from lab_testing.utils.foundries_vpn_cache import (
+    cache_vpn_endpoint,
     cache_vpn_ip,
     get_all_cached_ips,
+    get_vpn_endpoint,
     get_vpn_ip,
     remove_vpn_ip,
 )
@@ -26,17 +35,74 @@ from lab_testing.utils.logger import get_logger
 logger = get_logger()
 
 from lab_testing.tools.foundries_vpn_helpers import (
-    _check_fioctl_configured,
-    _check_fioctl_installed,
-    _get_fioctl_path,
+    _fioctl_unavailable,
+    _invalidate_fioctl_cache,
+    _resolve_fioctl,
 )
+from lab_testing.tools.foundries_vpn_peer import _build_ssh_argv, _build_ssh_env
+from lab_testing.utils.fioctl_cache import get_devices, invalidate_devices
+
+# Step markers printed by the device-to-device script run on the WireGuard server
+_STEP_RE = re.compile(r"^STEP:(\w+)$", re.MULTILINE)
+
+# Command run on the device to allow the whole VPN subnet. The sudo password is
+# read from stdin so it never appears in a command line; | is the sed delimiter
+# because the subnet contains /
+_DEVICE_UPDATE_CMD = Template(
+    'IFS= read -r PW; s() { printf "%s\\n" "$$PW" | sudo -S "$$@"; }; '
+    's sed -i "s|allowed-ips=10.42.42.1|allowed-ips=${vpn_subnet}|" '
+    "/etc/NetworkManager/system-connections/factory-vpn0.nmconnection && echo Config updated && "
+    "s nmcli connection reload factory-vpn0 && s nmcli connection down factory-vpn0 && sleep 1 && "
+    "s nmcli connection up factory-vpn0 && sleep 2 && s wg show factory-vpn0 | grep allowed"
+)
+
+# Script piped to 'bash -s' on the WireGuard server: hop to the device and update
+# it, then find the device's peer in the wg dump (the interface line's fields never
+# match an address) and widen its server-side AllowedIPs. The device password is a
+# stdin data line, not an argument. The banner may cause non-zero exit codes, so the
+# device step also counts as done when its output shows the config was updated.
+_DEVICE_TO_DEVICE_SCRIPT = Template("""\
+IFS= read -r SSHPASS
+${device_password}
+export SSHPASS
+DEVICE_OUT=$$(printf '%s\\n' "$$SSHPASS" | sshpass -e ssh -o ConnectTimeout=5 -o ServerAliveInterval=5 -o ServerAliveCountMax=2 -o StrictHostKeyChecking=no ${device} ${device_cmd} 2>&1)
+DEVICE_RC=$$?
+printf '%s\\n' "$$DEVICE_OUT"
+case "$$DEVICE_OUT" in *"Config updated"*|*[Aa]llowed*) DEVICE_RC=0 ;; esac
+[ "$$DEVICE_RC" -eq 0 ] || exit 1
+echo STEP:device_updated
+PK=
+while IFS=$$'\\t' read -r key _ _ ips _; do
+  case ",$$ips," in *",${device_ip}/32,"*) PK=$$key; break ;; esac
+done < <(wg show factory dump)
+[ -n "$$PK" ] || exit 0
+wg set factory peer "$$PK" allowed-ips ${vpn_subnet} && echo STEP:server_allowed_ips
+""")
+
+# "Key: value" lines in `fioctl config wireguard` output
+_CONFIG_LINE_RE = re.compile(r"^[ \t]*([^:\n]+?)[ \t]*:[ \t]*(.*?)[ \t\r]*$", re.MULTILINE)
+
+# get_foundries_vpn_server_config() results are reused for this long (seconds)
+_SERVER_CONFIG_TTL_SECONDS = 300.0
+
+# Successful server config per factory: factory -> (expiry monotonic time, result)
+_server_config_cache: Dict[Optional[str], Tuple[float, Dict[str, Any]]] = {}
+_server_config_lock = threading.Lock()
+
+# Timeout for a single fioctl API command (seconds)
+FIOCTL_COMMAND_TIMEOUT = 15
+
+# Maximum concurrent fioctl calls when enabling/disabling VPN on several devices
+_DEVICE_BATCH_MAX_WORKERS = 8
 
 
 def get_foundries_vpn_server_config(factory: Optional[str] = None) -> Dict[str, Any]:
     """
     Get Foundries VPN server configuration using fioctl API.
 
-    Returns WireGuard server endpoint, address, and public key.
+    Returns WireGuard server endpoint, address, and public key. Successful results
+    are reused for a few minutes per factory; call invalidate_vpn_server_config()
+    after changing the factory's WireGuard settings.
 
     Args:
         factory: Optional factory name (defaults to configured factory)
@@ -44,38 +110,39 @@ def get_foundries_vpn_server_config(factory: Optional[str] = None) -> Dict[str,
     Returns:
         Dictionary with VPN server configuration
     """
-    try:
-        # Check if fioctl is installed and configured
-        fioctl_installed, fioctl_error = _check_fioctl_installed()
-        if not fioctl_installed:
-            return {
-                "success": False,
-                "error": fioctl_error,
-                "suggestions": [
-                    "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                ],
-            }
+    now = time.monotonic()
+    with _server_config_lock:
+        cached = _server_config_cache.get(factory)
+    if cached and cached[0] > now:
+        return dict(cached[1])
 
-        fioctl_configured, config_error = _check_fioctl_configured()
-        if not fioctl_configured:
-            return {
-                "success": False,
-                "error": config_error,
-                "suggestions": [
-                    "Run 'fioctl login' to configure FoundriesFactory credentials",
-                ],
-            }
+    result = _fetch_foundries_vpn_server_config(factory)
+    if result.get("success"):
+        with _server_config_lock:
+            _server_config_cache[factory] = (now + _SERVER_CONFIG_TTL_SECONDS, dict(result))
+    return result
+
+
+def invalidate_vpn_server_config():
+    """Drop cached get_foundries_vpn_server_config() results for all factories"""
+    with _server_config_lock:
+        _server_config_cache.clear()
+
+
+def _fetch_foundries_vpn_server_config(factory: Optional[str]) -> Dict[str, Any]:
+    """
+    Run fioctl to get the VPN server configuration (uncached).
+
+    Args:
+        factory: Optional factory name (defaults to configured factory)
 
-        # Get fioctl path
-        fioctl_path = _get_fioctl_path()
+    Returns:
+        Dictionary with VPN server configuration
+    """
+    try:
+        fioctl_path, fioctl_error = _resolve_fioctl()
         if not fioctl_path:
-            return {
-                "success": False,
-                "error": "fioctl not found",
-                "suggestions": [
-                    "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                ],
-            }
+            return _fioctl_unavailable(fioctl_error)
 
         # Get WireGuard server config
         cmd = [fioctl_path, "config", "wireguard"]
@@ -87,10 +154,12 @@ def get_foundries_vpn_server_config(factory: Optional[str] = None) -> Dict[str,
             check=False,
             capture_output=True,
             text=True,
-            timeout=30,
+            timeout=FIOCTL_COMMAND_TIMEOUT,
         )
 
         if result.returncode != 0:
+            # The probes above may be stale (e.g. expired login); re-check next time
+            _invalidate_fioctl_cache()
             error_msg = result.stderr.strip() if result.stderr else "Unknown error"
             return {
                 "success": False,
@@ -102,14 +171,10 @@ def get_foundries_vpn_server_config(factory: Optional[str] = None) -> Dict[str,
             }
 
         # Parse output
-        config = {}
-        for line in result.stdout.strip().split("\n"):
-            line = line.strip()
-            if ":" in line:
-                key, value = line.split(":", 1)
-                key = key.strip().lower().replace(" ", "_")
-                value = value.strip()
-                config[key] = value
+        config = {
+            match.group(1).lower().replace(" ", "_"): match.group(2)
+            for match in _CONFIG_LINE_RE.finditer(result.stdout)
+        }
 
         enabled = config.get("enabled", "false").lower() == "true"
 
@@ -157,37 +222,9 @@ def enable_foundries_vpn_device(device_name: str, factory: Optional[str] = None)
         Dictionary with operation results
     """
     try:
-        # Check if fioctl is installed and configured
-        fioctl_installed, fioctl_error = _check_fioctl_installed()
-        if not fioctl_installed:
-            return {
-                "success": False,
-                "error": fioctl_error,
-                "suggestions": [
-                    "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                ],
-            }
-
-        fioctl_configured, config_error = _check_fioctl_configured()
-        if not fioctl_configured:
-            return {
-                "success": False,
-                "error": config_error,
-                "suggestions": [
-                    "Run 'fioctl login' to configure FoundriesFactory credentials",
-                ],
-            }
-
-        # Get fioctl path
-        fioctl_path = _get_fioctl_path()
+        fioctl_path, fioctl_error = _resolve_fioctl()
         if not fioctl_path:
-            return {
-                "success": False,
-                "error": "fioctl not found",
-                "suggestions": [
-                    "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                ],
-            }
+            return _fioctl_unavailable(fioctl_error)
 
         # Build fioctl command
         cmd = [fioctl_path, "devices", "config", "wireguard", device_name, "enable"]
@@ -199,10 +236,12 @@ def enable_foundries_vpn_device(device_name: str, factory: Optional[str] = None)
             check=False,
             capture_output=True,
             text=True,
-            timeout=30,
+            timeout=FIOCTL_COMMAND_TIMEOUT,
         )
 
         if result.returncode == 0:
+            # Cached device listings still report the old VPN state
+            invalidate_devices()
             return {
                 "success": True,
                 "device_name": device_name,
@@ -215,6 +254,8 @@ def enable_foundries_vpn_device(device_name: str, factory: Optional[str] = None)
                 ],
             }
 
+        # The probes above may be stale (e.g. expired login); re-check next time
+        _invalidate_fioctl_cache()
         error_msg = result.stderr.strip() if result.stderr else "Unknown error"
         return {
             "success": False,
@@ -255,37 +296,9 @@ def disable_foundries_vpn_device(device_name: str, factory: Optional[str] = None
         Dictionary with operation results
     """
     try:
-        # Check if fioctl is installed and configured
-        fioctl_installed, fioctl_error = _check_fioctl_installed()
-        if not fioctl_installed:
-            return {
-                "success": False,
-                "error": fioctl_error,
-                "suggestions": [
-                    "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                ],
-            }
-
-        fioctl_configured, config_error = _check_fioctl_configured()
-        if not fioctl_configured:
-            return {
-                "success": False,
-                "error": config_error,
-                "suggestions": [
-                    "Run 'fioctl login' to configure FoundriesFactory credentials",
-                ],
-            }
-
-        # Get fioctl path
-        fioctl_path = _get_fioctl_path()
+        fioctl_path, fioctl_error = _resolve_fioctl()
         if not fioctl_path:
-            return {
-                "success": False,
-                "error": "fioctl not found",
-                "suggestions": [
-                    "Install fioctl CLI tool: https://github.com/foundriesio/fioctl",
-                ],
-            }
+            return _fioctl_unavailable(fioctl_error)
 
         # Build fioctl command
         cmd = [fioctl_path, "devices", "config", "wireguard", device_name, "disable"]
@@ -297,10 +310,12 @@ def disable_foundries_vpn_device(device_name: str, factory: Optional[str] = None
             check=False,
             capture_output=True,
             text=True,
-            timeout=30,
+            timeout=FIOCTL_COMMAND_TIMEOUT,
         )
 
         if result.returncode == 0:
+            # Cached device listings still report the old VPN state
+            invalidate_devices()
             return {
                 "success": True,
                 "device_name": device_name,
@@ -312,6 +327,8 @@ def disable_foundries_vpn_device(device_name: str, factory: Optional[str] = None
                 ],
             }
 
+        # The probes above may be stale (e.g. expired login); re-check next time
+        _invalidate_fioctl_cache()
         error_msg = result.stderr.strip() if result.stderr else "Unknown error"
         return {
             "success": False,
@@ -337,6 +354,126 @@ def disable_foundries_vpn_device(device_name: str, factory: Optional[str] = None
         }
 
 
+def _run_for_devices(
+    operation: Callable[[str, Optional[str]], Dict[str, Any]],
+    device_names: List[str],
+    factory: Optional[str],
+) -> Dict[str, Any]:
+    """
+    Run a per-device fioctl operation for several devices concurrently.
+
+    Each call spends its time waiting on a fioctl subprocess, so threads let the
+    API round trips overlap instead of adding up.
+
+    Args:
+        operation: Per-device function taking (device_name, factory)
+        device_names: Names of the devices to run the operation on
+        factory: Optional factory name passed to every call
+
+    Returns:
+        Dictionary with per-device results keyed by device name
+    """
+    device_names = list(dict.fromkeys(device_names))
+    if not device_names:
+        return {
+            "success": False,
+            "error": "No device names provided",
+            "suggestions": ["List devices: list_foundries_devices()"],
+        }
+
+    with ThreadPoolExecutor(
+        max_workers=min(_DEVICE_BATCH_MAX_WORKERS, len(device_names))
+    ) as executor:
+        results = dict(
+            zip(
+                device_names,
+                executor.map(lambda name: operation(name, factory), device_names),
+            )
+        )
+
+    failed = [name for name, result in results.items() if not result.get("success")]
+    return {
+        "success": not failed,
+        "factory": factory or "default",
+        "succeeded": [name for name in device_names if name not in failed],
+        "failed": failed,
+        "results": results,
+    }
+
+
+def enable_foundries_vpn_devices(
+    device_names: List[str], factory: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Enable WireGuard VPN on several Foundries devices at once.
+
+    Runs enable_foundries_vpn_device for every device concurrently.
+
+    Args:
+        device_names: Names of the devices to enable VPN on
+        factory: Optional factory name. If not provided, uses default factory from fioctl config.
+
+    Returns:
+        Dictionary with per-device results keyed by device name
+    """
+    return _run_for_devices(enable_foundries_vpn_device, device_names, factory)
+
+
+def disable_foundries_vpn_devices(
+    device_names: List[str], factory: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Disable WireGuard VPN on several Foundries devices at once.
+
+    Runs disable_foundries_vpn_device for every device concurrently.
+
+    Args:
+        device_names: Names of the devices to disable VPN on
+        factory: Optional factory name. If not provided, uses default factory from fioctl config.
+
+    Returns:
+        Dictionary with per-device results keyed by device name
+    """
+    return _run_for_devices(disable_foundries_vpn_device, device_names, factory)
+
+
+def _server_host_from_client_config() -> Optional[str]:
+    """
+    Get the WireGuard server host from the client config's Endpoint line.
+
+    The parsed host is cached until the config file changes.
+
+    Returns:
+        Server host (e.g., "144.76.167.54"), or None if there is no usable config
+    """
+    config_path = get_foundries_vpn_config()
+    try:
+        mtime_ns = config_path.stat().st_mtime_ns
+    except (AttributeError, OSError):
+        return None
+
+    server_host = get_vpn_endpoint(config_path, mtime_ns)
+    if server_host:
+        return server_host
+
+    # Stops at the first Endpoint line instead of reading the whole file
+    try:
+        with config_path.open() as config_file:
+            for line in config_file:
+                line = line.lstrip()
+                if line.startswith(("Endpoint =", "Endpoint=")):
+                    endpoint = line.split("=", 1)[1].strip()
+                    # Extract host from endpoint (e.g., "144.76.167.54:5555" -> "144.76.167.54")
+                    server_host = endpoint.split(":")[0]
+                    break
+    except Exception:
+        return None
+
+    if server_host:
+        cache_vpn_endpoint(config_path, mtime_ns, server_host)
+    return server_host
+
+
 def enable_foundries_device_to_device(
     device_name: str,
     device_ip: Optional[str] = None,
@@ -374,15 +511,13 @@ def enable_foundries_device_to_device(
     Returns:
         Dictionary with operation results
     """
+    steps_completed: List[str] = []
+    steps_failed: List[str] = []
     try:
-        steps_completed = []
-        steps_failed = []
-
         # Get device IP if not provided
         if not device_ip:
-            from lab_testing.tools.foundries_devices import list_foundries_devices
-
-            devices = list_foundries_devices()
+            # Shared short-lived listing: batch callers resolve many devices in a row
+            devices = get_devices()
             if not devices.get("success"):
                 return {
                     "success": False,
@@ -414,78 +549,66 @@ def enable_foundries_device_to_device(
                 "error": "Device IP not found and not provided",
             }
 
-        # Get server host from config if not provided
-        if not server_host:
-            config_path = get_foundries_vpn_config()
-            if config_path and config_path.exists():
-                # Try to read config file to get server endpoint
-                try:
-                    config_content = config_path.read_text()
-                    for line in config_content.split("\n"):
-                        if line.startswith("Endpoint =") or line.startswith("Endpoint="):
-                            endpoint = line.split("=", 1)[1].strip()
-                            # Extract host from endpoint (e.g., "144.76.167.54:5555" -> "144.76.167.54")
-                            server_host = endpoint.split(":")[0] if ":" in endpoint else endpoint
-                            break
-                except Exception:
-                    pass
-
-            if not server_host:
-                server_host = "144.76.167.54"  # Default
-
-        steps_completed.append(f"Resolved device IP: {device_ip}, server: {server_host}")
-
-        # Build SSH command to update device config
-        # We SSH to the server, then from there SSH to the device using sshpass
-        # Use | as sed delimiter to avoid issues with / in subnet (e.g., 10.42.42.0/24)
-
-        # Build the command that will run on the device
-        # Use double quotes for the inner command to allow variable expansion
-        device_update_cmd = f'echo "{device_password}" | sudo -S sed -i "s|allowed-ips=10.42.42.1|allowed-ips={vpn_subnet}|" /etc/NetworkManager/system-connections/factory-vpn0.nmconnection && echo Config updated'
-        device_reload_cmd = f'echo "{device_password}" | sudo -S nmcli connection reload factory-vpn0 && echo "{device_password}" | sudo -S nmcli connection down factory-vpn0 && sleep 1 && echo "{device_password}" | sudo -S nmcli connection up factory-vpn0 && sleep 2 && echo "{device_password}" | sudo -S wg show factory-vpn0 | grep allowed'
-
-        # Combine device commands
-        device_full_cmd = f"{device_update_cmd} && {device_reload_cmd}"
+        # Both values end up in shell commands on the server and the device
+        try:
+            device_ip = str(ipaddress.IPv4Address(str(device_ip)))
+        except ValueError:
+            return {
+                "success": False,
+                "error": f"Invalid device IP: {device_ip!r}",
+                "suggestions": ["Pass the device's VPN IPv4 address, e.g. 10.42.42.2"],
+            }
+        try:
+            vpn_subnet = str(ipaddress.IPv4Network(str(vpn_subnet), strict=False))
+        except ValueError:
+            return {
+                "success": False,
+                "error": f"Invalid VPN subnet: {vpn_subnet!r}",
+                "suggestions": ["Pass an IPv4 subnet in CIDR form, e.g. 10.42.42.0/24"],
+            }
+        # The password is a single stdin line of the server script
+        if "\n" in device_password or "\r" in device_password:
+            return {
+                "success": False,
+                "error": "Device password must not contain line breaks",
+            }
 
-        # Build the command that runs on the server (SSH to device using sshpass)
-        # Use single quotes around the device command to prevent shell expansion on server
-        server_cmd = f"sshpass -p '{device_password}' ssh -o StrictHostKeyChecking=no {device_user}@{device_ip} '{device_full_cmd}'"
+        # Get server host from the (cached) server config, then the client config
+        if not server_host:
+            server_config = get_foundries_vpn_server_config()
+            if server_config.get("success") and server_config.get("endpoint"):
+                server_host = server_config["endpoint"].rsplit(":", 1)[0]
 
-        # Step 3: Set server-side AllowedIPs
-        # First, get device public key from server
-        get_key_cmd = f"""wg show factory | grep -A 5 "{device_ip}" | grep "peer:" | awk '{{print $2}}' || wg show factory | grep -B 5 "{device_ip}" | grep "peer:" | awk '{{print $2}}'"""
+        if not server_host:
+            server_host = _server_host_from_client_config() or "144.76.167.54"  # Default
 
-        # Build full command to run on server
-        if server_password:
-            ssh_to_server = f"sshpass -p '{server_password}' ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -p {server_port} {server_user}@{server_host}"
-        else:
-            ssh_to_server = (
-                f"ssh -o StrictHostKeyChecking=no -p {server_port} {server_user}@{server_host}"
-            )
+        steps_completed.append(f"Resolved device IP: {device_ip}, server: {server_host}")
 
-        # Execute update - use double quotes around server_cmd to allow variable expansion
-        full_cmd = f'{ssh_to_server} "{server_cmd}"'
+        script = _DEVICE_TO_DEVICE_SCRIPT.substitute(
+            device_password=device_password,
+            device=shlex.quote(f"{device_user}@{device_ip}"),
+            device_cmd=shlex.quote(_DEVICE_UPDATE_CMD.substitute(vpn_subnet=vpn_subnet)),
+            device_ip=device_ip,
+            vpn_subnet=shlex.quote(vpn_subnet),
+        )
 
         logger.info(f"Enabling device-to-device for {device_name} ({device_ip})")
         result = subprocess.run(
-            full_cmd,
-            shell=True,
+            _build_ssh_argv(server_host, server_port, server_user, server_password) + ["bash -s"],
             check=False,
             capture_output=True,
             text=True,
-            timeout=30,
+            input=script,
+            env=_build_ssh_env(server_password),
+            timeout=40,
         )
 
-        # Check if the command succeeded by looking for success indicators
-        # The banner may cause non-zero exit codes, but if we see "Config updated" it worked
-        output = result.stdout + result.stderr
-        success_indicator = "Config updated" in output or "allowed" in output.lower()
-
-        if result.returncode != 0 and not success_indicator:
+        steps = set(_STEP_RE.findall(result.stdout))
+        if "device_updated" not in steps:
             steps_failed.append("Failed to update device config")
             return {
                 "success": False,
-                "error": f"Failed to update device configuration: {result.stderr}",
+                "error": f"Failed to update device configuration: {result.stderr or result.stdout}",
                 "steps_completed": steps_completed,
                 "steps_failed": steps_failed,
                 "suggestions": [
@@ -498,43 +621,14 @@ def enable_foundries_device_to_device(
                 ],
             }
 
-        # If we see success indicators, treat as success even if return code is non-zero
-        if success_indicator:
-            steps_completed.append("Updated device NetworkManager config")
-            steps_completed.append("Reloaded NetworkManager connection")
-
         steps_completed.append("Updated device NetworkManager config")
         steps_completed.append("Reloaded NetworkManager connection")
 
-        # Set server-side AllowedIPs
-        # Get device public key
-        key_result = subprocess.run(
-            f"""{ssh_to_server} "{get_key_cmd}" """,
-            shell=True,
-            check=False,
-            capture_output=True,
-            text=True,
-            timeout=10,
-        )
-
-        if key_result.returncode == 0 and key_result.stdout.strip():
-            pubkey = key_result.stdout.strip()
-            set_server_cmd = f"""wg set factory peer {pubkey} allowed-ips {vpn_subnet}"""
-
-            server_result = subprocess.run(
-                f"""{ssh_to_server} "{set_server_cmd}" """,
-                shell=True,
-                check=False,
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-
-            if server_result.returncode == 0:
-                steps_completed.append(f"Set server-side AllowedIPs to {vpn_subnet}")
-            else:
-                steps_failed.append("Failed to set server-side AllowedIPs")
-                logger.warning(f"Failed to set server-side AllowedIPs: {server_result.stderr}")
+        if "server_allowed_ips" in steps:
+            steps_completed.append(f"Set server-side AllowedIPs to {vpn_subnet}")
+        elif result.returncode != 0:
+            steps_failed.append("Failed to set server-side AllowedIPs")
+            logger.warning(f"Failed to set server-side AllowedIPs: {result.stderr}")
 
         return {
             "success": True,
@@ -552,8 +646,8 @@ def enable_foundries_device_to_device(
         return {
             "success": False,
             "error": f"Operation failed: {e!s}",
-            "steps_completed": steps_completed if "steps_completed" in locals() else [],
-            "steps_failed": steps_failed if "steps_failed" in locals() else [],
+            "steps_completed": steps_completed,
+            "steps_failed": steps_failed,
             "suggestions": [
                 "Check device is online and accessible",
                 "Verify SSH credentials",
@@ -9,12 +9,23 @@ Copyright (C) 2025 Dynamic Devices Ltd
 License: GPL-3.0-or-later
 """
 
+import itertools
 import json
+import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from lab_testing.config import get_foundries_vpn_config
+from lab_testing.tools.foundries_vpn_core import (
+    connect_foundries_vpn,
+    foundries_vpn_status,
+    verify_foundries_vpn_connection,
+)
+from lab_testing.tools.foundries_vpn_helpers import _get_fping_path
+from lab_testing.tools.foundries_vpn_server import get_foundries_vpn_server_config
+from lab_testing.utils.fioctl_cache import get_devices
 from lab_testing.utils.foundries_vpn_cache import (
     cache_vpn_ip,
     get_all_cached_ips,
@@ -22,27 +33,47 @@ from lab_testing.utils.foundries_vpn_cache import (
     remove_vpn_ip,
 )
 from lab_testing.utils.logger import get_logger
+from lab_testing.utils.ssh_pool import get_ssh_multiplex_options
 
 logger = get_logger()
 
-import subprocess
-from typing import Any, Dict, Optional
+# Maximum devices probed (ping + SSH) at the same time in Step 4
+_PROBE_MAX_WORKERS = 32
 
-from lab_testing.tools.foundries_devices import list_foundries_devices
-from lab_testing.tools.foundries_vpn_core import (
-    connect_foundries_vpn,
-    foundries_vpn_status,
-    verify_foundries_vpn_connection,
-)
-from lab_testing.tools.foundries_vpn_server import get_foundries_vpn_server_config
-from lab_testing.utils.logger import get_logger
+# Two pings 0.2 s apart, waiting at most 1 s for each reply
+_PING_ARGS = ("-c", "2", "-i", "0.2", "-W", "1")
+_PING_TIMEOUT = 3
 
-logger = get_logger()
+# Only the end of a failed probe's stderr is kept in the results (bytes)
+_FAILURE_OUTPUT_BYTES = 2048
+
+# Devices that fail the first Step 4 pass are probed once more with longer waits,
+# so healthy devices finish fast and only failing ones pay the long timeouts
+_PING_RETRY_ARGS = ("-c", "2", "-i", "0.2", "-W", "3")
+_PING_RETRY_TIMEOUT = 7
+
+# SSH probe options shared by the key and password attempts
+_SSH_PROBE_OPTIONS = ("-o", "StrictHostKeyChecking=no")
+
+# SSH connect timeout and overall command timeout (seconds): first pass, retry pass
+_SSH_CONNECT_TIMEOUT = 2
+_SSH_PROBE_TIMEOUT = 6
+_SSH_RETRY_CONNECT_TIMEOUT = 8
+_SSH_RETRY_PROBE_TIMEOUT = 15
+
+# Default Foundries device password, used when key authentication is refused
+_SSH_PROBE_PASSWORD = "fio"
+
+# fping -q per-host summary, e.g. "10.42.42.3 : xmt/rcv/%loss = 2/2/0%, min/avg/max = ..."
+_FPING_SUMMARY_RE = re.compile(r"^(\S+)\s+: xmt/rcv/%loss = \d+/(\d+)/.*$", re.MULTILINE)
 
 
 def validate_foundries_device_connectivity(
     device_name: Optional[str] = None,
     factory: Optional[str] = None,
+    force_ssh: bool = False,
+    verbose: bool = False,
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
 ) -> Dict[str, Any]:
     """
     Comprehensive validation of Foundries VPN and device connectivity.
@@ -60,6 +91,13 @@ def validate_foundries_device_connectivity(
         device_name: Optional specific device name to validate. If not provided,
                     validates all Foundries devices with VPN enabled.
         factory: Optional factory name. If not provided, uses default factory from fioctl config.
+        force_ssh: Try SSH even on devices that did not answer ping (by default
+                   the SSH test is skipped for them instead of waiting out its timeout)
+        verbose: Include ping/SSH output for successful tests too (failures always
+                 include the end of the error output)
+        progress_callback: Optional function called with each step result as soon as
+                           that step finishes, so callers can report progress while
+                           the remaining steps run
 
     Returns:
         Dictionary with comprehensive validation results including:
@@ -73,6 +111,16 @@ def validate_foundries_device_connectivity(
         validation_steps = []
         validation_errors = []
         validation_warnings = []
+        # Running count of passed steps, so the summary needs no second pass
+        steps_passed = 0
+
+        def record_step(step_result: Dict[str, Any]):
+            validation_steps.append(step_result)
+            if progress_callback:
+                try:
+                    progress_callback(step_result)
+                except Exception as e:
+                    logger.warning(f"Validation progress callback failed: {e}")
 
         # Step 1: Check connection to Foundries VPN server
         step1_result = {
@@ -87,7 +135,7 @@ def validate_foundries_device_connectivity(
             step1_result["status"] = "failed"
             step1_result["error"] = vpn_status.get("error", "Unknown error")
             validation_errors.append(f"Step 1 failed: {step1_result['error']}")
-            validation_steps.append(step1_result)
+            record_step(step1_result)
             return {
                 "success": False,
                 "validation_steps": validation_steps,
@@ -100,7 +148,7 @@ def validate_foundries_device_connectivity(
             step1_result["status"] = "failed"
             step1_result["error"] = "Foundries VPN is not connected"
             validation_errors.append("Step 1 failed: VPN not connected")
-            validation_steps.append(step1_result)
+            record_step(step1_result)
             return {
                 "success": False,
                 "validation_steps": validation_steps,
@@ -118,7 +166,7 @@ def validate_foundries_device_connectivity(
             step1_result["status"] = "failed"
             step1_result["error"] = "Failed to get VPN server configuration"
             validation_errors.append("Step 1 failed: Cannot get server config")
-            validation_steps.append(step1_result)
+            record_step(step1_result)
             return {
                 "success": False,
                 "validation_steps": validation_steps,
@@ -131,7 +179,7 @@ def validate_foundries_device_connectivity(
             step1_result["status"] = "failed"
             step1_result["error"] = "Server IP not found in configuration"
             validation_errors.append("Step 1 failed: Server IP not found")
-            validation_steps.append(step1_result)
+            record_step(step1_result)
             return {
                 "success": False,
                 "validation_steps": validation_steps,
@@ -140,29 +188,25 @@ def validate_foundries_device_connectivity(
             }
 
         # Test ping to VPN server
-        ping_result = subprocess.run(
-            ["ping", "-c", "2", "-W", "2", server_ip],
-            check=False,
-            capture_output=True,
-            text=True,
-            timeout=5,
+        ping_success, ping_output = _run_probe(
+            ["ping", *_PING_ARGS, server_ip], _PING_TIMEOUT, verbose
         )
-
-        ping_success = ping_result.returncode == 0
         step1_result["status"] = "passed" if ping_success else "warning"
         step1_result["details"] = {
             "vpn_connected": True,
             "server_ip": server_ip,
             "server_endpoint": server_config.get("endpoint", "Unknown"),
             "ping_to_server": ping_success,
-            "ping_output": ping_result.stdout if ping_success else ping_result.stderr,
+            "ping_output": ping_output,
         }
 
-        if not ping_success:
+        if ping_success:
+            steps_passed += 1
+        else:
             validation_warnings.append(f"Step 1 warning: Cannot ping VPN server {server_ip}")
             step1_result["warning"] = f"Cannot ping VPN server {server_ip}"
 
-        validation_steps.append(step1_result)
+        record_step(step1_result)
 
         # Step 2: List relevant Foundries devices
         step2_result = {
@@ -172,14 +216,13 @@ def validate_foundries_device_connectivity(
             "details": {},
         }
 
-        from lab_testing.tools.foundries_devices import list_foundries_devices
-
-        devices_result = list_foundries_devices(factory)
+        # Shared short-lived listing, so repeated validations don't re-run fioctl
+        devices_result = get_devices(factory)
         if not devices_result.get("success"):
             step2_result["status"] = "failed"
             step2_result["error"] = devices_result.get("error", "Unknown error")
             validation_errors.append(f"Step 2 failed: {step2_result['error']}")
-            validation_steps.append(step2_result)
+            record_step(step2_result)
             return {
                 "success": False,
                 "validation_steps": validation_steps,
@@ -193,7 +236,7 @@ def validate_foundries_device_connectivity(
             step2_result["status"] = "warning"
             step2_result["warning"] = "No Foundries devices found in factory"
             validation_warnings.append("Step 2 warning: No devices found")
-            validation_steps.append(step2_result)
+            record_step(step2_result)
             return {
                 "success": True,
                 "validation_steps": validation_steps,
@@ -203,12 +246,13 @@ def validate_foundries_device_connectivity(
 
         # Filter devices if device_name specified
         if device_name:
-            matching_devices = [d for d in all_devices if d.get("name") == device_name]
-            if not matching_devices:
+            # Device names are unique in a factory, so stop at the first match
+            matching_device = next((d for d in all_devices if d.get("name") == device_name), None)
+            if matching_device is None:
                 step2_result["status"] = "failed"
                 step2_result["error"] = f"Device '{device_name}' not found in factory"
                 validation_errors.append(f"Step 2 failed: Device '{device_name}' not found")
-                validation_steps.append(step2_result)
+                record_step(step2_result)
                 return {
                     "success": False,
                     "validation_steps": validation_steps,
@@ -219,7 +263,7 @@ def validate_foundries_device_connectivity(
                         "List all devices: list_foundries_devices()",
                     ],
                 }
-            devices_to_validate = matching_devices
+            devices_to_validate = [matching_device]
         else:
             # Filter to only devices with VPN IP (VPN enabled)
             devices_to_validate = [d for d in all_devices if d.get("vpn_ip")]
@@ -227,7 +271,7 @@ def validate_foundries_device_connectivity(
                 step2_result["status"] = "warning"
                 step2_result["warning"] = "No devices with VPN enabled found"
                 validation_warnings.append("Step 2 warning: No VPN-enabled devices")
-                validation_steps.append(step2_result)
+                record_step(step2_result)
                 return {
                     "success": True,
                     "validation_steps": validation_steps,
@@ -236,54 +280,23 @@ def validate_foundries_device_connectivity(
                 }
 
         step2_result["status"] = "passed"
+        steps_passed += 1
         step2_result["details"] = {
             "total_devices": len(all_devices),
             "devices_to_validate": len(devices_to_validate),
             "device_names": [d.get("name") for d in devices_to_validate],
         }
-        validation_steps.append(step2_result)
+        record_step(step2_result)
 
-        # Step 3: Check devices are online and VPN is enabled
+        # Steps 3 and 4 share one pass over the devices: each device's probes are
+        # dispatched as soon as its Step 3 check is recorded. fping covers every
+        # device in one process when available; the remaining probes run concurrently.
         step3_result = {
             "step": 3,
             "name": "Check Devices Online and VPN Enabled",
             "status": "pending",
             "details": {"devices": []},
         }
-
-        devices_status = []
-        for device in devices_to_validate:
-            device_name_check = device.get("name")
-            device_status = device.get("status", "Unknown")
-            vpn_ip = device.get("vpn_ip")
-            last_seen = device.get("last_seen")
-
-            device_check = {
-                "device_name": device_name_check,
-                "status": device_status,
-                "vpn_ip": vpn_ip,
-                "last_seen": last_seen,
-                "vpn_enabled": vpn_ip is not None,
-                "online": device_status == "OK",
-            }
-
-            if not vpn_ip:
-                device_check["warning"] = "VPN IP not found - VPN may not be enabled"
-                validation_warnings.append(f"Device {device_name_check}: VPN IP not found")
-
-            if device_status != "OK":
-                device_check["warning"] = f"Device status is '{device_status}', not 'OK'"
-                validation_warnings.append(
-                    f"Device {device_name_check}: Status is '{device_status}'"
-                )
-
-            devices_status.append(device_check)
-
-        step3_result["status"] = "passed"
-        step3_result["details"]["devices"] = devices_status
-        validation_steps.append(step3_result)
-
-        # Step 4: Test ping and SSH connectivity
         step4_result = {
             "step": 4,
             "name": "Test Ping and SSH Connectivity",
@@ -291,120 +304,86 @@ def validate_foundries_device_connectivity(
             "details": {"devices": []},
         }
 
-        connectivity_results = []
-        for device in devices_to_validate:
-            device_name_check = device.get("name")
-            vpn_ip = device.get("vpn_ip")
-
-            if not vpn_ip:
-                connectivity_results.append(
-                    {
-                        "device_name": device_name_check,
-                        "vpn_ip": None,
-                        "ping_test": "skipped",
-                        "ssh_test": "skipped",
-                        "error": "No VPN IP available",
-                    }
-                )
-                continue
-
-            device_connectivity = {
-                "device_name": device_name_check,
-                "vpn_ip": vpn_ip,
-            }
-
-            # Test ping
-            ping_result = subprocess.run(
-                ["ping", "-c", "2", "-W", "2", vpn_ip],
-                check=False,
-                capture_output=True,
-                text=True,
-                timeout=5,
-            )
-
-            ping_success = ping_result.returncode == 0
-            device_connectivity["ping_test"] = {
-                "success": ping_success,
-                "output": ping_result.stdout if ping_success else ping_result.stderr,
-            }
-
-            if not ping_success:
-                validation_warnings.append(f"Device {device_name_check} ({vpn_ip}): Cannot ping")
-                device_connectivity["ping_test"]["suggestion"] = (
-                    "Device may not have device-to-device communication enabled. "
-                    "Run: enable_foundries_device_to_device(device_name='...')"
-                )
-
-            # Test SSH connectivity
-            ssh_success = False
-            ssh_error = None
-            ssh_output = None
-
-            # Try SSH with default credentials (fio/fio for Foundries devices)
-            try:
-                ssh_test_cmd = [
-                    "sshpass",
-                    "-p",
-                    "fio",
-                    "ssh",
-                    "-o",
-                    "StrictHostKeyChecking=no",
-                    "-o",
-                    "ConnectTimeout=5",
-                    "-o",
-                    "BatchMode=yes",
-                    "fio@" + vpn_ip,
-                    "echo 'SSH test successful'",
-                ]
-
-                ssh_result = subprocess.run(
-                    ssh_test_cmd,
-                    check=False,
-                    capture_output=True,
-                    text=True,
-                    timeout=10,
+        ping_results = _ping_hosts([d["vpn_ip"] for d in devices_to_validate if d.get("vpn_ip")])
+        devices_status = []
+        with ThreadPoolExecutor(
+            max_workers=min(_PROBE_MAX_WORKERS, len(devices_to_validate))
+        ) as executor:
+            probe_futures = []
+            for device in devices_to_validate:
+                device_name_check = device.get("name")
+                device_status = device.get("status", "Unknown")
+                vpn_ip = device.get("vpn_ip")
+                last_seen = device.get("last_seen")
+
+                probe_futures.append(
+                    executor.submit(
+                        _probe_device, device, ping_results.get(vpn_ip), force_ssh, verbose
+                    )
                 )
 
-                ssh_success = ssh_result.returncode == 0
-                ssh_output = ssh_result.stdout if ssh_success else ssh_result.stderr
-                if not ssh_success:
-                    ssh_error = ssh_result.stderr.strip() or "SSH connection failed"
-
-            except Exception as e:
-                ssh_error = f"SSH test exception: {e!s}"
-
-            device_connectivity["ssh_test"] = {
-                "success": ssh_success,
-                "output": ssh_output,
-                "error": ssh_error,
-            }
+                device_check = {
+                    "device_name": device_name_check,
+                    "status": device_status,
+                    "vpn_ip": vpn_ip,
+                    "last_seen": last_seen,
+                    "vpn_enabled": vpn_ip is not None,
+                    "online": device_status == "OK",
+                }
 
-            if not ssh_success:
-                validation_warnings.append(f"Device {device_name_check} ({vpn_ip}): Cannot SSH")
-                device_connectivity["ssh_test"]["suggestion"] = (
-                    "Device may not have device-to-device communication enabled. "
-                    "Run: enable_foundries_device_to_device(device_name='...')"
+                if not vpn_ip:
+                    device_check["warning"] = "VPN IP not found - VPN may not be enabled"
+                    validation_warnings.append(f"Device {device_name_check}: VPN IP not found")
+
+                if device_status != "OK":
+                    device_check["warning"] = f"Device status is '{device_status}', not 'OK'"
+                    validation_warnings.append(
+                        f"Device {device_name_check}: Status is '{device_status}'"
+                    )
+
+                devices_status.append(device_check)
+
+            step3_result["status"] = "passed"
+            steps_passed += 1
+            step3_result["details"]["devices"] = devices_status
+            record_step(step3_result)
+
+            # Step 4: Collect ping and SSH results in device order, then re-probe
+            # the devices that failed with the longer retry timeouts
+            probes = [future.result() for future in probe_futures]
+            retry_indexes = [
+                i
+                for i, (device_connectivity, _) in enumerate(probes)
+                if device_connectivity.get("ping_test") != "skipped"
+                and not (device_connectivity.get("ping_ok") and device_connectivity.get("ssh_ok"))
+            ]
+            retry_futures = [
+                executor.submit(
+                    _probe_device, devices_to_validate[i], None, force_ssh, verbose, True
                 )
+                for i in retry_indexes
+            ]
+            for i, future in zip(retry_indexes, retry_futures):
+                probes[i] = future.result()
 
+        connectivity_results = []
+        for device_connectivity, probe_warnings in probes:
             connectivity_results.append(device_connectivity)
+            validation_warnings.extend(probe_warnings)
 
-        step4_result["status"] = (
-            "passed"
-            if all(
-                d.get("ping_test", {}).get("success", False)
-                and d.get("ssh_test", {}).get("success", False)
-                for d in connectivity_results
-                if d.get("ping_test") != "skipped"
-            )
-            else "warning"
+        step4_passed = all(
+            d.get("ping_ok") and d.get("ssh_ok")
+            for d in connectivity_results
+            if d.get("ping_test") != "skipped"
         )
+        step4_result["status"] = "passed" if step4_passed else "warning"
+        if step4_passed:
+            steps_passed += 1
         step4_result["details"]["devices"] = connectivity_results
-        validation_steps.append(step4_result)
+        record_step(step4_result)
 
         # Summary
-        all_passed = len(validation_errors) == 0 and all(
-            step.get("status") == "passed" for step in validation_steps
-        )
+        all_passed = not validation_errors and steps_passed == len(validation_steps)
 
         return {
             "success": all_passed,
@@ -442,6 +421,199 @@ def validate_foundries_device_connectivity(
         }
 
 
+def _failure_output(stderr: bytes) -> str:
+    """Decode the end of a failed probe's stderr for the validation report"""
+    return stderr[-_FAILURE_OUTPUT_BYTES:].decode("utf-8", "replace")
+
+
+def _run_probe(
+    args: List[str], timeout: float, verbose: bool = False
+) -> Tuple[bool, Optional[str]]:
+    """
+    Run a ping/SSH probe command.
+
+    Args:
+        args: Command to run
+        timeout: Command timeout (seconds)
+        verbose: Keep stdout of a successful probe (discarded otherwise)
+
+    Returns:
+        Tuple of (success, output); output is the end of stderr on failure and
+        None on success unless verbose
+    """
+    result = subprocess.run(
+        args,
+        check=False,
+        stdout=subprocess.PIPE if verbose else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        timeout=timeout,
+    )
+    if result.returncode != 0:
+        return False, _failure_output(result.stderr)
+    return True, result.stdout.decode("utf-8", "replace") if verbose else None
+
+
+def _ping_hosts(ips: List[str]) -> Dict[str, Tuple[bool, str]]:
+    """
+    Ping several hosts with a single fping run.
+
+    Args:
+        ips: Addresses to ping
+
+    Returns:
+        Dictionary mapping each address fping reported on to (reachable, summary line);
+        empty if fping is not installed or failed, so callers ping individually
+    """
+    fping_path = _get_fping_path()
+    if not fping_path or not ips:
+        return {}
+
+    try:
+        result = subprocess.run(
+            [fping_path, "-q", "-c", "2", "-p", "200", "-t", "1000", *ips],
+            check=False,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.debug(f"fping failed, falling back to ping: {e}")
+        return {}
+
+    return {
+        match.group(1): (int(match.group(2)) > 0, match.group(0))
+        for match in _FPING_SUMMARY_RE.finditer(result.stderr)
+    }
+
+
+def _probe_device(
+    device: Dict[str, Any],
+    ping: Optional[Tuple[bool, str]] = None,
+    force_ssh: bool = False,
+    verbose: bool = False,
+    retry: bool = False,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Test ping and SSH connectivity to one device (Step 4 of the validation).
+
+    Args:
+        device: Device entry from list_foundries_devices
+        ping: Result of an earlier batched ping as (reachable, output); pings the
+              device itself when not provided
+        force_ssh: Try SSH even when the ping failed
+        verbose: Keep the output of successful tests
+        retry: Use the longer retry-pass timeouts
+
+    Returns:
+        Tuple of (device connectivity results, validation warnings)
+    """
+    warnings = []
+    device_name_check = device.get("name")
+    vpn_ip = device.get("vpn_ip")
+
+    if not vpn_ip:
+        return {
+            "device_name": device_name_check,
+            "vpn_ip": None,
+            "ping_test": "skipped",
+            "ssh_test": "skipped",
+            "error": "No VPN IP available",
+        }, warnings
+
+    device_connectivity = {
+        "device_name": device_name_check,
+        "vpn_ip": vpn_ip,
+    }
+
+    # Test ping
+    if ping is None:
+        if retry:
+            ping = _run_probe(["ping", *_PING_RETRY_ARGS, vpn_ip], _PING_RETRY_TIMEOUT, verbose)
+        else:
+            ping = _run_probe(["ping", *_PING_ARGS, vpn_ip], _PING_TIMEOUT, verbose)
+
+    ping_success, ping_output = ping
+    if ping_success and not verbose:
+        ping_output = None
+    device_connectivity["ping_test"] = {
+        "success": ping_success,
+        "output": ping_output,
+    }
+    device_connectivity["ping_ok"] = ping_success
+
+    if not ping_success:
+        warnings.append(f"Device {device_name_check} ({vpn_ip}): Cannot ping")
+        device_connectivity["ping_test"]["suggestion"] = (
+            "Device may not have device-to-device communication enabled. "
+            "Run: enable_foundries_device_to_device(device_name='...')"
+        )
+        if not force_ssh:
+            # No route to the device, so SSH would only wait out its timeout
+            device_connectivity["ssh_test"] = {
+                "success": False,
+                "output": None,
+                "error": "skipped: ping unreachable",
+            }
+            device_connectivity["ssh_ok"] = False
+            return device_connectivity, warnings
+
+    # Test SSH connectivity
+    ssh_success = False
+    ssh_error = None
+    ssh_output = None
+    ssh_auth = None
+
+    # Try key authentication first (no password prompt, so no sshpass process),
+    # then the default Foundries credentials (fio/fio) if the device refuses the key.
+    # Back-to-back validations reuse the authenticated connection via ControlMaster.
+    connect_timeout = _SSH_RETRY_CONNECT_TIMEOUT if retry else _SSH_CONNECT_TIMEOUT
+    ssh_timeout = _SSH_RETRY_PROBE_TIMEOUT if retry else _SSH_PROBE_TIMEOUT
+    ssh_args = [
+        *_SSH_PROBE_OPTIONS,
+        "-o",
+        f"ConnectTimeout={connect_timeout}",
+        *get_ssh_multiplex_options(),
+        "fio@" + vpn_ip,
+    ]
+    ssh_attempts = (
+        ("key", ["ssh", "-o", "BatchMode=yes", *ssh_args]),
+        ("password", ["sshpass", "-p", _SSH_PROBE_PASSWORD, "ssh", *ssh_args]),
+    )
+    try:
+        for auth, ssh_cmd in ssh_attempts:
+            ssh_success, ssh_output = _run_probe(
+                [*ssh_cmd, "echo 'SSH test successful'"], ssh_timeout, verbose
+            )
+            if ssh_success:
+                ssh_auth = auth
+                ssh_error = None
+                break
+            ssh_error = ssh_output.strip() or "SSH connection failed"
+            if "Permission denied" not in ssh_output:
+                # Not an authentication failure (e.g. timeout): a password won't help
+                break
+
+    except Exception as e:
+        ssh_error = f"SSH test exception: {e!s}"
+
+    device_connectivity["ssh_test"] = {
+        "success": ssh_success,
+        "output": ssh_output,
+        "error": ssh_error,
+        "auth": ssh_auth,
+    }
+    device_connectivity["ssh_ok"] = ssh_success
+
+    if not ssh_success:
+        warnings.append(f"Device {device_name_check} ({vpn_ip}): Cannot SSH")
+        device_connectivity["ssh_test"]["suggestion"] = (
+            "Device may not have device-to-device communication enabled. "
+            "Run: enable_foundries_device_to_device(device_name='...')"
+        )
+
+    return device_connectivity, warnings
+
+
 def _generate_next_steps(
     validation_errors: List[str],
     validation_warnings: List[str],
@@ -451,23 +623,16 @@ def _generate_next_steps(
     next_steps = []
 
     # Check for connectivity failures
-    ping_failures = [
-        d
-        for d in connectivity_results
-        if d.get("ping_test") != "skipped" and not d.get("ping_test", {}).get("success", False)
-    ]
-    ssh_failures = [
-        d
-        for d in connectivity_results
-        if d.get("ssh_test") != "skipped" and not d.get("ssh_test", {}).get("success", False)
-    ]
+    # ping_ok/ssh_ok are absent (None) for devices that were not probed
+    ping_failures = [d for d in connectivity_results if d.get("ping_ok") is False]
+    ssh_failures = [d for d in connectivity_results if d.get("ssh_ok") is False]
 
     if ping_failures or ssh_failures:
-        failed_devices = set()
-        for d in ping_failures + ssh_failures:
-            device_name = d.get("device_name")
-            if device_name:
-                failed_devices.add(device_name)
+        failed_devices = {
+            d["device_name"]
+            for d in itertools.chain(ping_failures, ssh_failures)
+            if d.get("device_name")
+        }
 
         if failed_devices:
             device_list = ", ".join([f"'{d}'" for d in failed_devices])
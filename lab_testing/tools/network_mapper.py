@@ -12,6 +12,7 @@ import concurrent.futures
 import io
 import ipaddress
 import json
+import re
 import subprocess
 import time
 from pathlib import Path
@@ -19,6 +20,7 @@ from typing import Any, Dict, List, Optional, Tuple
 
 from lab_testing.config import get_lab_devices_config
 from lab_testing.tools.device_manager import ssh_to_device, test_device
+from lab_testing.tools.foundries_vpn_helpers import _get_fping_path
 from lab_testing.tools.tasmota_control import get_power_switch_for_device
 from lab_testing.utils.logger import get_logger
 
@@ -39,6 +41,10 @@ except ImportError:
     logger.warning("matplotlib not available - image generation disabled")
 
 
+# fping -a -e line for a host that replied, e.g. "192.168.1.10 (0.42 ms)"
+_FPING_ALIVE_RE = re.compile(r"^(\S+) \(([\d.]+) ms\)", re.MULTILINE)
+
+
 def _ping_host(ip: str, timeout: float = 0.5) -> Tuple[str, bool, Optional[float]]:
     """Ping a single host and return (ip, reachable, latency_ms)
 
@@ -64,6 +70,43 @@ def _ping_host(ip: str, timeout: float = 0.5) -> Tuple[str, bool, Optional[float
         return (ip, False, None)
 
 
+def _fping_hosts(hosts: List[str], timeout: float = 0.5) -> Optional[List[Tuple[str, float]]]:
+    """Ping many hosts from a single fping process
+
+    Args:
+        hosts: IP addresses to ping (one packet each)
+        timeout: Reply timeout per host in seconds
+
+    Returns:
+        List of (ip, latency_ms) for hosts that replied, or None if fping is not
+        installed or failed (callers then ping hosts individually)
+    """
+    fping_path = _get_fping_path()
+    if not fping_path or not hosts:
+        return None
+
+    try:
+        # -a/-e: print replying hosts with their round-trip time; -r 0: no retries,
+        # matching a single ping; -i 1: 1 ms between packets to successive hosts
+        result = subprocess.run(
+            [fping_path, "-a", "-e", "-r", "0", "-i", "1", "-t", str(int(timeout * 1000)), *hosts],
+            check=False,
+            capture_output=True,
+            text=True,
+            timeout=len(hosts) * 0.001 + timeout + 5,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.debug(f"fping failed, falling back to ping: {e}")
+        return None
+
+    # Exit status 1 just means some hosts did not reply; 3+ are usage/system errors
+    if result.returncode > 2:
+        logger.debug(f"fping failed ({result.returncode}), falling back to ping: {result.stderr}")
+        return None
+
+    return [(m.group(1), float(m.group(2))) for m in _FPING_ALIVE_RE.finditer(result.stdout)]
+
+
 def _scan_network_range(
     network: str, max_hosts: int = 254, timeout: float = 0.5
 ) -> List[Dict[str, Any]]:
@@ -84,6 +127,15 @@ def _scan_network_range(
 
         active_hosts = []
 
+        # Ping the whole range from one fping process when available
+        replies = _fping_hosts([str(host) for host in hosts], timeout)
+        if replies is not None:
+            active_hosts = [
+                {"ip": ip, "latency_ms": round(latency, 2), "status": "online"}
+                for ip, latency in replies
+            ]
+            return sorted(active_hosts, key=lambda x: int(ipaddress.IPv4Address(x["ip"])))
+
         # Use thread pool for parallel pings - increased workers for faster scanning
         with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
             futures = {executor.submit(_ping_host, str(host), timeout): str(host) for host in hosts}
@@ -99,7 +151,7 @@ def _scan_network_range(
                         }
                     )
 
-        return sorted(active_hosts, key=lambda x: ipaddress.IPv4Address(x["ip"]))
+        return sorted(active_hosts, key=lambda x: int(ipaddress.IPv4Address(x["ip"])))
 
     except Exception as e:
         logger.warning(f"Failed to scan network {network}: {e}")
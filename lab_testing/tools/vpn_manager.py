@@ -8,6 +8,14 @@ from typing import Any, Dict, Optional
 from lab_testing.config import get_vpn_config
 
 
+def _invalidate_foundries_vpn_status():
+    """Drop the cached Foundries VPN status, which also reports these interfaces"""
+    # Local import to avoid loading the Foundries tools for plain VPN use
+    from lab_testing.tools.foundries_vpn_core import _invalidate_vpn_status
+
+    _invalidate_vpn_status()
+
+
 def get_vpn_status() -> Dict[str, Any]:
     """
     Get current WireGuard VPN connection status.
@@ -248,6 +256,7 @@ def connect_vpn() -> Dict[str, Any]:
     Returns:
         Dictionary with connection results
     """
+    _invalidate_foundries_vpn_status()
     vpn_config = get_vpn_config()
 
     if not vpn_config or not vpn_config.exists():
@@ -315,6 +324,7 @@ def disconnect_vpn() -> Dict[str, Any]:
     Returns:
         Dictionary with disconnection results
     """
+    _invalidate_foundries_vpn_status()
     try:
         # Try NetworkManager first
         nm_connection = _find_networkmanager_connection()
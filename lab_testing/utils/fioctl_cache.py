@@ -0,0 +1,65 @@
+"""
+fioctl Result Cache
+
+Short-lived in-process cache for fioctl device listings, so scripted setups
+that resolve many devices in a row make one FoundriesFactory API call
+instead of one per device.
+
+Copyright (C) 2025 Dynamic Devices Ltd
+License: GPL-3.0-or-later
+"""
+
+import copy
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from lab_testing.tools.foundries_devices import list_foundries_devices
+
+# Device listings are reused for this long (seconds)
+DEVICES_TTL_SECONDS = 30.0
+
+# Successful listings per factory: factory -> (expiry monotonic time, result)
+_devices_cache: Dict[Optional[str], Tuple[float, Dict[str, Any]]] = {}
+_devices_lock = threading.Lock()
+
+
+def get_devices(factory: Optional[str] = None, ttl: float = DEVICES_TTL_SECONDS) -> Dict[str, Any]:
+    """
+    Get list_foundries_devices() for a factory, reusing a recent result.
+
+    Only successful listings are cached, so a failed lookup is retried next time.
+    Callers get their own copy, so changing the result does not affect the cache.
+
+    Args:
+        factory: Optional factory name. If not provided, uses default factory from fioctl config.
+        ttl: How long a listing may be reused (seconds)
+
+    Returns:
+        Dictionary with list of Foundries devices and metadata
+    """
+    now = time.monotonic()
+    with _devices_lock:
+        cached = _devices_cache.get(factory)
+    if cached and cached[0] > now:
+        return copy.deepcopy(cached[1])
+
+    result = list_foundries_devices(factory)
+    if result.get("success"):
+        with _devices_lock:
+            _devices_cache[factory] = (now + ttl, copy.deepcopy(result))
+    return result
+
+
+def invalidate_devices(factory: Optional[str] = None):
+    """
+    Drop cached device listings, e.g. after a device's configuration was changed.
+
+    Args:
+        factory: Factory to drop; drops every factory when not provided
+    """
+    with _devices_lock:
+        if factory is None:
+            _devices_cache.clear()
+        else:
+            _devices_cache.pop(factory, None)
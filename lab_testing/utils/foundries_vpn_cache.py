@@ -9,14 +9,21 @@ License: GPL-3.0-or-later
 """
 
 import json
+import os
 import threading
 import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from lab_testing.config import CACHE_DIR
 from lab_testing.utils.logger import get_logger
 
+try:
+    import fcntl
+except ImportError:  # Windows - updates are only serialized within this process
+    fcntl = None
+
 logger = get_logger()
 
 # Cache file path
@@ -25,9 +32,34 @@ VPN_IP_CACHE_FILE = CACHE_DIR / "foundries_vpn_ips.json"
 # Cache expiration time (7 days - IPs don't change often)
 CACHE_EXPIRY_SECONDS = 7 * 24 * 60 * 60
 
+# Per-device fioctl lookup results (including devices without a VPN address)
+FIOCTL_LOOKUP_CACHE_FILE = CACHE_DIR / "fioctl_wireguard_lookups.json"
+
+# fioctl lookups are re-queried after this long (5 minutes)
+FIOCTL_LOOKUP_TTL_SECONDS = 5 * 60
+
+# Public key derived from the client config, keyed on the config file's mtime
+CLIENT_PUBKEY_CACHE_FILE = CACHE_DIR / "foundries_vpn_client_pubkey.json"
+
+# Server host from the client config's Endpoint line, keyed on the config file's mtime
+CLIENT_ENDPOINT_CACHE_FILE = CACHE_DIR / "foundries_vpn_client_endpoint.json"
+
+# Client peers recently confirmed as registered on the WireGuard server
+PEER_REGISTRATION_CACHE_FILE = CACHE_DIR / "foundries_vpn_peer_registrations.json"
+
+# Confirmed peer registrations are re-checked on the server after this long (1 minute)
+PEER_REGISTRATION_TTL_SECONDS = 60
+
 # Lock for cache file operations
 _cache_lock = threading.Lock()
 
+# Lock serializing read-modify-write updates within this process (see _locked_update)
+_update_lock = threading.Lock()
+
+# Parsed VPN IP cache, reused while the file's (path, inode, mtime, size) is unchanged
+_loaded_cache: Dict[str, Any] = {"key": None, "data": {}}
+_loaded_cache_lock = threading.Lock()
+
 
 def _ensure_cache_dir():
     """Ensure cache directory exists"""
@@ -35,18 +67,35 @@ def _ensure_cache_dir():
 
 
 def load_vpn_ip_cache() -> Dict[str, Any]:
-    """Load VPN IP cache from file"""
+    """
+    Load VPN IP cache from file.
+
+    The parsed cache is kept in memory and only re-read when the file changes,
+    so repeated lookups cost a stat() instead of a full JSON parse.
+    """
     _ensure_cache_dir()
 
-    if not VPN_IP_CACHE_FILE.exists():
+    try:
+        stat = VPN_IP_CACHE_FILE.stat()
+    except FileNotFoundError:
+        return {}
+    except OSError as e:
+        logger.warning(f"Failed to read VPN IP cache: {e}")
         return {}
 
+    key = (str(VPN_IP_CACHE_FILE), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _loaded_cache_lock:
+        if _loaded_cache["key"] == key:
+            return dict(_loaded_cache["data"])
+
     try:
         with open(VPN_IP_CACHE_FILE) as f:
             content = f.read().strip()
-            if not content:
-                return {}
-            return json.loads(content)
+        cache = json.loads(content) if content else {}
+        with _loaded_cache_lock:
+            _loaded_cache["key"] = key
+            _loaded_cache["data"] = cache
+        return dict(cache)
     except json.JSONDecodeError as e:
         logger.warning(f"Failed to load VPN IP cache (corrupted JSON): {e}")
         # Try to recover by backing up corrupted cache
@@ -65,28 +114,23 @@ def load_vpn_ip_cache() -> Dict[str, Any]:
         return {}
 
 
-def save_vpn_ip_cache(cache: Dict[str, Any]):
-    """Save VPN IP cache to file (atomic write)"""
+def _write_json_atomic(path: Path, data: Dict[str, Any]):
+    """Write JSON to path atomically: write to temp file, then rename"""
     with _cache_lock:
         _ensure_cache_dir()
 
-        # Use atomic write: write to temp file, then rename
-        temp_file = CACHE_DIR / f"{VPN_IP_CACHE_FILE.name}.tmp"
+        temp_file = path.parent / f"{path.name}.tmp"
 
         try:
             with open(temp_file, "w") as f:
-                json.dump(cache, f, indent=2)
+                json.dump(data, f, indent=2)
                 f.flush()
-                import os
-
                 os.fsync(f.fileno())
 
             # Atomic rename
-            import os
-
-            os.replace(str(temp_file), str(VPN_IP_CACHE_FILE))
+            os.replace(str(temp_file), str(path))
         except OSError as e:
-            logger.warning(f"Failed to save VPN IP cache: {e}")
+            logger.warning(f"Failed to save {path.name}: {e}")
             try:
                 if temp_file.exists():
                     temp_file.unlink()
@@ -94,6 +138,40 @@ def save_vpn_ip_cache(cache: Dict[str, Any]):
                 pass
 
 
+@contextmanager
+def _locked_update(path: Path):
+    """
+    Serialize read-modify-write updates of a cache file across threads and processes.
+
+    Several MCP server processes can share the cache directory; without an
+    exclusive lock, concurrent updates would each rewrite the file from their own
+    stale copy and lose each other's entries.
+    """
+    with _update_lock:
+        _ensure_cache_dir()
+        with open(path.with_suffix(".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _invalidate_loaded_cache():
+    """Force the next load_vpn_ip_cache() to re-read the file"""
+    with _loaded_cache_lock:
+        _loaded_cache["key"] = None
+        _loaded_cache["data"] = {}
+
+
+def save_vpn_ip_cache(cache: Dict[str, Any]):
+    """Save VPN IP cache to file (atomic write)"""
+    _write_json_atomic(VPN_IP_CACHE_FILE, cache)
+    _invalidate_loaded_cache()
+
+
 def get_vpn_ip(device_name: str) -> Optional[str]:
     """
     Get cached VPN IP address for a Foundries device.
@@ -113,7 +191,7 @@ def get_vpn_ip(device_name: str) -> Optional[str]:
     # Check if cache is expired
     cached_time = entry.get("cached_at", 0)
     if time.time() - cached_time > CACHE_EXPIRY_SECONDS:
-        logger.debug(f"VPN IP cache expired for {device_name}")
+        logger.debug("VPN IP cache expired for %s", device_name)
         return None
 
     return entry.get("vpn_ip")
@@ -128,16 +206,43 @@ def cache_vpn_ip(device_name: str, vpn_ip: str, source: str = "unknown"):
         vpn_ip: VPN IP address
         source: Source of the IP (e.g., "wireguard_server_hosts", "fioctl", "manual")
     """
-    cache = load_vpn_ip_cache()
+    with _locked_update(VPN_IP_CACHE_FILE):
+        cache = load_vpn_ip_cache()
+
+        cache[device_name] = {
+            "vpn_ip": vpn_ip,
+            "cached_at": time.time(),
+            "source": source,
+        }
+
+        save_vpn_ip_cache(cache)
+    logger.debug("Cached VPN IP for %s: %s (source: %s)", device_name, vpn_ip, source)
+
+
+def cache_vpn_ips_bulk(entries: Dict[str, str], source: str = "unknown"):
+    """
+    Cache VPN IP addresses for many Foundries devices with a single cache write.
 
-    cache[device_name] = {
-        "vpn_ip": vpn_ip,
-        "cached_at": time.time(),
-        "source": source,
-    }
+    Args:
+        entries: Dictionary mapping device_name -> VPN IP address
+        source: Source of the IPs (e.g., "wireguard_server_hosts", "fioctl", "manual")
+    """
+    if not entries:
+        return
+
+    with _locked_update(VPN_IP_CACHE_FILE):
+        cache = load_vpn_ip_cache()
+
+        cached_at = time.time()
+        for device_name, vpn_ip in entries.items():
+            cache[device_name] = {
+                "vpn_ip": vpn_ip,
+                "cached_at": cached_at,
+                "source": source,
+            }
 
-    save_vpn_ip_cache(cache)
-    logger.debug(f"Cached VPN IP for {device_name}: {vpn_ip} (source: {source})")
+        save_vpn_ip_cache(cache)
+    logger.debug("Cached %d VPN IPs (source: %s)", len(entries), source)
 
 
 def get_all_cached_ips() -> Dict[str, Dict[str, Any]]:
@@ -166,6 +271,7 @@ def clear_vpn_ip_cache():
     if VPN_IP_CACHE_FILE.exists():
         VPN_IP_CACHE_FILE.unlink()
         logger.info("VPN IP cache cleared")
+    _invalidate_loaded_cache()
 
 
 def remove_vpn_ip(device_name: str) -> bool:
@@ -178,12 +284,223 @@ def remove_vpn_ip(device_name: str) -> bool:
     Returns:
         True if removed, False if not found
     """
-    cache = load_vpn_ip_cache()
+    with _locked_update(VPN_IP_CACHE_FILE):
+        cache = load_vpn_ip_cache()
 
-    if device_name not in cache:
-        return False
+        if device_name not in cache:
+            return False
 
-    del cache[device_name]
-    save_vpn_ip_cache(cache)
+        del cache[device_name]
+        save_vpn_ip_cache(cache)
     logger.info(f"Removed VPN IP cache entry for {device_name}")
     return True
+
+
+def get_fioctl_lookups(device_names: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Get fresh fioctl VPN address lookups for devices.
+
+    Negative results are cached too, so devices without VPN enabled are not
+    re-queried on every refresh.
+
+    Args:
+        device_names: Foundries device names
+
+    Returns:
+        Dictionary mapping device_name -> VPN IP (or None) for devices looked up
+        within FIOCTL_LOOKUP_TTL_SECONDS
+    """
+    if not FIOCTL_LOOKUP_CACHE_FILE.exists():
+        return {}
+
+    try:
+        with open(FIOCTL_LOOKUP_CACHE_FILE) as f:
+            lookups = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.debug(f"Ignoring unreadable fioctl lookup cache: {e}")
+        return {}
+
+    current_time = time.time()
+    fresh = {}
+    for device_name in device_names:
+        entry = lookups.get(device_name)
+        if entry and current_time - entry.get("fetched_at", 0) < FIOCTL_LOOKUP_TTL_SECONDS:
+            fresh[device_name] = entry.get("vpn_ip")
+    return fresh
+
+
+def save_fioctl_lookups(results: Dict[str, Optional[str]]):
+    """
+    Record fioctl VPN address lookups.
+
+    Args:
+        results: Dictionary mapping device_name -> VPN IP (or None if the device has none)
+    """
+    if not results:
+        return
+
+    with _locked_update(FIOCTL_LOOKUP_CACHE_FILE):
+        lookups: Dict[str, Any] = {}
+        if FIOCTL_LOOKUP_CACHE_FILE.exists():
+            try:
+                with open(FIOCTL_LOOKUP_CACHE_FILE) as f:
+                    lookups = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                lookups = {}
+
+        fetched_at = time.time()
+        for device_name, vpn_ip in results.items():
+            lookups[device_name] = {"vpn_ip": vpn_ip, "fetched_at": fetched_at}
+
+        _write_json_atomic(FIOCTL_LOOKUP_CACHE_FILE, lookups)
+
+
+def get_cached_pubkey(config_path: Path, mtime_ns: int) -> Optional[str]:
+    """
+    Get the public key previously derived from a client config file.
+
+    Args:
+        config_path: Client WireGuard config file the key was derived from
+        mtime_ns: Current modification time of the config file (st_mtime_ns)
+
+    Returns:
+        Cached public key, or None if the config file changed since it was derived
+    """
+    try:
+        with open(CLIENT_PUBKEY_CACHE_FILE) as f:
+            entry = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if entry.get("config_path") == str(config_path) and entry.get("mtime_ns") == mtime_ns:
+        return entry.get("public_key")
+    return None
+
+
+def cache_pubkey(config_path: Path, mtime_ns: int, public_key: str):
+    """
+    Record the public key derived from a client config file.
+
+    Args:
+        config_path: Client WireGuard config file the key was derived from
+        mtime_ns: Modification time of the config file when the key was derived
+        public_key: Derived WireGuard public key
+    """
+    _write_json_atomic(
+        CLIENT_PUBKEY_CACHE_FILE,
+        {"config_path": str(config_path), "mtime_ns": mtime_ns, "public_key": public_key},
+    )
+
+
+def get_vpn_endpoint(config_path: Path, mtime_ns: int) -> Optional[str]:
+    """
+    Get the server host previously parsed from a client config file.
+
+    Args:
+        config_path: Client WireGuard config file the host was parsed from
+        mtime_ns: Current modification time of the config file (st_mtime_ns)
+
+    Returns:
+        Cached server host, or None if the config file changed since it was parsed
+    """
+    try:
+        with open(CLIENT_ENDPOINT_CACHE_FILE) as f:
+            entry = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if entry.get("config_path") == str(config_path) and entry.get("mtime_ns") == mtime_ns:
+        return entry.get("host")
+    return None
+
+
+def cache_vpn_endpoint(config_path: Path, mtime_ns: int, host: str):
+    """
+    Record the server host parsed from a client config file.
+
+    Args:
+        config_path: Client WireGuard config file the host was parsed from
+        mtime_ns: Modification time of the config file when the host was parsed
+        host: Server host from the config's Endpoint line
+    """
+    _write_json_atomic(
+        CLIENT_ENDPOINT_CACHE_FILE,
+        {"config_path": str(config_path), "mtime_ns": mtime_ns, "host": host},
+    )
+
+
+def _load_peer_registrations() -> Dict[str, Any]:
+    """Load the peer registration cache, ignoring a missing or unreadable file"""
+    try:
+        with open(PEER_REGISTRATION_CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _peer_registration_key(server_host: str, server_port: int, public_key: str) -> str:
+    """Cache key for a peer on one WireGuard server (JSON object keys are strings)"""
+    return f"{server_host}:{server_port}:{public_key}"
+
+
+def get_cached_peer_registration(
+    server_host: str, server_port: int, public_key: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Get a recently confirmed client peer registration.
+
+    Args:
+        server_host: WireGuard server the registration was checked on
+        server_port: SSH port of the WireGuard server
+        public_key: Client WireGuard public key
+
+    Returns:
+        Registration check result recorded by cache_peer_registration(), or None
+        if the peer was not confirmed on this server within its TTL
+    """
+    entry = _load_peer_registrations().get(
+        _peer_registration_key(server_host, server_port, public_key)
+    )
+    if entry and time.time() < entry.get("expires_at", 0):
+        return entry.get("registration")
+    return None
+
+
+def cache_peer_registration(
+    server_host: str,
+    server_port: int,
+    public_key: str,
+    registration: Dict[str, Any],
+    ttl: int = PEER_REGISTRATION_TTL_SECONDS,
+):
+    """
+    Record a confirmed client peer registration.
+
+    Args:
+        server_host: WireGuard server the registration was checked on
+        server_port: SSH port of the WireGuard server
+        public_key: Client WireGuard public key
+        registration: Registration check result to serve for repeated checks
+        ttl: Seconds before the registration is checked on the server again
+    """
+    key = _peer_registration_key(server_host, server_port, public_key)
+    with _locked_update(PEER_REGISTRATION_CACHE_FILE):
+        registrations = _load_peer_registrations()
+        registrations[key] = {"registration": registration, "expires_at": time.time() + ttl}
+        _write_json_atomic(PEER_REGISTRATION_CACHE_FILE, registrations)
+
+
+def remove_peer_registration(server_host: str, server_port: int, public_key: str):
+    """
+    Forget a cached client peer registration, e.g. after the peer was changed.
+
+    Args:
+        server_host: WireGuard server the peer is registered on
+        server_port: SSH port of the WireGuard server
+        public_key: Client WireGuard public key
+    """
+    key = _peer_registration_key(server_host, server_port, public_key)
+    with _locked_update(PEER_REGISTRATION_CACHE_FILE):
+        registrations = _load_peer_registrations()
+        if registrations.pop(key, None) is not None:
+            _write_json_atomic(PEER_REGISTRATION_CACHE_FILE, registrations)
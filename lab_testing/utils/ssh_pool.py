@@ -8,7 +8,7 @@ License: GPL-3.0-or-later
 import subprocess
 import time
 from threading import Lock
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from lab_testing.utils.credentials import check_ssh_key_installed
 from lab_testing.utils.logger import get_logger
@@ -25,6 +25,35 @@ CONNECTION_TIMEOUT = 300  # 5 minutes
 # Maximum pool size - increased for parallel operations
 MAX_POOL_SIZE = 50
 
+# ControlPath for OpenSSH-managed multiplexing (%r/%h/%p expanded by ssh: one master
+# per user/host/port)
+MULTIPLEX_CONTROL_PATH = "/tmp/ssh_mcp_mux_%r@%h:%p"
+
+# How long an idle OpenSSH-managed master connection stays open (seconds)
+MULTIPLEX_CONTROL_PERSIST = 60
+
+
+def get_ssh_multiplex_options() -> List[str]:
+    """
+    Get ssh options that share one authenticated connection per user/host/port.
+
+    The first ssh call becomes the master (ControlMaster=auto) and stays in the
+    background for MULTIPLEX_CONTROL_PERSIST seconds, so repeated one-shot commands
+    to the same host (e.g. the WireGuard server) skip the TCP and auth handshakes.
+    Works with sshpass: only the master connection needs the password.
+
+    Returns:
+        List of ssh arguments to insert before the destination
+    """
+    return [
+        "-o",
+        "ControlMaster=auto",
+        "-o",
+        f"ControlPath={MULTIPLEX_CONTROL_PATH}",
+        "-o",
+        f"ControlPersist={MULTIPLEX_CONTROL_PERSIST}",
+    ]
+
 
 def _cleanup_stale_connections():
     """Remove stale connections from pool"""
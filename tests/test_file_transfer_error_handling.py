@@ -360,3 +360,82 @@ class TestMultiplexedConnectionReuse:
             assert len(scp_calls) >= 1
         finally:
             Path(tmpfile_path).unlink()
+
+    @patch("lab_testing.tools.file_transfer.shutil.which")
+    @patch("lab_testing.tools.file_transfer.resolve_device_identifier")
+    @patch("lab_testing.tools.file_transfer.load_device_config")
+    @patch("lab_testing.tools.file_transfer.get_persistent_ssh_connection")
+    @patch("lab_testing.tools.file_transfer.subprocess.run")
+    def test_parallel_transfer_uses_single_rsync_for_directory_tree(
+        self, mock_subprocess, mock_get_connection, mock_config, mock_resolve, mock_which
+    ):
+        """Test that many files mirroring one directory tree use a single rsync call"""
+        mock_which.return_value = "/usr/bin/rsync"
+        mock_resolve.return_value = "test_device"
+        mock_config.return_value = {
+            "devices": {"test_device": {"ip": "192.168.1.1", "ssh_user": "root"}}
+        }
+        mock_connection = Mock()
+        mock_connection.poll.return_value = None
+        mock_get_connection.return_value = mock_connection
+        mock_subprocess.return_value = Mock(returncode=0, stdout=b"", stderr=b"")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / "lib").mkdir()
+            names = [f"file{i}.txt" for i in range(5)] + [f"lib/mod{i}.so" for i in range(5)]
+            for name in names:
+                (Path(tmpdir) / name).write_text("x")
+            file_pairs = [[str(Path(tmpdir) / name), f"/opt/app/{name}"] for name in names]
+
+            result = copy_files_to_device_parallel("test_device", file_pairs)
+
+        assert result["success"] is True
+        assert result["transfer_method"] == "rsync"
+        assert result["successful"] == len(names)
+        assert mock_subprocess.call_count == 1
+        args, kwargs = mock_subprocess.call_args
+        assert args[0][0] == "rsync"
+        assert "--files-from=-" in args[0]
+        assert args[0][-1].endswith("@192.168.1.1:/opt/app/")
+        assert kwargs["input"].split(b"\0") == [name.encode() for name in names]
+
+    @pytest.mark.parametrize("preserve_permissions,flags", [(True, "-rlptz"), (False, "-z")])
+    @patch("lab_testing.tools.file_transfer.shutil.which")
+    @patch("lab_testing.tools.file_transfer.resolve_device_identifier")
+    @patch("lab_testing.tools.file_transfer.load_device_config")
+    @patch("lab_testing.tools.file_transfer.get_persistent_ssh_connection")
+    @patch("lab_testing.tools.file_transfer.subprocess.run")
+    def test_rsync_keeps_scp_ownership(
+        self,
+        mock_subprocess,
+        mock_get_connection,
+        mock_config,
+        mock_resolve,
+        mock_which,
+        preserve_permissions,
+        flags,
+    ):
+        """Test rsync keeps modes and times like scp -p but never the local owner"""
+        mock_which.return_value = "/usr/bin/rsync"
+        mock_resolve.return_value = "test_device"
+        mock_config.return_value = {
+            "devices": {"test_device": {"ip": "192.168.1.1", "ssh_user": "root"}}
+        }
+        mock_connection = Mock()
+        mock_connection.poll.return_value = None
+        mock_get_connection.return_value = mock_connection
+        mock_subprocess.return_value = Mock(returncode=0, stdout=b"", stderr=b"")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            names = [f"file{i}.txt" for i in range(10)]
+            for name in names:
+                (Path(tmpdir) / name).write_text("x")
+            file_pairs = [[str(Path(tmpdir) / name), f"/opt/app/{name}"] for name in names]
+
+            copy_files_to_device_parallel(
+                "test_device", file_pairs, preserve_permissions=preserve_permissions
+            )
+
+        rsync_cmd = mock_subprocess.call_args.args[0]
+        assert rsync_cmd[1] == flags
+        assert not any(arg == "-a" or arg.startswith("-a") for arg in rsync_cmd)
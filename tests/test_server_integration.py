@@ -344,3 +344,29 @@ class TestToolHandlers:
             error_data = json.loads(result[0].text)
             assert "error" in error_data
             assert "Test error" in error_data["error"]
+
+
+class TestCallToolDispatch:
+    """Tests for the MCP call_tool entry point"""
+
+    def test_tool_calls_run_concurrently(self):
+        """Test a blocking tool does not hold up other tool calls"""
+        import asyncio
+        import threading
+
+        from lab_testing.server import mcp_server
+
+        barrier = threading.Barrier(2, timeout=5)
+
+        def blocking_tool(name, arguments, request_id, start_time):
+            barrier.wait()
+            return [name]
+
+        async def call_both():
+            return await asyncio.gather(
+                mcp_server.handle_call_tool("first", {}),
+                mcp_server.handle_call_tool("second", {}),
+            )
+
+        with patch("lab_testing.server.tool_handlers.handle_tool", side_effect=blocking_tool):
+            assert asyncio.run(call_both()) == [["first"], ["second"]]
@@ -0,0 +1,759 @@
+"""
+Tests for Foundries VPN IP cache management
+
+Copyright (C) 2025 Dynamic Devices Ltd
+License: GPL-3.0-or-later
+"""
+
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from lab_testing.tools import foundries_vpn_client
+from lab_testing.tools.foundries_vpn import (
+    _parse_hosts_vpn_ips,
+    manage_foundries_vpn_ip_cache,
+)
+from lab_testing.tools.foundries_vpn_client import (
+    check_foundries_vpn_client_config,
+    generate_foundries_vpn_client_config_template,
+    setup_foundries_vpn,
+)
+from lab_testing.tools.foundries_vpn_helpers import (
+    _check_fioctl_configured,
+    _check_fioctl_installed,
+    _get_fioctl_path,
+    _resolve_fioctl,
+)
+from lab_testing.tools.foundries_vpn_server import (
+    disable_foundries_vpn_devices,
+    enable_foundries_device_to_device,
+    enable_foundries_vpn_devices,
+    get_foundries_vpn_server_config,
+    invalidate_vpn_server_config,
+)
+from lab_testing.utils import foundries_vpn_cache
+
+FAKE_FIOCTL = """#!/bin/sh
+echo "$@" >> "$0.calls"
+case "$1 $2" in
+  "devices list")
+    echo "NAME                               FACTORY  OWNER  TARGET"
+    echo "----                               -------  -----  ------"
+    echo "imx8mm-jaguar-inst-aaaa            lab      -      lmp-1"
+    echo "imx8mm-jaguar-inst-bbbb            lab      -      lmp-1"
+    echo "other-board-cccc                   lab      -      lmp-1"
+    ;;
+  "devices show")
+    if [ -e "$0.slow" ] && [ "$3" = "imx8mm-jaguar-inst-bbbb" ]; then
+      exec sleep 5
+    fi
+    echo "Active Config:"
+    echo "  wireguard-client"
+    if [ "$3" = "imx8mm-jaguar-inst-aaaa" ]; then
+      echo "  | address=10.42.42.3"
+    else
+      echo "  | address=(none)"
+    fi
+    echo "  | enabled=1"
+    ;;
+  *)
+    exit 0
+    ;;
+esac
+"""
+
+VALID_CLIENT_CONFIG = """[Interface]
+PrivateKey = yAnz5TF+lXXJte14tji3zlMNq+hd2rYUIgJBgB3fBmk=
+Address = 10.42.42.10/24
+
+[Peer]
+PublicKey = xTIBA5rboUvnH4htodjb6e697QjLERt1NAB4mZqp8Dg=
+Endpoint = 144.76.167.54:5555
+"""
+
+
+@pytest.fixture
+def vpn_ip_cache_file(tmp_path: Path):
+    """Redirect the VPN IP cache to a temporary directory"""
+    cache_file = tmp_path / "foundries_vpn_ips.json"
+    with patch.object(foundries_vpn_cache, "CACHE_DIR", tmp_path), patch.object(
+        foundries_vpn_cache, "VPN_IP_CACHE_FILE", cache_file
+    ), patch.object(
+        foundries_vpn_cache, "FIOCTL_LOOKUP_CACHE_FILE", tmp_path / "fioctl_lookups.json"
+    ):
+        yield cache_file
+
+
+@pytest.fixture
+def fake_fioctl(tmp_path: Path):
+    """Install a fake fioctl executable that serves canned device output"""
+    fioctl = tmp_path / "fioctl"
+    fioctl.write_text(FAKE_FIOCTL)
+    fioctl.chmod(0o755)
+    _check_fioctl_configured.cache_clear()
+    with patch(
+        "lab_testing.tools.foundries_vpn_helpers._get_fioctl_path", return_value=str(fioctl)
+    ), patch("lab_testing.tools.foundries_vpn._get_fioctl_path", return_value=str(fioctl)):
+        yield fioctl
+    _check_fioctl_configured.cache_clear()
+
+
+class TestManageFoundriesVpnIpCache:
+    """Tests for manage_foundries_vpn_ip_cache"""
+
+    def test_set_then_get(self, vpn_ip_cache_file):
+        """Test manually cached IPs can be read back"""
+        result = manage_foundries_vpn_ip_cache(
+            action="set", device_name="imx8mm-jaguar-inst-aaaa", vpn_ip="10.42.42.3"
+        )
+        assert result["success"] is True
+
+        result = manage_foundries_vpn_ip_cache(action="get", device_name="imx8mm-jaguar-inst-aaaa")
+        assert result["success"] is True
+        assert result["vpn_ip"] == "10.42.42.3"
+
+    def test_unknown_action(self, vpn_ip_cache_file):
+        """Test unknown actions report the valid actions"""
+        result = manage_foundries_vpn_ip_cache(action="bogus")
+
+        assert result["success"] is False
+        assert result["valid_actions"] == ["get", "list", "set", "remove", "refresh"]
+        assert result["suggestions"]
+
+    def test_unknown_action_does_no_work(self, vpn_ip_cache_file):
+        """Test unknown actions are rejected before any handler runs"""
+        with patch("lab_testing.tools.foundries_vpn.get_all_cached_ips") as mock_list:
+            manage_foundries_vpn_ip_cache(action="lsit")
+
+        mock_list.assert_not_called()
+
+    def test_refresh_from_fioctl(self, vpn_ip_cache_file, fake_fioctl):
+        """Test refresh queries matching devices and caches their VPN addresses"""
+        result = manage_foundries_vpn_ip_cache(action="refresh")
+
+        assert result["success"] is True
+        assert result["devices_checked"] == 2
+        assert result["devices"] == {"imx8mm-jaguar-inst-aaaa": "10.42.42.3"}
+        assert foundries_vpn_cache.get_vpn_ip("imx8mm-jaguar-inst-aaaa") == "10.42.42.3"
+        assert foundries_vpn_cache.get_vpn_ip("imx8mm-jaguar-inst-bbbb") is None
+
+    async def test_refresh_from_fioctl_inside_event_loop(self, vpn_ip_cache_file, fake_fioctl):
+        """Test refresh works when called synchronously from the MCP server's event loop"""
+        result = manage_foundries_vpn_ip_cache(action="refresh")
+
+        assert result["success"] is True
+        assert result["cached_count"] == 1
+
+    def test_refresh_reuses_recent_fioctl_lookups(self, vpn_ip_cache_file, fake_fioctl):
+        """Test a second refresh doesn't re-query devices looked up recently"""
+        manage_foundries_vpn_ip_cache(action="refresh")
+        result = manage_foundries_vpn_ip_cache(action="refresh")
+
+        assert result["success"] is True
+        assert result["devices_checked"] == 2
+        assert result["devices_queried"] == 0
+        # aaaa was cached by the first refresh, bbbb (no VPN IP) was looked up by it
+        assert result["skipped_count"] == 2
+        calls = Path(f"{fake_fioctl}.calls").read_text().splitlines()
+        assert sum(call.startswith("devices show") for call in calls) == 2
+
+    def test_parse_hosts_vpn_ips(self):
+        """Test /etc/hosts parsing keeps only active Foundries VPN entries"""
+        hosts = (
+            "127.0.0.1\tlocalhost\n"
+            "10.42.42.3    imx8mm-jaguar-inst-aaaa  # lab bench\n"
+            "#10.42.42.4   imx8mm-jaguar-inst-bbbb\n"
+            "\n"
+            "10.42.42.5    proxmox\n"
+            "  10.42.42.6\timx8mm-jaguar-inst-cccc\n"
+        )
+
+        assert _parse_hosts_vpn_ips(hosts) == {
+            "imx8mm-jaguar-inst-aaaa": "10.42.42.3",
+            "imx8mm-jaguar-inst-cccc": "10.42.42.6",
+        }
+
+
+class TestFioctlProbeCache:
+    """Tests for fioctl probe memoization"""
+
+    def test_successful_probe_is_reused(self, fake_fioctl):
+        """Test a successful probe doesn't spawn fioctl again"""
+        assert _check_fioctl_configured() == (True, None)
+        assert _check_fioctl_configured() == (True, None)
+
+        calls = Path(f"{fake_fioctl}.calls").read_text().splitlines()
+        assert calls.count("factories list") == 1
+
+    def test_installed_check_does_not_run_fioctl(self, fake_fioctl):
+        """Test only the configuration check spawns fioctl"""
+        assert _check_fioctl_installed() == (True, None)
+        assert not Path(f"{fake_fioctl}.calls").exists()
+        assert _check_fioctl_configured() == (True, None)
+
+        calls = Path(f"{fake_fioctl}.calls").read_text().splitlines()
+        assert calls == ["factories list"]
+
+    def test_refresh_forces_reprobe(self, fake_fioctl):
+        """Test refresh=True bypasses a cached successful probe"""
+        assert _check_fioctl_configured() == (True, None)
+        assert _check_fioctl_configured(refresh=True) == (True, None)
+
+        calls = Path(f"{fake_fioctl}.calls").read_text().splitlines()
+        assert calls.count("factories list") == 2
+
+    def test_fioctl_path_is_resolved_once(self):
+        """Test a resolved fioctl path is reused without rescanning PATH"""
+        _get_fioctl_path.cache_clear()
+        try:
+            with patch(
+                "lab_testing.tools.foundries_vpn_helpers.shutil.which",
+                return_value="/opt/bin/fioctl",
+            ) as mock_which:
+                assert _get_fioctl_path() == "/opt/bin/fioctl"
+                assert _get_fioctl_path() == "/opt/bin/fioctl"
+
+            mock_which.assert_called_once_with("fioctl")
+        finally:
+            _get_fioctl_path.cache_clear()
+
+    def test_failed_probe_is_not_cached(self):
+        """Test a failed probe is retried on the next call"""
+        _check_fioctl_configured.cache_clear()
+        with patch(
+            "lab_testing.tools.foundries_vpn_helpers._get_fioctl_path", return_value=None
+        ) as mock_path:
+            assert _check_fioctl_installed()[0] is False
+            assert _check_fioctl_installed()[0] is False
+
+        assert mock_path.call_count == 2
+
+    def test_resolve_returns_path_once_configured(self, fake_fioctl):
+        """Test one resolve call covers the installed and configured probes"""
+        assert _resolve_fioctl() == (str(fake_fioctl), None)
+
+        with patch("lab_testing.tools.foundries_vpn_helpers._get_fioctl_path", return_value=None):
+            path, error = _resolve_fioctl()
+        assert path is None
+        assert "fioctl not found" in error
+
+    def test_failed_fioctl_command_drops_cached_probes(self, fake_fioctl):
+        """Test a failing fioctl command makes the next call re-check the login"""
+        assert _check_fioctl_configured() == (True, None)
+
+        with patch(
+            "lab_testing.tools.foundries_vpn_server.subprocess.run",
+            return_value=Mock(returncode=1, stdout="", stderr="401 Unauthorized"),
+        ):
+            assert get_foundries_vpn_server_config()["success"] is False
+
+        assert _check_fioctl_configured() == (True, None)
+        calls = Path(f"{fake_fioctl}.calls").read_text().splitlines()
+        assert calls.count("factories list") == 2
+
+    def test_refresh_skips_recently_cached_devices(self, vpn_ip_cache_file, fake_fioctl):
+        """Test refresh skips devices cached recently unless forced"""
+        foundries_vpn_cache.cache_vpn_ip("imx8mm-jaguar-inst-aaaa", "10.42.42.3", source="manual")
+
+        result = manage_foundries_vpn_ip_cache(action="refresh")
+        assert result["devices_checked"] == 2
+        assert result["skipped_count"] == 1
+        assert result["devices_queried"] == 1
+
+        result = manage_foundries_vpn_ip_cache(action="refresh", force=True)
+        assert result["skipped_count"] == 0
+        assert result["devices_queried"] == 2
+
+    def test_refresh_returns_partial_results_at_deadline(self, vpn_ip_cache_file, fake_fioctl):
+        """Test lookups still running at the refresh deadline are cancelled"""
+        Path(f"{fake_fioctl}.slow").touch()
+
+        with patch("lab_testing.tools.foundries_vpn.FIOCTL_REFRESH_DEADLINE", 1):
+            result = manage_foundries_vpn_ip_cache(action="refresh")
+
+        assert result["success"] is True
+        assert result["partial"] is True
+        assert result["timed_out"] == ["imx8mm-jaguar-inst-bbbb"]
+        assert result["devices"] == {"imx8mm-jaguar-inst-aaaa": "10.42.42.3"}
+
+
+class TestVpnIpCacheFile:
+    """Tests for the VPN IP cache file"""
+
+    def test_unchanged_cache_file_is_not_reparsed(self, vpn_ip_cache_file):
+        """Test repeated lookups reuse the parsed cache until the file changes"""
+        foundries_vpn_cache.cache_vpn_ip("imx8mm-jaguar-inst-aaaa", "10.42.42.3")
+
+        with patch.object(
+            foundries_vpn_cache.json, "loads", wraps=foundries_vpn_cache.json.loads
+        ) as mock_loads:
+            assert foundries_vpn_cache.get_vpn_ip("imx8mm-jaguar-inst-aaaa") == "10.42.42.3"
+            assert foundries_vpn_cache.get_vpn_ip("imx8mm-jaguar-inst-aaaa") == "10.42.42.3"
+            assert mock_loads.call_count == 1
+
+            foundries_vpn_cache.cache_vpn_ip("imx8mm-jaguar-inst-aaaa", "10.42.42.4")
+            assert foundries_vpn_cache.get_vpn_ip("imx8mm-jaguar-inst-aaaa") == "10.42.42.4"
+
+    def test_concurrent_updates_are_not_lost(self, vpn_ip_cache_file):
+        """Test concurrent single-device updates all end up in the cache"""
+        device_names = [f"imx8mm-jaguar-inst-{i:04d}" for i in range(20)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(
+                executor.map(
+                    lambda name: foundries_vpn_cache.cache_vpn_ip(name, "10.42.42.9"), device_names
+                )
+            )
+
+        assert set(foundries_vpn_cache.get_all_cached_ips()) == set(device_names)
+
+
+class TestCheckFoundriesVpnClientConfig:
+    """Tests for check_foundries_vpn_client_config"""
+
+    def test_valid_config(self, tmp_path):
+        """Test a complete config passes validation"""
+        config = tmp_path / "foundries.conf"
+        config.write_text(VALID_CLIENT_CONFIG)
+
+        result = check_foundries_vpn_client_config(str(config))
+
+        assert result["success"] is True
+        assert result["valid"] is True
+
+    def test_missing_keys_are_reported(self, tmp_path):
+        """Test missing sections and keys are all reported"""
+        config = tmp_path / "foundries.conf"
+        config.write_text("[Interface]\nAddress = 10.42.42.10/24\n")
+
+        result = check_foundries_vpn_client_config(str(config))
+
+        assert result["success"] is False
+        assert result["errors"] == [
+            "Missing [Peer] section",
+            "Missing PrivateKey in [Interface] section",
+            "Missing Endpoint in [Peer] section",
+            "Missing PublicKey in [Peer] section",
+        ]
+
+    def test_short_private_key_is_rejected(self, tmp_path):
+        """Test an obviously truncated PrivateKey is rejected"""
+        config = tmp_path / "foundries.conf"
+        config.write_text(VALID_CLIENT_CONFIG.replace("yAnz5TF+lXXJte14tji3zlMNq+hd2rYU", ""))
+
+        result = check_foundries_vpn_client_config(str(config))
+
+        assert result["success"] is False
+        assert "too short" in result["error"]
+
+    def test_private_key_padding_is_kept(self, tmp_path):
+        """Test the PrivateKey's trailing "=" padding counts towards its length"""
+        config = tmp_path / "foundries.conf"
+        config.write_text(
+            VALID_CLIENT_CONFIG.replace(
+                "yAnz5TF+lXXJte14tji3zlMNq+hd2rYUIgJBgB3fBmk=", "A" * 39 + "="
+            )
+        )
+
+        result = check_foundries_vpn_client_config(str(config))
+
+        assert result["success"] is True
+
+    def test_comments_and_crlf_line_endings(self, tmp_path):
+        """Test commented-out keys don't count and CRLF configs are accepted"""
+        config = tmp_path / "foundries.conf"
+        config.write_bytes(
+            VALID_CLIENT_CONFIG.replace("Endpoint =", "# Endpoint =").replace("\n", "\r\n").encode()
+        )
+
+        result = check_foundries_vpn_client_config(str(config))
+
+        assert result["errors"] == ["Missing Endpoint in [Peer] section"]
+
+    def test_unchanged_config_is_not_reparsed(self, tmp_path):
+        """Test validation is reused until the config file changes"""
+        config = tmp_path / "foundries.conf"
+        config.write_text(VALID_CLIENT_CONFIG)
+
+        with patch.object(
+            foundries_vpn_client,
+            "_validate_client_config_content",
+            wraps=foundries_vpn_client._validate_client_config_content,
+        ) as mock_validate:
+            assert check_foundries_vpn_client_config(str(config))["success"] is True
+            assert check_foundries_vpn_client_config(str(config))["success"] is True
+            assert mock_validate.call_count == 1
+
+            config.write_text("[Interface]\n")
+            assert check_foundries_vpn_client_config(str(config))["success"] is False
+            assert mock_validate.call_count == 2
+
+
+class TestSetupFoundriesVpn:
+    """Tests for setup_foundries_vpn"""
+
+    @patch("lab_testing.tools.foundries_vpn_client.connect_foundries_vpn")
+    @patch("lab_testing.tools.foundries_vpn_client.get_foundries_vpn_server_config")
+    @patch("lab_testing.tools.foundries_vpn_client._get_wg_path")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_configured")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_installed")
+    def test_setup_success(
+        self, mock_installed, mock_configured, mock_wg_path, mock_server, mock_connect, tmp_path
+    ):
+        """Test a full setup reports every step in order"""
+        config = tmp_path / "foundries.conf"
+        config.write_text(VALID_CLIENT_CONFIG)
+        mock_installed.return_value = (True, None)
+        mock_configured.return_value = (True, None)
+        mock_wg_path.return_value = "/usr/bin/wg"
+        mock_server.return_value = {"success": True, "enabled": True}
+        mock_connect.return_value = {"success": True, "method": "wg-quick"}
+
+        result = setup_foundries_vpn(config_path=str(config))
+
+        assert result["success"] is True
+        assert result["steps_completed"] == [
+            "fioctl installed",
+            "fioctl configured",
+            "WireGuard tools installed",
+            "Server configuration retrieved",
+            "VPN server enabled",
+            "Client config found and valid",
+            "VPN connected",
+        ]
+
+    @patch("lab_testing.tools.foundries_vpn_client.get_foundries_vpn_config")
+    @patch("lab_testing.tools.foundries_vpn_client.connect_foundries_vpn")
+    @patch("lab_testing.tools.foundries_vpn_client.get_foundries_vpn_server_config")
+    @patch("lab_testing.tools.foundries_vpn_client._get_wg_path")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_configured")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_installed")
+    def test_setup_connects_with_validated_config_path(
+        self,
+        mock_installed,
+        mock_configured,
+        mock_wg_path,
+        mock_server,
+        mock_connect,
+        mock_get_config,
+        tmp_path,
+    ):
+        """Test the config located during validation is the one connected with"""
+        config = tmp_path / "foundries.conf"
+        config.write_text(VALID_CLIENT_CONFIG)
+        mock_installed.return_value = (True, None)
+        mock_configured.return_value = (True, None)
+        mock_wg_path.return_value = "/usr/bin/wg"
+        mock_server.return_value = {"success": True, "enabled": True}
+        mock_connect.return_value = {"success": True, "method": "wg-quick"}
+        mock_get_config.return_value = config
+
+        result = setup_foundries_vpn()
+
+        assert result["success"] is True
+        mock_get_config.assert_called_once()
+        mock_connect.assert_called_once_with(str(config))
+
+    @patch("lab_testing.tools.foundries_vpn_client.get_foundries_vpn_server_config")
+    @patch("lab_testing.tools.foundries_vpn_client._get_wg_path")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_configured")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_installed")
+    def test_setup_reports_first_failed_prerequisite(
+        self, mock_installed, mock_configured, mock_wg_path, mock_server
+    ):
+        """Test prerequisite failures are reported in step order"""
+        mock_installed.return_value = (True, None)
+        mock_configured.return_value = (False, "fioctl not configured")
+        mock_wg_path.return_value = None
+        mock_server.return_value = {"success": False}
+
+        result = setup_foundries_vpn()
+
+        assert result["success"] is False
+        assert result["error"] == "fioctl not configured"
+        assert result["steps_completed"] == ["fioctl installed"]
+        assert result["steps_failed"] == ["Check fioctl configuration"]
+        mock_server.assert_not_called()
+
+    @patch("lab_testing.tools.foundries_vpn_client.get_foundries_vpn_server_config")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_configured")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_installed")
+    def test_setup_without_fioctl_runs_nothing(self, mock_installed, mock_configured, mock_server):
+        """Test a missing fioctl stops setup before fioctl or the server config is used"""
+        mock_installed.return_value = (False, "fioctl not found")
+
+        result = setup_foundries_vpn()
+
+        assert result["steps_failed"] == ["Check fioctl installation"]
+        mock_configured.assert_not_called()
+        mock_server.assert_not_called()
+
+
+class TestGenerateFoundriesVpnClientConfigTemplate:
+    """Tests for generate_foundries_vpn_client_config_template"""
+
+    @patch("lab_testing.tools.foundries_vpn_client.get_foundries_vpn_server_config")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_configured")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_installed")
+    def test_template_is_filled_from_server_config(
+        self, mock_installed, mock_configured, mock_server, tmp_path
+    ):
+        """Test the template contains the server's key, endpoint and subnet"""
+        mock_installed.return_value = (True, None)
+        mock_configured.return_value = (True, None)
+        mock_server.return_value = {
+            "success": True,
+            "enabled": True,
+            "address": "10.42.42.1",
+            "public_key": "xTIBA5rboUvnH4htodjb6e697QjLERt1NAB4mZqp8Dg=",
+            "endpoint": "144.76.167.54:5555",
+        }
+        config = tmp_path / "foundries.conf"
+
+        result = generate_foundries_vpn_client_config_template(output_path=str(config))
+
+        assert result["success"] is True
+        content = config.read_text()
+        assert "PublicKey = xTIBA5rboUvnH4htodjb6e697QjLERt1NAB4mZqp8Dg=\n" in content
+        assert "Endpoint = 144.76.167.54:5555\n" in content
+        assert "AllowedIPs = 10.42.42.0/24, 192.168.2.0/24\n" in content
+        assert config.stat().st_mode & 0o777 == 0o600
+
+    @patch("lab_testing.tools.foundries_vpn_client.get_foundries_vpn_server_config")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_configured")
+    @patch("lab_testing.tools.foundries_vpn_client._check_fioctl_installed")
+    def test_existing_config_is_not_overwritten(
+        self, mock_installed, mock_configured, mock_server, tmp_path
+    ):
+        """Test an existing config file is left untouched"""
+        mock_installed.return_value = (True, None)
+        mock_configured.return_value = (True, None)
+        mock_server.return_value = {"success": True, "enabled": True}
+        config = tmp_path / "foundries.conf"
+        config.write_text(VALID_CLIENT_CONFIG)
+
+        result = generate_foundries_vpn_client_config_template(output_path=str(config))
+
+        assert result["success"] is False
+        assert "already exists" in result["error"]
+        assert config.read_text() == VALID_CLIENT_CONFIG
+
+
+class TestFoundriesVpnDeviceBatches:
+    """Tests for enable_foundries_vpn_devices and disable_foundries_vpn_devices"""
+
+    def test_devices_are_enabled_concurrently(self):
+        """Test every device call is in flight at the same time"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def enable(device_name, factory):
+            barrier.wait()
+            return {"success": device_name != "bad", "device_name": device_name}
+
+        with patch(
+            "lab_testing.tools.foundries_vpn_server.enable_foundries_vpn_device",
+            side_effect=enable,
+        ):
+            result = enable_foundries_vpn_devices(["a", "bad", "b"], factory="lab")
+
+        assert result["success"] is False
+        assert result["succeeded"] == ["a", "b"]
+        assert result["failed"] == ["bad"]
+        assert result["results"]["a"] == {"success": True, "device_name": "a"}
+
+    def test_empty_device_list_is_rejected(self):
+        """Test no fioctl work is started without device names"""
+        with patch("lab_testing.tools.foundries_vpn_server.disable_foundries_vpn_device") as mock:
+            result = disable_foundries_vpn_devices([])
+
+        assert result["success"] is False
+        mock.assert_not_called()
+
+
+FIOCTL_WIREGUARD_OUTPUT = """Enabled: true
+Endpoint: 144.76.167.54:5555
+Address: 10.42.42.1
+Public Key: xTIBA5rboUvnH4htodjb6e697QjLERt1NAB4mZqp8Dg=
+"""
+
+
+class TestServerConfigCache:
+    """Tests for get_foundries_vpn_server_config result caching"""
+
+    @pytest.fixture(autouse=True)
+    def fioctl_ready(self):
+        invalidate_vpn_server_config()
+        with patch(
+            "lab_testing.tools.foundries_vpn_server._resolve_fioctl",
+            return_value=("fioctl", None),
+        ):
+            yield
+        invalidate_vpn_server_config()
+
+    @patch("lab_testing.tools.foundries_vpn_server.subprocess.run")
+    def test_config_is_fetched_once_per_factory(self, mock_run):
+        """Test repeat calls reuse the fioctl result until invalidated"""
+        mock_run.return_value = Mock(returncode=0, stdout=FIOCTL_WIREGUARD_OUTPUT, stderr="")
+
+        first = get_foundries_vpn_server_config()
+        assert get_foundries_vpn_server_config() == first
+        assert mock_run.call_count == 1
+
+        get_foundries_vpn_server_config("other")
+        assert mock_run.call_count == 2
+
+        invalidate_vpn_server_config()
+        get_foundries_vpn_server_config()
+        assert mock_run.call_count == 3
+        assert first["endpoint"] == "144.76.167.54:5555"
+        assert first["public_key"] == "xTIBA5rboUvnH4htodjb6e697QjLERt1NAB4mZqp8Dg="
+        assert first["enabled"] is True
+
+    @patch("lab_testing.tools.foundries_vpn_server.subprocess.run")
+    def test_failures_are_not_cached(self, mock_run):
+        """Test a failed lookup is retried on the next call"""
+        mock_run.return_value = Mock(returncode=1, stdout="", stderr="timeout")
+
+        assert get_foundries_vpn_server_config()["success"] is False
+        assert get_foundries_vpn_server_config()["success"] is False
+        assert mock_run.call_count == 2
+
+    @patch("lab_testing.tools.foundries_vpn_server.subprocess.run")
+    def test_device_to_device_uses_server_endpoint(self, mock_run):
+        """Test the server host is taken from the cached server config"""
+        mock_run.return_value = Mock(returncode=0, stdout=FIOCTL_WIREGUARD_OUTPUT, stderr="")
+        get_foundries_vpn_server_config()
+
+        enable_foundries_device_to_device("imx8mm-jaguar-inst-aaaa", device_ip="10.42.42.2")
+
+        assert mock_run.call_count == 2
+        assert "root@144.76.167.54" in mock_run.call_args.args[0]
+
+
+# Stand-ins for the remote sshpass and wg commands, prepended to the server script
+DEVICE_TO_DEVICE_STUBS = """
+sshpass() {
+  case "$*" in *dev-secret*) echo "password leaked into argv"; return 1 ;; esac
+  IFS= read -r pw
+  [ "$SSHPASS" = dev-secret ] && [ "$pw" = dev-secret ] && echo "Config updated"
+}
+wg() {
+  case "$1 $2" in
+    "show factory") printf 'priv\\tpub\\t51820\\toff\\nDEVKEY=\\t(none)\\t1.2.3.4:5\\t10.42.42.2/32\\t0\\t0\\t0\\toff\\n' ;;
+    "set factory") echo "set $3 $4 $5 $6" >&2 ;;
+  esac
+}
+"""
+
+
+class TestEnableFoundriesDeviceToDevice:
+    """Tests for enable_foundries_device_to_device"""
+
+    def test_all_steps_run_in_one_ssh_session(self):
+        """Test the device update and server AllowedIPs change share one ssh call"""
+        with patch("lab_testing.tools.foundries_vpn_server.subprocess.run") as mock_run:
+            mock_run.return_value = Mock(returncode=0, stdout="", stderr="")
+            enable_foundries_device_to_device(
+                "imx8mm-jaguar-inst-aaaa",
+                device_ip="10.42.42.2",
+                server_host="10.0.0.1",
+                server_password="server-secret",
+                device_password="dev-secret",
+            )
+            script = mock_run.call_args.kwargs["input"]
+        argv = mock_run.call_args.args[0]
+        assert mock_run.call_count == 1
+        assert isinstance(argv, list) and argv[0] == "ssh"
+        assert not mock_run.call_args.kwargs.get("shell")
+        assert "ControlMaster=auto" in argv
+        assert not any("server-secret" in arg for arg in argv)
+        assert mock_run.call_args.kwargs["env"]["FOUNDRIES_VPN_PW"] == "server-secret"
+
+        remote = subprocess.run(
+            ["bash", "-s"],
+            input=DEVICE_TO_DEVICE_STUBS + script,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        with patch("lab_testing.tools.foundries_vpn_server.subprocess.run") as mock_run:
+            mock_run.return_value = remote
+            result = enable_foundries_device_to_device(
+                "imx8mm-jaguar-inst-aaaa",
+                device_ip="10.42.42.2",
+                server_host="10.0.0.1",
+                device_password="dev-secret",
+            )
+
+        assert "set peer DEVKEY= allowed-ips 10.42.42.0/24" in remote.stderr
+        assert result["success"] is True
+        assert result["steps_completed"][-1] == "Set server-side AllowedIPs to 10.42.42.0/24"
+        assert result["steps_failed"] == []
+
+    @pytest.mark.parametrize(
+        "overrides",
+        [
+            {"vpn_subnet": '10.42.42.0/24|" /etc/passwd; reboot; echo "'},
+            {"device_ip": "10.42.42.2/32,*) reboot;; esac; case x in *"},
+            {"device_password": "fio\nreboot"},
+        ],
+    )
+    @patch("lab_testing.tools.foundries_vpn_server.subprocess.run")
+    def test_hostile_values_are_refused(self, mock_run, overrides):
+        """Test values that would escape the server or device shell never reach ssh"""
+        kwargs = {"device_ip": "10.42.42.2", "server_host": "10.0.0.1", **overrides}
+
+        result = enable_foundries_device_to_device("imx8mm-jaguar-inst-aaaa", **kwargs)
+
+        assert result["success"] is False
+        mock_run.assert_not_called()
+
+    @patch("lab_testing.tools.foundries_vpn_server.subprocess.run")
+    def test_unreachable_device_is_reported(self, mock_run):
+        """Test the server step is skipped when the device hop fails"""
+        mock_run.return_value = Mock(returncode=1, stdout="", stderr="No route to host")
+
+        result = enable_foundries_device_to_device(
+            "imx8mm-jaguar-inst-aaaa", device_ip="10.42.42.2", server_host="10.0.0.1"
+        )
+
+        assert result["success"] is False
+        assert "No route to host" in result["error"]
+        assert result["steps_failed"] == ["Failed to update device config"]
+
+    def test_server_host_falls_back_to_client_config(self, tmp_path):
+        """Test the Endpoint line of the client config is used without fioctl"""
+        config = tmp_path / "foundries.conf"
+        config.write_text(
+            VALID_CLIENT_CONFIG.replace("Endpoint = 144.76.167.54", "  Endpoint = vpn.example.com")
+        )
+
+        with patch(
+            "lab_testing.tools.foundries_vpn_server.get_foundries_vpn_server_config",
+            return_value={"success": False},
+        ), patch(
+            "lab_testing.tools.foundries_vpn_server.get_foundries_vpn_config", return_value=config
+        ), patch.object(
+            foundries_vpn_cache, "CLIENT_ENDPOINT_CACHE_FILE", tmp_path / "endpoint.json"
+        ), patch.object(
+            foundries_vpn_cache, "_ensure_cache_dir"
+        ), patch(
+            "lab_testing.tools.foundries_vpn_server.subprocess.run"
+        ) as mock_run:
+            mock_run.return_value = Mock(returncode=0, stdout="STEP:device_updated\n", stderr="")
+            result = enable_foundries_device_to_device(
+                "imx8mm-jaguar-inst-aaaa", device_ip="10.42.42.2"
+            )
+            assert "root@vpn.example.com" in mock_run.call_args.args[0]
+
+            # The parsed host is reused while the config file is unchanged
+            with patch("pathlib.Path.open", side_effect=AssertionError("config re-read")):
+                enable_foundries_device_to_device("imx8mm-jaguar-inst-aaaa", device_ip="10.42.42.2")
+            assert "root@vpn.example.com" in mock_run.call_args.args[0]
+
+        assert result["success"] is True
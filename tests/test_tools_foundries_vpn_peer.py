@@ -0,0 +1,541 @@
+"""
+Tests for Foundries VPN client peer registration tools
+
+Copyright (C) 2025 Dynamic Devices Ltd
+License: GPL-3.0-or-later
+"""
+
+import subprocess
+from unittest.mock import Mock, patch
+
+import pytest
+
+from lab_testing.tools.foundries_vpn_core import (
+    _invalidate_vpn_status,
+    verify_foundries_vpn_connection,
+)
+from lab_testing.tools.foundries_vpn_peer import (
+    HAS_CRYPTOGRAPHY,
+    _derive_public_key,
+    check_client_peer_registered,
+    flush_foundries_vpn_config,
+    register_foundries_vpn_client,
+    register_foundries_vpn_clients,
+)
+
+CLIENT_PUBLIC_KEY = "xTIBA5rboUvnH4htodjb6e697QjLERt1NAB4mZqp8Dg="
+
+# Runtime section of the check output: allowed-ips picked from `wg show factory dump`
+RUNTIME_PEER_IP = "IP=10.42.42.10/32\n"
+
+CONFIG_PEER_LINE = f"{CLIENT_PUBLIC_KEY} 10.42.42.10 client\n"
+
+# `wg show factory dump` with the interface line and one peer
+WG_DUMP = (
+    "cHJpdmF0ZQ==\tc2VydmVy\t5555\toff\n"
+    f"{CLIENT_PUBLIC_KEY}\t(none)\t192.0.2.10:51820\t10.42.42.10/32\t0\t0\t0\toff\n"
+)
+
+# X25519 key pair from RFC 7748 section 6.1 (Alice), base64-encoded as WireGuard keys are
+RFC7748_PRIVATE_KEY = "dwdtCnMYpX08FsFyUbJmRd9ML4frwJkqsXf7pR25LCo="
+RFC7748_PUBLIC_KEY = "hSDwCYkwp1R0i33ctD73Wg2/Og0mOBr066SpjqqbTmo="
+
+OTHER_PUBLIC_KEY = "b3RoZXJjbGllbnRwdWJsaWNrZXkwMDAwMDAwMDAwMDA="
+
+# Batched check output: runtime section, separator, config file section
+CHECK_OUTPUT = f"{RUNTIME_PEER_IP}---SEP---\n{CONFIG_PEER_LINE}".encode()
+
+
+@pytest.fixture(autouse=True)
+def peer_registration_cache(tmp_path):
+    """Keep the peer registration cache out of the user's cache directory"""
+    cache_file = tmp_path / "peer_registrations.json"
+    with patch(
+        "lab_testing.utils.foundries_vpn_cache.PEER_REGISTRATION_CACHE_FILE", cache_file
+    ), patch("lab_testing.utils.foundries_vpn_cache._ensure_cache_dir"):
+        yield cache_file
+
+
+class TestCheckClientPeerRegistered:
+    """Tests for check_client_peer_registered"""
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_registered_peer(self, mock_run):
+        """Test a peer present on the server reports its assigned IP"""
+        mock_run.return_value = Mock(returncode=0, stdout=CHECK_OUTPUT, stderr=b"")
+
+        result = check_client_peer_registered(
+            client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1"
+        )
+
+        assert result["success"] is True
+        assert result["registered"] is True
+        assert result["assigned_ip"] == "10.42.42.10"
+        assert result["runtime_registered"] is True
+        assert result["config_registered"] is True
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_probes_batched_into_one_call(self, mock_run):
+        """Test runtime and config file are checked in a single SSH invocation"""
+        mock_run.return_value = Mock(
+            returncode=0, stdout=f"---SEP---\n{CONFIG_PEER_LINE}".encode(), stderr=b""
+        )
+
+        result = check_client_peer_registered(
+            client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1"
+        )
+
+        assert mock_run.call_count == 1
+        assert result["runtime_registered"] is False
+        assert result["config_registered"] is True
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_unreachable_server(self, mock_run):
+        """Test an SSH failure is reported instead of an unregistered peer"""
+        mock_run.return_value = Mock(returncode=255, stdout=b"", stderr=b"Connection refused")
+
+        result = check_client_peer_registered(
+            client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1"
+        )
+
+        assert result["success"] is False
+        assert "Connection refused" in result["error"]
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_ssh_runs_without_local_shell(self, mock_run):
+        """Test SSH is run from an argv list with the remote script as one argument"""
+        mock_run.return_value = Mock(returncode=0, stdout=CHECK_OUTPUT, stderr=b"")
+
+        check_client_peer_registered(client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1")
+
+        argv = mock_run.call_args.args[0]
+        assert not mock_run.call_args.kwargs.get("shell")
+        assert argv[0] == "ssh"
+        assert argv[-2] == "root@10.42.42.1"
+        assert CLIENT_PUBLIC_KEY in argv[-1]
+        assert mock_run.call_args.kwargs["env"] is None
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_invalid_key_not_sent_to_server(self, mock_run):
+        """Test keys that are not 32-byte base64 values never reach the remote shell"""
+        for key in ['x"; rm -rf / #', CLIENT_PUBLIC_KEY[:-2] + "$(", "A" * 42 + "=="]:
+            result = check_client_peer_registered(client_public_key=key, server_host="10.42.42.1")
+
+            assert result["success"] is False
+            assert "Invalid WireGuard public key" in result["error"]
+        mock_run.assert_not_called()
+
+    def test_password_passed_through_askpass(self):
+        """Test the server password reaches ssh via SSH_ASKPASS, not the command line"""
+        with patch("lab_testing.tools.foundries_vpn_peer.subprocess.run") as mock_run:
+            mock_run.return_value = Mock(returncode=0, stdout=CHECK_OUTPUT, stderr=b"")
+            check_client_peer_registered(
+                client_public_key=CLIENT_PUBLIC_KEY,
+                server_host="10.42.42.1",
+                server_password="pa ss'word",
+            )
+
+        argv = mock_run.call_args.args[0]
+        env = mock_run.call_args.kwargs["env"]
+        assert argv[0] == "ssh"
+        assert not any("pa ss'word" in arg for arg in argv)
+        assert env["SSH_ASKPASS_REQUIRE"] == "force"
+        askpass = subprocess.run(
+            [env["SSH_ASKPASS"]], env=env, capture_output=True, text=True, check=True
+        )
+        assert askpass.stdout == "pa ss'word\n"
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_derived_public_key_cached(self, mock_run, tmp_path):
+        """Test the public key is derived once while the config file is unchanged"""
+        config_path = tmp_path / "foundries.conf"
+        config_path.write_text("[Interface]\nPrivateKey = cHJpdmF0ZQ==\n")
+        mock_run.return_value = Mock(returncode=0, stdout=CHECK_OUTPUT, stderr=b"")
+
+        with patch(
+            "lab_testing.tools.foundries_vpn_peer.get_foundries_vpn_config",
+            return_value=config_path,
+        ), patch(
+            "lab_testing.tools.foundries_vpn_peer._derive_public_key",
+            return_value=CLIENT_PUBLIC_KEY,
+        ) as mock_derive, patch(
+            "lab_testing.utils.foundries_vpn_cache.CLIENT_PUBKEY_CACHE_FILE",
+            tmp_path / "pubkey.json",
+        ), patch(
+            "lab_testing.utils.foundries_vpn_cache._ensure_cache_dir"
+        ):
+            first = check_client_peer_registered(server_host="10.42.42.1")
+            second = check_client_peer_registered(server_host="10.42.42.1")
+
+        assert mock_derive.call_count == 1
+        assert first["client_public_key"] == second["client_public_key"] == CLIENT_PUBLIC_KEY
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_remote_commands_share_one_connection(self, mock_run):
+        """Test every SSH command goes through the multiplexed master connection"""
+        mock_run.return_value = Mock(returncode=0, stdout=CHECK_OUTPUT, stderr=b"")
+
+        check_client_peer_registered(client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1")
+
+        assert mock_run.call_count >= 1
+        for call in mock_run.call_args_list:
+            command = call.args[0]
+            command = command if isinstance(command, str) else " ".join(command)
+            assert "ControlMaster=auto" in command
+            assert "ControlPath=" in command
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    @patch("lab_testing.tools.foundries_vpn_core.foundries_vpn_status")
+    def test_vpn_status_reused_between_calls(self, mock_status, mock_run):
+        """Test VPN status is probed once for back-to-back checks until invalidated"""
+        mock_status.return_value = {"success": True, "connected": True}
+        # Unregistered, so the peer registration cache does not short-circuit the check
+        mock_run.return_value = Mock(returncode=0, stdout=b"---SEP---\n", stderr=b"")
+        _invalidate_vpn_status()
+
+        check_client_peer_registered(client_public_key=CLIENT_PUBLIC_KEY)
+        check_client_peer_registered(client_public_key=CLIENT_PUBLIC_KEY)
+        assert mock_status.call_count == 1
+
+        _invalidate_vpn_status()
+        check_client_peer_registered(client_public_key=CLIENT_PUBLIC_KEY)
+        assert mock_status.call_count == 2
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_confirmed_registration_served_from_cache(self, mock_run):
+        """Test a registered peer is not re-checked on the server within the TTL"""
+        mock_run.return_value = Mock(returncode=0, stdout=CHECK_OUTPUT, stderr=b"")
+
+        first = check_client_peer_registered(
+            client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1"
+        )
+        second = check_client_peer_registered(
+            client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1"
+        )
+
+        assert mock_run.call_count == 1
+        assert second["cached"] is True
+        assert second["assigned_ip"] == first["assigned_ip"] == "10.42.42.10"
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_cached_registration_is_per_server(self, mock_run):
+        """Test a registration confirmed on one server is not served for another"""
+        mock_run.return_value = Mock(returncode=0, stdout=CHECK_OUTPUT, stderr=b"")
+
+        check_client_peer_registered(client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1")
+        other_host = check_client_peer_registered(
+            client_public_key=CLIENT_PUBLIC_KEY, server_host="192.0.2.1"
+        )
+        other_port = check_client_peer_registered(
+            client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1", server_port=22
+        )
+
+        assert mock_run.call_count == 3
+        assert "cached" not in other_host
+        assert "cached" not in other_port
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_unregistered_peer_not_cached(self, mock_run):
+        """Test an unregistered peer is checked on the server every time"""
+        mock_run.return_value = Mock(returncode=0, stdout=b"---SEP---\n", stderr=b"")
+
+        for _ in range(2):
+            result = check_client_peer_registered(
+                client_public_key=CLIENT_PUBLIC_KEY, server_host="10.42.42.1"
+            )
+
+        assert mock_run.call_count == 2
+        assert result["registered"] is False
+
+
+class TestDerivePublicKey:
+    """Tests for _derive_public_key"""
+
+    @pytest.mark.skipif(not HAS_CRYPTOGRAPHY, reason="cryptography not installed")
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_derived_in_process(self, mock_run):
+        """Test the public key is derived without running wg (RFC 7748 test vector)"""
+        config = f"[Interface]\nPrivateKey = {RFC7748_PRIVATE_KEY}\n".encode()
+
+        assert _derive_public_key(config) == RFC7748_PUBLIC_KEY
+        mock_run.assert_not_called()
+
+    @patch("lab_testing.tools.foundries_vpn_peer.HAS_CRYPTOGRAPHY", False)
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_falls_back_to_wg(self, mock_run):
+        """Test wg pubkey derives the key when cryptography is unavailable"""
+        mock_run.return_value = Mock(returncode=0, stdout=f"{RFC7748_PUBLIC_KEY}\n".encode())
+        config = f"[Interface]\nPrivateKey = {RFC7748_PRIVATE_KEY}\n".encode()
+
+        assert _derive_public_key(config) == RFC7748_PUBLIC_KEY
+        assert mock_run.call_args.args[0] == ["wg", "pubkey"]
+        assert mock_run.call_args.kwargs["input"] == RFC7748_PRIVATE_KEY.encode()
+
+    def test_missing_private_key(self):
+        """Test a config without a PrivateKey yields no public key"""
+        assert _derive_public_key(b"[Interface]\nAddress = 10.42.42.10/24\n") is None
+
+
+class TestNotRegisteredHint:
+    """Tests for the unregistered peer hint of verify_foundries_vpn_connection"""
+
+    @pytest.fixture
+    def client_config(self, tmp_path):
+        config_path = tmp_path / "foundries.conf"
+        config_path.write_text(f"[Interface]\nPrivateKey = {RFC7748_PRIVATE_KEY}\n")
+        with patch(
+            "lab_testing.tools.foundries_vpn_core.foundries_vpn_status",
+            return_value={"success": True, "connected": False},
+        ), patch(
+            "lab_testing.tools.foundries_vpn_core.get_foundries_vpn_config",
+            return_value=config_path,
+        ):
+            yield config_path
+
+    @pytest.mark.skipif(not HAS_CRYPTOGRAPHY, reason="cryptography not installed")
+    @patch("lab_testing.tools.foundries_vpn_core.check_client_peer_registered")
+    def test_hint_shown_for_unregistered_peer(self, mock_check, client_config):
+        """Test the derived public key is checked and the hint leads the suggestions"""
+        mock_check.return_value = {"success": True, "registered": False}
+
+        result = verify_foundries_vpn_connection()
+
+        mock_check.assert_called_once_with(client_public_key=RFC7748_PUBLIC_KEY)
+        assert "not be registered" in result["suggestions"][0]
+
+    @pytest.mark.skipif(not HAS_CRYPTOGRAPHY, reason="cryptography not installed")
+    @patch("lab_testing.tools.foundries_vpn_core.check_client_peer_registered")
+    def test_no_hint_when_check_fails(self, mock_check, client_config):
+        """Test a failed check (no registered key) does not claim the peer is missing"""
+        mock_check.return_value = {"success": False, "error": "Not connected to Foundries VPN"}
+
+        result = verify_foundries_vpn_connection()
+
+        assert not any("not be registered" in s for s in result["suggestions"])
+
+
+class TestRegisterFoundriesVpnClient:
+    """Tests for register_foundries_vpn_client"""
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_existing_peer_not_registered_again(self, mock_run):
+        """Test a peer already in the runtime dump is left untouched"""
+        mock_run.return_value = Mock(returncode=0, stdout=WG_DUMP, stderr="")
+
+        result = register_foundries_vpn_client(
+            client_public_key=CLIENT_PUBLIC_KEY,
+            assigned_ip="10.42.42.10",
+            server_host="10.42.42.1",
+        )
+
+        assert result["success"] is True
+        assert result["message"] == "Client peer already registered"
+        assert result["steps_completed"] == ["Client peer already registered with correct IP"]
+        assert mock_run.call_count == 1
+        assert mock_run.call_args.args[0][-1] == "wg show factory dump"
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_existing_peer_with_other_ip_reassigned(self, mock_run):
+        """Test a peer registered with a different IP is updated, not skipped"""
+        reassigned_dump = WG_DUMP.replace("10.42.42.10/32", "10.42.42.20/32")
+        mock_run.side_effect = [
+            Mock(returncode=0, stdout=WG_DUMP, stderr=""),
+            Mock(
+                returncode=0,
+                stdout=f"STEP:0:updated\nSTEP:0:applied\nSTEP:saved\n---SEP---\n{reassigned_dump}",
+                stderr="",
+            ),
+        ]
+
+        result = register_foundries_vpn_client(
+            client_public_key=CLIENT_PUBLIC_KEY,
+            assigned_ip="10.42.42.20",
+            server_host="10.42.42.1",
+        )
+
+        assert result["success"] is True
+        assert mock_run.call_count == 2
+        assert "10.42.42.20/32" in mock_run.call_args.args[0][-1]
+        assert "Updated client peer in config file: 10.42.42.20" in result["steps_completed"]
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_config_file_steps_run_in_one_script(self, mock_run):
+        """Test the config file registration runs as one remote script"""
+        mock_run.side_effect = [
+            Mock(returncode=1, stdout="", stderr=""),
+            Mock(
+                returncode=0,
+                stdout=f"STEP:created\nSTEP:0:added\nSTEP:0:applied\nSTEP:saved\n---SEP---\n{WG_DUMP}",
+                stderr="",
+            ),
+        ]
+
+        result = register_foundries_vpn_client(
+            client_public_key=CLIENT_PUBLIC_KEY,
+            assigned_ip="10.42.42.10",
+            server_host="10.42.42.1",
+        )
+
+        assert result["success"] is True
+        assert mock_run.call_count == 2
+        assert "Created /etc/wireguard/factory-clients.conf" in result["steps_completed"]
+        assert "Applied client peer to WireGuard interface" in result["steps_completed"]
+        assert "Verified client peer registration" in result["steps_completed"]
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_failed_inline_verification(self, mock_run):
+        """Test a peer missing after registration is reported as failed"""
+        mock_run.side_effect = [
+            Mock(returncode=1, stdout="", stderr=""),
+            Mock(
+                returncode=0,
+                stdout=f"STEP:0:applied\nSTEP:saved\n---SEP---\n{WG_DUMP.splitlines()[0]}\n",
+                stderr="",
+            ),
+        ]
+
+        result = register_foundries_vpn_client(
+            client_public_key=CLIENT_PUBLIC_KEY,
+            assigned_ip="10.42.42.10",
+            server_host="10.42.42.1",
+            use_config_file=False,
+        )
+
+        assert result["success"] is False
+        assert "Registered client peer: 10.42.42.10" in result["steps_completed"]
+        assert result["steps_failed"] == ["Client peer registration verification failed"]
+
+
+class TestRegisterFoundriesVpnClients:
+    """Tests for register_foundries_vpn_clients"""
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_peers_registered_in_one_script(self, mock_run):
+        """Test new peers share one script and one save; existing peers are skipped"""
+        mock_run.side_effect = [
+            Mock(returncode=0, stdout=WG_DUMP, stderr=""),
+            Mock(
+                returncode=0,
+                stdout=(
+                    "STEP:1:added\nSTEP:1:applied\nSTEP:saved\n---SEP---\n"
+                    f"{WG_DUMP}{OTHER_PUBLIC_KEY}\t(none)\t(none)\t10.42.42.11/32\t0\t0\t0\toff\n"
+                ),
+                stderr="",
+            ),
+        ]
+
+        result = register_foundries_vpn_clients(
+            [
+                {"client_public_key": CLIENT_PUBLIC_KEY, "assigned_ip": "10.42.42.10"},
+                {"client_public_key": OTHER_PUBLIC_KEY, "assigned_ip": "10.42.42.11"},
+            ],
+            server_host="10.42.42.1",
+        )
+
+        assert result["success"] is True
+        assert result["registered"] == 2
+        assert mock_run.call_count == 2
+        script = mock_run.call_args.args[0][-1]
+        assert CLIENT_PUBLIC_KEY not in script
+        assert script.count("wg-quick save factory") == 1
+        assert result["results"][0]["message"] == "Client peer already registered"
+        assert "Verified client peer registration" in result["results"][1]["steps_completed"]
+
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_invalid_peers_not_sent_to_server(self, mock_run):
+        """Test malformed keys and IPs get per-peer errors and never reach the script"""
+        mock_run.side_effect = [
+            Mock(returncode=0, stdout=WG_DUMP, stderr=""),
+            Mock(
+                returncode=0,
+                stdout=(
+                    "STEP:2:added\nSTEP:2:applied\nSTEP:saved\n---SEP---\n"
+                    f"{WG_DUMP}{OTHER_PUBLIC_KEY}\t(none)\t(none)\t10.42.42.11/32\t0\t0\t0\toff\n"
+                ),
+                stderr="",
+            ),
+        ]
+
+        result = register_foundries_vpn_clients(
+            [
+                {"client_public_key": 'x"; rm -rf / #', "assigned_ip": "10.42.42.10"},
+                {"client_public_key": CLIENT_PUBLIC_KEY, "assigned_ip": "10.42.42.10; reboot"},
+                {"client_public_key": OTHER_PUBLIC_KEY, "assigned_ip": "10.42.42.11"},
+            ],
+            server_host="10.42.42.1",
+        )
+
+        assert result["success"] is False
+        assert result["registered"] == 1
+        assert "Invalid WireGuard public key" in result["results"][0]["error"]
+        assert "Invalid assigned_ip" in result["results"][1]["error"]
+        assert result["results"][2]["success"] is True
+        script = mock_run.call_args.args[0][-1]
+        assert "rm -rf" not in script
+        assert "reboot" not in script
+
+    def test_script_updates_config_file_in_shell(self, tmp_path):
+        """Test the generated script quotes peer lines and rewrites a changed IP"""
+        peers_file = tmp_path / "factory-clients.conf"
+        peers_file.write_text(
+            f"# Foundries VPN Client Peers\n{CLIENT_PUBLIC_KEY} 10.42.42.9 client\n"
+        )
+
+        with patch("lab_testing.tools.foundries_vpn_peer.subprocess.run") as mock_run, patch(
+            "lab_testing.tools.foundries_vpn_peer._CLIENT_PEERS_FILE", str(peers_file)
+        ):
+            mock_run.side_effect = [
+                Mock(returncode=0, stdout="", stderr=""),
+                Mock(returncode=0, stdout="", stderr=""),
+            ]
+            register_foundries_vpn_client(
+                client_public_key=CLIENT_PUBLIC_KEY,
+                assigned_ip="10.42.42.10",
+                server_host="10.42.42.1",
+            )
+        script = mock_run.call_args.args[0][-1]
+
+        wg_stub = 'wg() { echo "wg $*" >&2; }\n'
+        remote = subprocess.run(
+            ["bash", "-s"], input=wg_stub + script, capture_output=True, text=True, check=False
+        )
+
+        assert "STEP:0:updated" in remote.stdout
+        assert (
+            f"wg set factory peer {CLIENT_PUBLIC_KEY} allowed-ips 10.42.42.10/32" in remote.stderr
+        )
+        assert peers_file.read_text().splitlines()[1] == f"{CLIENT_PUBLIC_KEY} 10.42.42.10 client"
+
+
+class TestDeferredSave:
+    """Tests for defer_save and flush_foundries_vpn_config"""
+
+    @patch.dict("lab_testing.tools.foundries_vpn_peer._pending_saves", clear=True)
+    @patch("lab_testing.tools.foundries_vpn_peer.subprocess.run")
+    def test_saves_once_per_server(self, mock_run):
+        """Test deferred registrations skip wg-quick save until one flush"""
+        dump = f"---SEP---\n{WG_DUMP}"
+        mock_run.side_effect = [
+            Mock(returncode=1, stdout="", stderr=""),
+            Mock(returncode=0, stdout=f"STEP:0:added\nSTEP:0:applied\n{dump}", stderr=""),
+            Mock(returncode=1, stdout="", stderr=""),
+            Mock(returncode=0, stdout=f"STEP:0:added\nSTEP:0:applied\n{dump}", stderr=""),
+            Mock(returncode=0, stdout="", stderr=""),
+        ]
+
+        for _ in range(2):
+            result = register_foundries_vpn_client(
+                client_public_key=CLIENT_PUBLIC_KEY,
+                assigned_ip="10.42.42.10",
+                server_host="10.42.42.1",
+                defer_save=True,
+            )
+            assert result["success"] is True
+            assert "wg-quick save" not in mock_run.call_args.args[0][-1]
+
+        flushed = flush_foundries_vpn_config()
+
+        assert flushed["success"] is True
+        assert flushed["saved"] == ["10.42.42.1"]
+        assert mock_run.call_args.args[0][-1] == "wg-quick save factory"
+        assert flush_foundries_vpn_config()["saved"] == []
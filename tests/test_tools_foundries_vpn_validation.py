@@ -0,0 +1,270 @@
+"""
+Tests for Foundries device connectivity validation
+
+Copyright (C) 2025 Dynamic Devices Ltd
+License: GPL-3.0-or-later
+"""
+
+import subprocess
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from lab_testing.tools.foundries_vpn_validation import validate_foundries_device_connectivity
+
+DEVICES = [
+    {"name": "imx8mm-jaguar-inst-aaaa", "status": "OK", "vpn_ip": "10.42.42.3"},
+    {"name": "imx8mm-jaguar-inst-bbbb", "status": "OK", "vpn_ip": "10.42.42.4"},
+    {"name": "imx8mm-jaguar-inst-cccc", "status": "OK", "vpn_ip": None},
+]
+
+
+@pytest.fixture
+def vpn_ready():
+    """Pass Steps 1-3: VPN connected, server config and device list available"""
+    with patch(
+        "lab_testing.tools.foundries_vpn_validation.foundries_vpn_status",
+        return_value={"success": True, "connected": True},
+    ), patch(
+        "lab_testing.tools.foundries_vpn_validation.get_foundries_vpn_server_config",
+        return_value={"success": True, "address": "10.42.42.1", "endpoint": "vpn:5555"},
+    ), patch(
+        "lab_testing.tools.foundries_vpn_validation.get_devices",
+        return_value={"success": True, "devices": DEVICES},
+    ), patch(
+        "lab_testing.tools.foundries_vpn_validation._get_fping_path", return_value=None
+    ):
+        yield
+
+
+def _completed(args, returncode=0, text=False, **kwargs):
+    stdout, stderr = "ok\n", "unreachable\n"
+    if not text:
+        stdout, stderr = stdout.encode(), stderr.encode()
+    return Mock(args=args, returncode=returncode, stdout=stdout, stderr=stderr)
+
+
+class TestValidateFoundriesDeviceConnectivity:
+    """Tests for validate_foundries_device_connectivity"""
+
+    def test_ssh_probe_falls_back_to_password_when_key_refused(self, vpn_ready):
+        """Test sshpass is only used after key authentication is refused"""
+        commands = []
+
+        def run(args, **kwargs):
+            commands.append(args[0])
+            if args[0] == "ssh":
+                result = _completed(args, returncode=255, **kwargs)
+                result.stderr = b"fio@10.42.42.3: Permission denied (publickey,password).\n"
+                return result
+            return _completed(args, **kwargs)
+
+        with patch("lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=run):
+            result = validate_foundries_device_connectivity("imx8mm-jaguar-inst-aaaa")
+
+        assert commands[-2:] == ["ssh", "sshpass"]
+        assert result["devices_connectivity"][0]["ssh_test"] == {
+            "success": True,
+            "output": None,
+            "error": None,
+            "auth": "password",
+        }
+
+    def test_ssh_probe_does_not_retry_unreachable_host(self, vpn_ready):
+        """Test a connection failure is not retried with a password"""
+
+        def run(args, **kwargs):
+            return _completed(args, returncode=255 if args[0] == "ssh" else 0, **kwargs)
+
+        with patch(
+            "lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=run
+        ) as mock_run:
+            result = validate_foundries_device_connectivity("imx8mm-jaguar-inst-aaaa")
+
+        assert "sshpass" not in [c.args[0][0] for c in mock_run.call_args_list]
+        assert result["devices_connectivity"][0]["ssh_test"]["error"] == "unreachable"
+
+    def test_progress_callback_receives_each_step(self, vpn_ready):
+        """Test each step result is reported as it finishes, and callback errors are ignored"""
+        reported = []
+
+        def progress(step_result):
+            reported.append(step_result["step"])
+            raise RuntimeError("display closed")
+
+        with patch(
+            "lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=_completed
+        ):
+            result = validate_foundries_device_connectivity(progress_callback=progress)
+
+        assert reported == [1, 2, 3, 4]
+        assert result["success"] is True
+
+    def test_device_name_selects_one_device(self, vpn_ready):
+        """Test device_name validates only that device and reports unknown names"""
+        with patch(
+            "lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=_completed
+        ):
+            result = validate_foundries_device_connectivity("imx8mm-jaguar-inst-bbbb")
+            missing = validate_foundries_device_connectivity("imx8mm-jaguar-inst-zzzz")
+
+        assert [d["device_name"] for d in result["devices_connectivity"]] == [
+            "imx8mm-jaguar-inst-bbbb"
+        ]
+        assert missing["success"] is False
+        assert missing["message"] == "Failed at Step 2: Device 'imx8mm-jaguar-inst-zzzz' not found"
+
+    def test_devices_are_probed_concurrently(self, vpn_ready):
+        """Test both devices' probes are in flight at the same time"""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def run(args, **kwargs):
+            if args[0] == "ssh":
+                barrier.wait()
+            return _completed(args, **kwargs)
+
+        with patch("lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=run):
+            result = validate_foundries_device_connectivity()
+
+        assert result["devices_validated"] == 2
+        assert [d["device_name"] for d in result["devices_connectivity"]] == [
+            "imx8mm-jaguar-inst-aaaa",
+            "imx8mm-jaguar-inst-bbbb",
+        ]
+        assert all(d["ssh_test"]["success"] for d in result["devices_connectivity"])
+        assert result["success"] is True
+
+    def test_ssh_probe_reuses_multiplexed_connection(self, vpn_ready):
+        """Test the SSH probe joins the shared ControlMaster connection"""
+        ssh_calls = []
+
+        def run(args, **kwargs):
+            if args[0] == "ssh":
+                ssh_calls.append(args)
+            return _completed(args, **kwargs)
+
+        with patch("lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=run):
+            validate_foundries_device_connectivity()
+
+        assert len(ssh_calls) == 2
+        for args in ssh_calls:
+            assert "ControlMaster=auto" in args
+            assert args.index("ControlMaster=auto") < len(args) - 2  # before fio@<ip>
+
+    def test_probe_failures_become_warnings_in_device_order(self, vpn_ready):
+        """Test per-device failures are reported as ordered warnings"""
+
+        def run(args, **kwargs):
+            return _completed(args, returncode=0 if args[-1] == "10.42.42.1" else 1, **kwargs)
+
+        with patch("lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=run):
+            result = validate_foundries_device_connectivity()
+
+        assert result["success"] is False
+        assert result["warnings"] == [
+            "Device imx8mm-jaguar-inst-aaaa (10.42.42.3): Cannot ping",
+            "Device imx8mm-jaguar-inst-bbbb (10.42.42.4): Cannot ping",
+        ]
+        assert "enable_foundries_device_to_device" in result["next_steps"][1]
+        ssh_test = result["devices_connectivity"][0]["ssh_test"]
+        assert ssh_test == {"success": False, "output": None, "error": "skipped: ping unreachable"}
+        assert [(d["ping_ok"], d["ssh_ok"]) for d in result["devices_connectivity"]] == [
+            (False, False),
+            (False, False),
+        ]
+
+    def test_force_ssh_probes_unpingable_devices(self, vpn_ready):
+        """Test force_ssh still tries SSH after a failed ping"""
+
+        def run(args, **kwargs):
+            return _completed(args, returncode=0 if args[-1] == "10.42.42.1" else 1, **kwargs)
+
+        with patch(
+            "lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=run
+        ) as mock_run:
+            result = validate_foundries_device_connectivity(force_ssh=True)
+
+        # Each device is tried once per pass
+        assert [c.args[0][0] for c in mock_run.call_args_list].count("ssh") == 4
+        assert result["warnings"] == [
+            "Device imx8mm-jaguar-inst-aaaa (10.42.42.3): Cannot ping",
+            "Device imx8mm-jaguar-inst-aaaa (10.42.42.3): Cannot SSH",
+            "Device imx8mm-jaguar-inst-bbbb (10.42.42.4): Cannot ping",
+            "Device imx8mm-jaguar-inst-bbbb (10.42.42.4): Cannot SSH",
+        ]
+        ssh_test = result["devices_connectivity"][0]["ssh_test"]
+        assert ssh_test["error"] == "unreachable"
+
+    def test_outputs_only_kept_for_failures_unless_verbose(self, vpn_ready):
+        """Test successful tests report no output unless verbose is set"""
+
+        def run(args, **kwargs):
+            result = _completed(args, returncode=1 if args[0] == "ssh" else 0, **kwargs)
+            if kwargs.get("stdout") == subprocess.DEVNULL:
+                result.stdout = None
+            result.stderr = b"x" * 5000 + b"Connection timed out\n"
+            return result
+
+        with patch("lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=run):
+            quiet = validate_foundries_device_connectivity()
+            verbose = validate_foundries_device_connectivity(verbose=True)
+
+        assert quiet["validation_steps"][0]["details"]["ping_output"] is None
+        device = quiet["devices_connectivity"][0]
+        assert device["ping_test"]["output"] is None
+        assert len(device["ssh_test"]["output"]) == 2048
+        assert device["ssh_test"]["error"].endswith("Connection timed out")
+
+        assert verbose["validation_steps"][0]["details"]["ping_output"] == "ok\n"
+        assert verbose["devices_connectivity"][0]["ping_test"]["output"] == "ok\n"
+
+    def test_failed_devices_are_retried_with_longer_timeouts(self, vpn_ready):
+        """Test only devices failing the short first pass are re-probed, with longer waits"""
+        ssh_calls = []
+
+        def run(args, **kwargs):
+            if args[0] == "ssh":
+                ssh_calls.append(args)
+                slow = args[-2] == "fio@10.42.42.4" and "ConnectTimeout=2" in args
+                return _completed(args, returncode=255 if slow else 0, **kwargs)
+            return _completed(args, **kwargs)
+
+        with patch(
+            "lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=run
+        ) as mock_run:
+            result = validate_foundries_device_connectivity()
+
+        assert result["success"] is True
+        assert not result["warnings"]
+        retried = [args for args in ssh_calls if "ConnectTimeout=8" in args]
+        assert [args[-2] for args in retried] == ["fio@10.42.42.4"]
+        pings = [c.args[0] for c in mock_run.call_args_list if c.args[0][0] == "ping"]
+        assert pings[-1][-3:] == ["-W", "3", "10.42.42.4"]
+
+    def test_devices_are_pinged_with_one_fping(self, vpn_ready):
+        """Test fping replaces the per-device ping processes when installed"""
+        fping_summary = (
+            "10.42.42.3 : xmt/rcv/%loss = 2/2/0%, min/avg/max = 20.1/20.5/20.9\n"
+            "10.42.42.4 : xmt/rcv/%loss = 2/0/100%\n"
+        )
+        calls = []
+
+        def run(args, **kwargs):
+            calls.append(args[0])
+            if args[0] == "/usr/bin/fping":
+                assert args[-2:] == ["10.42.42.3", "10.42.42.4"]
+                return Mock(returncode=1, stdout="", stderr=fping_summary)
+            return _completed(args, returncode=int(args[-1] == "10.42.42.4"), **kwargs)
+
+        with patch(
+            "lab_testing.tools.foundries_vpn_validation._get_fping_path",
+            return_value="/usr/bin/fping",
+        ), patch("lab_testing.tools.foundries_vpn_validation.subprocess.run", side_effect=run):
+            result = validate_foundries_device_connectivity()
+
+        assert calls.count("/usr/bin/fping") == 1
+        # Step 1 server ping, then the retry of the device fping found unreachable
+        assert calls.count("ping") == 2
+        pings = [d["ping_test"]["success"] for d in result["devices_connectivity"]]
+        assert pings == [True, False]
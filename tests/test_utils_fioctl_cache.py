@@ -0,0 +1,102 @@
+"""
+Tests for the fioctl result cache
+
+Copyright (C) 2025 Dynamic Devices Ltd
+License: GPL-3.0-or-later
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from lab_testing.utils import fioctl_cache
+
+DEVICES = {
+    "success": True,
+    "devices": [{"name": "imx8mm-jaguar-inst-aaaa", "vpn_ip": "10.42.42.3"}],
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    fioctl_cache.invalidate_devices()
+    yield
+    fioctl_cache.invalidate_devices()
+
+
+class TestGetDevices:
+    """Tests for get_devices"""
+
+    @patch("lab_testing.utils.fioctl_cache.list_foundries_devices", return_value=DEVICES)
+    def test_listing_is_reused_per_factory(self, mock_list):
+        """Test repeat lookups within the TTL make one fioctl call per factory"""
+        assert fioctl_cache.get_devices() == DEVICES
+        assert fioctl_cache.get_devices() == DEVICES
+        fioctl_cache.get_devices("other")
+
+        assert mock_list.call_count == 2
+
+    @patch("lab_testing.utils.fioctl_cache.list_foundries_devices", return_value=DEVICES)
+    def test_expired_listing_is_refetched(self, mock_list):
+        """Test a listing older than the TTL is fetched again"""
+        fioctl_cache.get_devices(ttl=0)
+        fioctl_cache.get_devices(ttl=0)
+
+        assert mock_list.call_count == 2
+
+    @patch(
+        "lab_testing.utils.fioctl_cache.list_foundries_devices",
+        return_value={"success": False, "error": "fioctl not configured"},
+    )
+    def test_failures_are_not_cached(self, mock_list):
+        """Test a failed listing is retried on the next call"""
+        fioctl_cache.get_devices()
+        fioctl_cache.get_devices()
+
+        assert mock_list.call_count == 2
+
+    @patch("lab_testing.utils.fioctl_cache.list_foundries_devices", return_value=DEVICES)
+    def test_device_to_device_resolves_ip_from_cache(self, mock_list):
+        """Test device-to-device looks the device IP up through the shared cache"""
+        from lab_testing.tools.foundries_vpn_server import enable_foundries_device_to_device
+
+        fioctl_cache.get_devices()
+        with patch("lab_testing.tools.foundries_vpn_server.subprocess.run") as mock_run:
+            mock_run.return_value.stdout = "STEP:device_updated\n"
+            result = enable_foundries_device_to_device(
+                "imx8mm-jaguar-inst-aaaa", server_host="10.0.0.1"
+            )
+
+        assert result["device_ip"] == "10.42.42.3"
+        assert mock_list.call_count == 1
+
+    @patch("lab_testing.utils.fioctl_cache.list_foundries_devices")
+    def test_callers_cannot_change_cached_listing(self, mock_list):
+        """Test changes to a returned listing don't leak into later lookups"""
+        mock_list.return_value = {
+            "success": True,
+            "devices": [{"name": "imx8mm-jaguar-inst-aaaa", "vpn_ip": "10.42.42.3"}],
+        }
+
+        fioctl_cache.get_devices()["devices"][0]["vpn_ip"] = None
+        fioctl_cache.get_devices()["devices"].clear()
+
+        assert fioctl_cache.get_devices() == DEVICES
+        assert mock_list.call_count == 1
+
+    @pytest.mark.parametrize("action", ["enable", "disable"])
+    @patch("lab_testing.utils.fioctl_cache.list_foundries_devices", return_value=DEVICES)
+    def test_vpn_change_drops_cached_listing(self, mock_list, action):
+        """Test enabling or disabling VPN on a device forces a fresh listing"""
+        from lab_testing.tools import foundries_vpn_server
+
+        fioctl_cache.get_devices()
+        operation = getattr(foundries_vpn_server, f"{action}_foundries_vpn_device")
+        with patch(
+            "lab_testing.tools.foundries_vpn_server._resolve_fioctl", return_value=("fioctl", None)
+        ), patch("lab_testing.tools.foundries_vpn_server.subprocess.run") as mock_run:
+            mock_run.return_value.returncode = 0
+            assert operation("imx8mm-jaguar-inst-aaaa")["success"] is True
+        fioctl_cache.get_devices()
+
+        assert mock_list.call_count == 2